@@ -1,9 +1,15 @@
 # app/agents.py
 
+import time
+import threading
 from dataclasses import dataclass
-from typing import List, Dict
+from typing import Dict, Iterator, AsyncIterator
 
+from .config import LLM_TIMEOUT
+from .limiter import deadline_after
+from .memory import as_memory
 from .rag import build_rag_chain
+from .resources import get_resources
 
 
 @dataclass
@@ -12,43 +18,188 @@ class AgentResponse:
     answer: str
 
 
+class GenerationStats:
+    """Temps jusqu'au premier token + temps total de génération, par agent."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.ttft_total = 0.0
+        self.generation_total = 0.0
+        self.last_ttft = 0.0
+        self.last_generation = 0.0
+
+    def record(self, ttft: float, total: float):
+        with self._lock:
+            self.count += 1
+            self.ttft_total += ttft
+            self.generation_total += total
+            self.last_ttft = ttft
+            self.last_generation = total
+
+    def summary(self) -> dict:
+        n = self.count or 1
+        return {
+            "count": self.count,
+            "avg_ttft": round(self.ttft_total / n, 3),
+            "avg_generation": round(self.generation_total / n, 3),
+            "last_ttft": round(self.last_ttft, 3),
+            "last_generation": round(self.last_generation, 3),
+        }
+
+
+class AgentStream:
+    """Itérable de tokens ; `answer` contient le texte complet une fois consommé."""
+
+    def __init__(self, agent_name: str, tokens: Iterator[str], query: str = None):
+        self.agent_name = agent_name
+        self.query = query          # question autonome utilisée pour le retrieval (voir app/memory.py)
+        self._tokens = tokens
+        self._parts = []
+
+    def __iter__(self):
+        try:
+            for token in self._tokens:
+                self._parts.append(token)
+                yield token
+        finally:
+            # flux abandonné (changement de page) : on ferme toute la chaîne jusqu'à Ollama
+            self._tokens.close()
+
+    @property
+    def answer(self) -> str:
+        return "".join(self._parts)
+
+    def to_response(self) -> AgentResponse:
+        return AgentResponse(agent_name=self.agent_name, answer=self.answer)
+
+
+class AgentAsyncStream(AgentStream):
+    """Variante asynchrone : `async for token in stream`."""
+
+    def __init__(self, agent_name: str, tokens: AsyncIterator[str], query: str = None):
+        super().__init__(agent_name, tokens, query)
+
+    def __iter__(self):
+        raise TypeError("use 'async for' with an async stream")
+
+    async def __aiter__(self):
+        try:
+            async for token in self._tokens:
+                self._parts.append(token)
+                yield token
+        finally:
+            await self._tokens.aclose()
+
+
 class BaseAgent:
-    def __init__(self, name: str, system_prompt: str, agent_type: str):
+    def __init__(self, name: str, system_prompt: str, agent_type: str, resources=None):
         self.name = name
         self.system_prompt = system_prompt
         self.agent_type = agent_type
+        resources = resources or get_resources()
+        self.tracer = resources.tracer
+        self.rewriter = resources.rewriter
 
-        # RAG chain (FAISS + LLM)
+        # RAG chain (FAISS + LLM partagés : seul le prompt change d'un agent à l'autre)
         self.chain = build_rag_chain(
             system_prompt=system_prompt,
             agent_type=agent_type,
+            resources=resources,
         )
+        self.stats = GenerationStats()
 
-    def run(self, question: str, history: List[Dict] = None) -> AgentResponse:
+    def _inputs(self, question: str, history=None, school: str = None, upload=None,
+                timeout: float = LLM_TIMEOUT, trace=None, standalone=None) -> Dict:
         user_context = ""
+        # trace ouverte par le routeur (étapes rewrite / route déjà mesurées), sinon nouvelle trace
+        trace = trace or self.tracer.trace()
+        trace.agent = self.name
 
-        if history:
-            for msg in reversed(history):
-                if msg.get("uploaded_doc"):
-                    user_context = msg["uploaded_doc"]
-                    break
-
-        result = self.chain.invoke(
-            {
-                "question": question,                 #  FAISS embedde SEULEMENT la question
-                "user_context": user_context[:2000],  #  PDF injecté UNIQUEMENT dans le prompt
-            }
-        )
+        # history : ConversationMemory (Streamlit) ou liste de messages (API), fenêtre bornée
+        memory = as_memory(history)
+        if standalone is None:
+            with trace.span("rewrite"):
+                standalone = self.rewriter.rewrite(question, memory)
+        if upload is None and memory is not None:
+            upload = memory.upload
+            user_context = memory.user_context
 
-        return AgentResponse(
-            agent_name=self.name,
-            answer=result,
-        )
+        return {
+            "question": question,                 #  question posée, telle quelle dans le prompt
+            "query": standalone.query,            #  FAISS embedde SEULEMENT la question autonome
+            "conversation": standalone.conversation,  #  derniers échanges, pour les relances
+            "user_context": user_context[:2000],  #  PDF injecté UNIQUEMENT dans le prompt
+            "school": school,                     #  filtre optionnel (esilv / emlv / iim)
+            "upload": upload,                     #  index éphémère du document uploadé
+            "deadline": deadline_after(timeout),  #  attente en file + génération
+            "trace": trace,                       #  durées des étapes (voir app/tracing.py)
+        }
+
+    def run(self, question: str, history=None, school: str = None, upload=None,
+            timeout: float = LLM_TIMEOUT, trace=None, standalone=None) -> AgentResponse:
+        stream = self.stream(question, history=history, school=school, upload=upload, timeout=timeout,
+                             trace=trace, standalone=standalone)
+        for _ in stream:
+            pass
+        return stream.to_response()
+
+    def stream(self, question: str, history=None, school: str = None, upload=None,
+               timeout: float = LLM_TIMEOUT, trace=None, standalone=None) -> AgentStream:
+        inputs = self._inputs(question, history, school=school, upload=upload, timeout=timeout,
+                              trace=trace, standalone=standalone)
+        return AgentStream(self.name, self._timed_tokens(inputs), query=inputs["query"])
+
+    async def arun(self, question: str, history=None, school: str = None, upload=None,
+                   timeout: float = LLM_TIMEOUT, trace=None, standalone=None) -> AgentResponse:
+        stream = self.astream(question, history=history, school=school, upload=upload, timeout=timeout,
+                              trace=trace, standalone=standalone)
+        async for _ in stream:
+            pass
+        return stream.to_response()
+
+    def astream(self, question: str, history=None, school: str = None, upload=None,
+                timeout: float = LLM_TIMEOUT, trace=None, standalone=None) -> AgentAsyncStream:
+        inputs = self._inputs(question, history, school=school, upload=upload, timeout=timeout,
+                              trace=trace, standalone=standalone)
+        return AgentAsyncStream(self.name, self._atimed_tokens(inputs), query=inputs["query"])
+
+    def _timed_tokens(self, inputs: Dict) -> Iterator[str]:
+        trace = inputs["trace"]
+        trace.start_profile()
+        start = time.perf_counter()
+        ttft = None
+        tokens = self.chain.stream(inputs)
+        try:
+            for token in tokens:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                yield token
+        finally:
+            tokens.close()
+            trace.finish()
+        total = time.perf_counter() - start
+        self.stats.record(ttft if ttft is not None else total, total)
+
+    async def _atimed_tokens(self, inputs: Dict) -> AsyncIterator[str]:
+        start = time.perf_counter()
+        ttft = None
+        tokens = self.chain.astream(inputs)
+        try:
+            async for token in tokens:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                yield token
+        finally:
+            await tokens.aclose()
+            inputs["trace"].finish()
+        total = time.perf_counter() - start
+        self.stats.record(ttft if ttft is not None else total, total)
 
 
 
 
-def create_agents():
+def create_agents(resources=None):
     agents = {}
     # PROMPT COMMUN 
     
@@ -118,16 +269,20 @@ def create_agents():
     # Register agents
 
     agents["student_life"] = BaseAgent(
-        "StudentLifeAgent", student_life_prompt, agent_type="student_life"
+        "StudentLifeAgent", student_life_prompt, agent_type="student_life",
+        resources=resources,
     )
     agents["academics"] = BaseAgent(
-        "AcademicsAgent", academics_prompt, agent_type="academics"
+        "AcademicsAgent", academics_prompt, agent_type="academics",
+        resources=resources,
     )
     agents["admissions"] = BaseAgent(
-        "AdmissionsAgent", admissions_prompt, agent_type="admissions"
+        "AdmissionsAgent", admissions_prompt, agent_type="admissions",
+        resources=resources,
     )
     agents["admin"] = BaseAgent(
-        "AdminAgent", admin_prompt, agent_type="admin"
+        "AdminAgent", admin_prompt, agent_type="admin",
+        resources=resources,
     )
 
     return agents
@@ -0,0 +1,315 @@
+# app/analytics.py
+
+import csv
+import sys
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+from .config import (
+    ANALYTICS_DB_PATH,
+    ANALYTICS_CSV_DIR,
+    ANALYTICS_FLUSH_INTERVAL,
+    ANALYTICS_BATCH_SIZE,
+    ANALYTICS_PRUNE_INTERVAL,
+    TRACE_RETENTION_DAYS,
+    TRACE_MAX_SPANS,
+)
+
+
+
+# Statistiques d'usage (questions, votes, contacts) dans SQLite
+#   - les sessions Streamlit déposent les événements dans une file, sans attendre le disque
+#   - un thread écrivain les insère par lots (une transaction par lot, journal WAL)
+#   - agent_stats (questions, 👍, 👎 par agent) est mis à jour dans la même transaction :
+#     la page Admin lit quelques lignes, quel que soit le volume d'historique
+#   - spans : durée de chaque étape des requêtes (voir app/tracing.py), pour l'analyse hors ligne ;
+#     purgés par âge et par nombre de lignes (TRACE_RETENTION_DAYS, TRACE_MAX_SPANS)
+#   - migration unique des anciens CSV (data/admin/*.csv) : marqueur et import dans la même
+#     transaction, jamais rejouée (même après un crash ou avec deux processus au démarrage)
+#
+#   python -m app.analytics      migre les CSV et affiche le résumé
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY, ts REAL, agent TEXT NOT NULL, question TEXT
+);
+CREATE TABLE IF NOT EXISTS votes (
+    id INTEGER PRIMARY KEY, ts REAL, msg_id INTEGER, agent TEXT NOT NULL, vote TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contacts (
+    id INTEGER PRIMARY KEY, ts REAL, name TEXT, email TEXT, phone TEXT, subject TEXT, comment TEXT
+);
+CREATE TABLE IF NOT EXISTS agent_stats (
+    agent TEXT PRIMARY KEY,
+    questions INTEGER NOT NULL DEFAULT 0,
+    up INTEGER NOT NULL DEFAULT 0,
+    down INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS spans (
+    id INTEGER PRIMARY KEY, ts REAL, agent TEXT, stage TEXT NOT NULL, ms REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS spans_ts ON spans (ts);
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY, ts REAL
+);
+"""
+
+_STOP = object()
+
+
+def connect(path=ANALYTICS_DB_PATH) -> sqlite3.Connection:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")   # WAL : durable à chaque checkpoint, pas à chaque commit
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def write_events(conn, events):
+    """Insère un lot d'événements et met à jour agent_stats dans la même transaction."""
+    with conn:
+        _insert_events(conn, events)
+
+
+def _insert_events(conn, events):
+    # sans transaction propre : l'appelant ouvre la sienne
+    usage = [e[1:] for e in events if e[0] == "usage"]
+    votes = [e[1:] for e in events if e[0] == "vote"]
+    contacts = [e[1:] for e in events if e[0] == "contact"]
+    spans = [
+        (e[1], e[2], stage, seconds * 1000)
+        for e in events if e[0] == "spans"
+        for stage, seconds in e[3]
+    ]
+
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for _, agent, _ in usage:
+        deltas[agent][0] += 1
+    for _, _, agent, vote in votes:
+        if vote in ("up", "down"):
+            deltas[agent][1 if vote == "up" else 2] += 1
+
+    conn.executemany("INSERT INTO usage (ts, agent, question) VALUES (?, ?, ?)", usage)
+    conn.executemany("INSERT INTO votes (ts, msg_id, agent, vote) VALUES (?, ?, ?, ?)", votes)
+    conn.executemany(
+        "INSERT INTO contacts (ts, name, email, phone, subject, comment) VALUES (?, ?, ?, ?, ?, ?)",
+        contacts,
+    )
+    conn.executemany("INSERT INTO spans (ts, agent, stage, ms) VALUES (?, ?, ?, ?)", spans)
+    conn.executemany(
+        """
+        INSERT INTO agent_stats (agent, questions, up, down) VALUES (?, ?, ?, ?)
+        ON CONFLICT(agent) DO UPDATE SET
+            questions = questions + excluded.questions,
+            up = up + excluded.up,
+            down = down + excluded.down
+        """,
+        [(agent, *d) for agent, d in deltas.items()],
+    )
+
+
+def prune_spans(conn, retention_days: float = TRACE_RETENTION_DAYS, max_rows: int = TRACE_MAX_SPANS) -> int:
+    """Supprime les spans trop anciens, puis les plus anciens au-delà de max_rows."""
+    with conn:
+        removed = conn.execute(
+            "DELETE FROM spans WHERE ts < ?", (time.time() - retention_days * 86400,)
+        ).rowcount
+        removed += conn.execute(
+            "DELETE FROM spans WHERE id <= (SELECT MAX(id) FROM spans) - ?", (max_rows,)
+        ).rowcount
+    return removed
+
+
+def _read_csv(path: Path):
+    if not path.exists():
+        return []
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    return [r for r in rows[1:] if r]
+
+
+def migrate_csv(conn, csv_dir=ANALYTICS_CSV_DIR) -> dict:
+    """Importe usage.csv, votes.csv et contacts.csv une seule fois (les fichiers restent en place)."""
+    if conn.execute("SELECT 1 FROM migrations WHERE name = 'csv'").fetchone():
+        return {}
+    csv_dir = Path(csv_dir)
+    events = []
+    # colonnes lues par position : l'en-tête des contacts a changé au fil des versions
+    for row in _read_csv(csv_dir / "usage.csv"):
+        events.append(("usage", None, row[0], row[1] if len(row) > 1 else ""))
+    for row in _read_csv(csv_dir / "votes.csv"):
+        if len(row) >= 3:
+            msg_id = int(row[0]) if row[0].isdigit() else None
+            events.append(("vote", None, msg_id, row[1], row[2]))
+    for row in _read_csv(csv_dir / "contacts.csv"):
+        row = (row + [""] * 5)[:5]
+        events.append(("contact", None, *row))
+
+    # le marqueur est posé dans la transaction de l'import : un crash n'en laisse aucun des deux,
+    # et un second processus attend le verrou d'écriture puis trouve le marqueur (0 ligne insérée)
+    with conn:
+        claimed = conn.execute(
+            "INSERT INTO migrations (name, ts) VALUES ('csv', ?) ON CONFLICT(name) DO NOTHING",
+            (time.time(),),
+        ).rowcount
+        if not claimed:
+            return {}
+        _insert_events(conn, events)
+    counts = defaultdict(int)
+    for event in events:
+        counts[event[0]] += 1
+    return dict(counts)
+
+
+class AnalyticsStore:
+    def __init__(
+        self,
+        path: str = ANALYTICS_DB_PATH,
+        flush_interval: float = ANALYTICS_FLUSH_INTERVAL,
+        batch_size: int = ANALYTICS_BATCH_SIZE,
+        prune_interval: float = ANALYTICS_PRUNE_INTERVAL,
+    ):
+        self.path = str(path)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.prune_interval = prune_interval
+        connect(self.path).close()
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+        self._thread.start()
+
+    # --- écriture (non bloquante) ---
+
+    def record_usage(self, agent: str, question: str):
+        self._queue.put(("usage", time.time(), agent, question))
+
+    def record_vote(self, msg_id, agent: str, vote: str):
+        self._queue.put(("vote", time.time(), msg_id, agent, vote))
+
+    def record_contact(self, name: str, email: str, phone: str, subject: str, comment: str):
+        self._queue.put(("contact", time.time(), name, email, phone, subject, comment))
+
+    def record_spans(self, agent: str, spans):
+        # spans : [(étape, secondes)] d'une requête, sink du Tracer
+        self._queue.put(("spans", time.time(), agent, spans))
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Attend que les événements déjà déposés soient écrits."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout=10)
+
+    def _run(self):
+        conn = connect(self.path)
+        running = True
+        next_prune = 0.0
+        while running:
+            batch, markers = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    running = False
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+                # un flush ou l'arrêt écrit tout de suite ; sinon on groupe jusqu'au délai / à la taille max
+                if not running or markers or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    write_events(conn, batch)
+                    with self._lock:
+                        self.written += len(batch)
+                        self.batches += 1
+                except sqlite3.Error as e:
+                    with self._lock:
+                        self.errors += len(batch)
+                    print(f"[analytics] {len(batch)} events lost: {e}")
+            if time.monotonic() >= next_prune:
+                next_prune = time.monotonic() + self.prune_interval
+                try:
+                    prune_spans(conn)
+                except sqlite3.Error as e:
+                    print(f"[analytics] spans pruning failed: {e}")
+            for marker in markers:
+                marker.set()
+        conn.close()
+
+    # --- lecture (page Admin) ---
+
+    def summary(self) -> dict:
+        """Totaux par agent, lus dans agent_stats : coût indépendant du nombre d'événements."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            rows = conn.execute(
+                "SELECT agent, questions, up, down FROM agent_stats ORDER BY agent"
+            ).fetchall()
+        finally:
+            conn.close()
+        agents = {agent: {"questions": q, "up": up, "down": down} for agent, q, up, down in rows}
+        return {
+            "questions": sum(a["questions"] for a in agents.values()),
+            "agents": agents,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "errors": self.errors,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_analytics() -> AnalyticsStore:
+    """Store partagé du processus ; les CSV existants sont migrés à la première ouverture."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            conn = connect(ANALYTICS_DB_PATH)
+            try:
+                migrated = migrate_csv(conn)
+            finally:
+                conn.close()
+            if migrated:
+                print(f"[analytics] migrated from CSV: {migrated}")
+            _store = AnalyticsStore()
+            atexit.register(_store.close)
+        return _store
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else ANALYTICS_DB_PATH
+    conn = connect(path)
+    print(migrate_csv(conn) or "CSV already migrated")
+    conn.close()
+    store = AnalyticsStore(path)
+    print(store.summary())
+    store.close()
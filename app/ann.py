@@ -0,0 +1,155 @@
+# app/ann.py
+
+import os
+import json
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from .config import INDEX_TYPE, INDEX_PARAMS
+
+
+
+# Index ANN de service (flat / IVF-Flat / HNSW / IVF-PQ)
+#   index.faiss reste l'index exact de référence (mis à jour par l'ingestion incrémentale) ;
+#   ann.faiss est reconstruit à partir de lui en fin d'ingestion, et index_meta.json
+#   indique à load_vectorstore() quel index servir et avec quels paramètres.
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+META_NAME = "index_meta.json"
+ANN_NAME = "ann.faiss"
+
+
+def _nlist(n: int, wanted: int) -> int:
+    # FAISS recommande au moins ~39 points d'entraînement par centroïde
+    return max(1, min(wanted, n // 39))
+
+
+def _pq_m(dim: int, wanted: int) -> int:
+    # le nombre de sous-quantificateurs doit diviser la dimension
+    m = min(wanted, dim)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def training_sample(vectors: np.ndarray, size: int, seed: int = 0) -> np.ndarray:
+    if len(vectors) <= size:
+        return vectors
+    rows = np.random.default_rng(seed).choice(len(vectors), size=size, replace=False)
+    return vectors[np.sort(rows)]
+
+
+def build_ann_index(vectors: np.ndarray, index_type: str = INDEX_TYPE, params: dict = None,
+                    metric: int = faiss.METRIC_L2):
+    """Construit (et entraîne si besoin) un index du type demandé ; renvoie (index, type effectif)."""
+    params = {**INDEX_PARAMS, **(params or {})}
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type} (expected one of {INDEX_TYPES})")
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+
+    # trop peu de points pour entraîner les quantificateurs : on se replie
+    if index_type == "ivf_pq" and n < 39 * 2 ** params["pq_bits"]:
+        index_type = "ivf_flat"
+    if index_type == "ivf_flat" and n < 39 * 4:
+        index_type = "flat"
+
+    if index_type == "flat":
+        index = faiss.IndexFlat(dim, metric)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"], metric)
+        index.hnsw.efConstruction = params["ef_construction"]
+    else:
+        quantizer = faiss.IndexFlat(dim, metric)
+        nlist = _nlist(n, params["nlist"])
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        else:
+            index = faiss.IndexIVFPQ(
+                quantizer, dim, nlist, _pq_m(dim, params["pq_m"]), params["pq_bits"], metric
+            )
+        index.train(training_sample(vectors, params["train_size"]))
+
+    index.add(vectors)
+    apply_search_params(index, index_type, params)
+    return index, index_type
+
+
+def apply_search_params(index, index_type: str, params: dict = None):
+    params = {**INDEX_PARAMS, **(params or {})}
+    if index_type in ("ivf_flat", "ivf_pq"):
+        index.nprobe = params["nprobe"]
+    elif index_type == "hnsw":
+        index.hnsw.efSearch = params["ef_search"]
+
+
+def index_memory_bytes(index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def serving_index_bytes(index, path=None) -> int:
+    """Taille de l'index servi, calculée une fois au chargement (sans resérialiser si possible)."""
+    if isinstance(index, faiss.IndexFlat):
+        # vecteurs float32 stockés à plat
+        return int(index.ntotal) * int(index.d) * 4
+    ann_path = Path(path) / ANN_NAME if path else None
+    if ann_path is not None and ann_path.exists():
+        return ann_path.stat().st_size
+    return index_memory_bytes(index)
+
+
+def read_index_meta(path) -> dict:
+    meta_path = Path(path) / META_NAME
+    if not meta_path.exists():
+        return {"index_type": "flat", "params": {}}
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_serving_index(vectorstore, path, index_type: str = INDEX_TYPE, params: dict = None) -> dict:
+    """Reconstruit ann.faiss depuis l'index exact et écrit index_meta.json."""
+    params = {**INDEX_PARAMS, **(params or {})}
+    base = vectorstore.index
+    path = Path(path)
+    t0 = time.perf_counter()
+
+    effective = "flat"
+    if index_type != "flat" and base.ntotal:
+        vectors = base.reconstruct_n(0, base.ntotal)
+        ann, effective = build_ann_index(vectors, index_type, params, base.metric_type)
+        if effective != "flat":
+            faiss.write_index(ann, str(path / ANN_NAME))
+    if effective == "flat" and (path / ANN_NAME).exists():
+        os.remove(path / ANN_NAME)
+
+    meta = {
+        "index_type": effective,
+        "params": params,
+        "ntotal": int(base.ntotal),
+        "dim": int(base.d),
+        "build_seconds": round(time.perf_counter() - t0, 3),
+    }
+    tmp_path = path / (META_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, path / META_NAME)
+
+    if effective != index_type:
+        print(f"Index type '{index_type}' needs more vectors; serving '{effective}' instead.")
+    return meta
+
+
+def load_serving_index(path, meta: dict):
+    """Index ANN décrit par index_meta.json, ou None pour garder l'index exact."""
+    if meta.get("index_type", "flat") == "flat":
+        return None
+    ann_path = Path(path) / ANN_NAME
+    if not ann_path.exists():
+        return None
+    index = faiss.read_index(str(ann_path))
+    apply_search_params(index, meta["index_type"], meta.get("params"))
+    return index
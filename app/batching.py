@@ -0,0 +1,115 @@
+# app/batching.py
+
+import time
+import queue
+import threading
+
+from .config import BATCH_MAX_WAIT_MS
+
+
+
+# Micro-batching des appels concurrents (embedding de la question, recherche FAISS)
+#   - chaque appelant dépose sa requête et attend son résultat
+#   - un thread répartiteur prend tout ce qui attend (au plus max_batch), fait UN appel groupé,
+#     puis rend à chacun son résultat (ou l'exception de l'appel groupé)
+#   - pendant qu'un lot est traité, les nouvelles requêtes s'accumulent pour le lot suivant
+#   - la fenêtre max_wait_ms n'est attendue que sous charge (lot précédent > 1 requête) :
+#     une requête isolée part tout de suite, sans latence ajoutée
+
+
+class _Pending:
+    __slots__ = ("item", "result", "error", "done")
+
+    def __init__(self, item):
+        self.item = item
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    batcher = MicroBatcher(lambda texts: embeddings.embed_documents(texts), max_batch=32)
+    vector = batcher.submit("question")   # bloquant, depuis n'importe quel thread
+    fn reçoit la liste des items d'un lot et renvoie la liste des résultats, dans le même ordre.
+    """
+
+    def __init__(self, fn, max_batch: int, max_wait_ms: float = BATCH_MAX_WAIT_MS, name: str = "batcher"):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_size = 0
+
+        self.batches = 0
+        self.items = 0
+        self.largest = 0
+        self.errors = 0
+
+    def submit(self, item):
+        pending = _Pending(item)
+        self._ensure_thread()
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        # requêtes déjà en attente : prises sans délai
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        # sous charge : on laisse max_wait aux requêtes qui arrivent pour grossir le lot
+        if self._last_size > 1 and self.max_wait > 0:
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=left))
+                except queue.Empty:
+                    break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self._last_size = len(batch)
+            try:
+                results = self.fn([p.item for p in batch])
+                for pending, result in zip(batch, results):
+                    pending.result = result
+            except Exception as e:
+                self.errors += 1
+                for pending in batch:
+                    pending.error = e
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.largest = max(self.largest, len(batch))
+            for pending in batch:
+                pending.done.set()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest": self.largest,
+            "errors": self.errors,
+        }
@@ -0,0 +1,181 @@
+# app/cache.py
+
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from .config import (
+    QUERY_CACHE_SIZE,
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_TTL,
+    SEMANTIC_CACHE,
+    SEMANTIC_CACHE_THRESHOLD,
+)
+
+
+
+# Cache à deux niveaux devant la chaîne RAG
+#   niveau 1 : question normalisée -> (embedding de la question, ids des chunks retrouvés)
+#   niveau 2 : (agent, question, hash du contexte, modèle) -> réponse, avec TTL
+
+def normalize_question(question: str) -> str:
+    q = unicodedata.normalize("NFC", question or "").lower()
+    q = re.sub(r"\s+", " ", q).strip()
+    return q.rstrip(" ?!.")
+
+
+def text_hash(*parts: str) -> str:
+    h = hashlib.sha1()
+    for part in parts:
+        h.update((part or "").encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class QueryCache:
+    """LRU : question normalisée -> {"embedding", "doc_ids"}."""
+
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, embedding, doc_ids):
+        with self._lock:
+            self._data[key] = {"embedding": embedding, "doc_ids": doc_ids}
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class AnswerCache:
+    """
+    Réponses générées, avec TTL.
+    Mode sémantique : réutilise la réponse d'une question quasi identique
+    (cosinus >= seuil) pour le même agent et le même contexte retrouvé.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        semantic: bool = SEMANTIC_CACHE,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.semantic = semantic
+        self.threshold = threshold
+        self._data = OrderedDict()     # clé exacte -> (réponse, expiration, bucket, embedding)
+        self._buckets = {}             # (agent, contexte, modèle) -> set de clés exactes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_keys(agent_type, question, context_hash, model):
+        bucket = (agent_type, context_hash, model)
+        return text_hash(agent_type or "", normalize_question(question), context_hash, model), bucket
+
+    def _drop(self, key):
+        _, _, bucket, _ = self._data.pop(key)
+        keys = self._buckets.get(bucket)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._buckets[bucket]
+
+    def get(self, agent_type, question, context_hash, model, embedding=None):
+        key, bucket = self.make_keys(agent_type, question, context_hash, model)
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] < now:
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            if self.semantic and embedding is not None:
+                answer = self._semantic_lookup(bucket, embedding, now)
+                if answer is not None:
+                    self.semantic_hits += 1
+                    return answer
+
+            self.misses += 1
+            return None
+
+    def _semantic_lookup(self, bucket, embedding, now):
+        query = np.asarray(embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query) or 1.0
+        best, best_score = None, self.threshold
+        for key in list(self._buckets.get(bucket, ())):
+            answer, expires, _, other = self._data[key]
+            if expires < now:
+                self._drop(key)
+                continue
+            if other is None:
+                continue
+            score = float(np.dot(query, other) / (query_norm * (np.linalg.norm(other) or 1.0)))
+            if score >= best_score:
+                best, best_score = answer, score
+        return best
+
+    def put(self, agent_type, question, context_hash, model, answer, embedding=None):
+        key, bucket = self.make_keys(agent_type, question, context_hash, model)
+        vec = np.asarray(embedding, dtype=np.float32) if embedding is not None else None
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (answer, time.time() + self.ttl, bucket, vec)
+            self._buckets.setdefault(bucket, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._drop(next(iter(self._data)))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._buckets.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.semantic_hits) / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,271 @@
+# app/chunkstore.py
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from .config import DOCSTORE_CACHE_SIZE
+
+
+
+# Chunks de l'index en colonnes sur disque (remplace le docstore picklé index.pkl)
+#   chunks/<colonne>.bin.npy  octets UTF-8 de toutes les lignes, bout à bout
+#   chunks/<colonne>.idx.npy  offsets int64 (n + 1) : la ligne i est bin[idx[i]:idx[i + 1]]
+#   colonnes : id, text, url, title, school, type, source, extra (autres métadonnées en JSON)
+#   chunks/id_hash.npy / id_pos.npy  hash 64 bits des ids triés -> position (recherche dichotomique)
+# La ligne i correspond à la position i de l'index FAISS. Tout est ouvert en mmap : le chargement
+# ne lit rien, les pages du fichier sont partagées entre processus, et seuls les top-k retrouvés
+# deviennent des Document. Aucun pickle : plus besoin d'allow_dangerous_deserialization.
+# La recherche FAISS construit les Document directement depuis les positions (documents_at) ;
+# les derniers construits sont gardés (LRU) pour les hits du cache de requêtes (get_by_ids).
+
+CHUNKS_DIR = "chunks"
+COLUMNS = ("url", "title", "school", "type", "source")
+FORMAT_VERSION = 1
+
+
+def _id_hash(doc_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(doc_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _write_column(out: Path, name: str, values):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(out / f"{name}.bin.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(out / f"{name}.idx.npy", offsets)
+
+
+def write_chunk_store(vectorstore, path) -> int:
+    """Écrit les chunks d'un FAISS LangChain (ordre des positions) dans path/chunks/."""
+    n = vectorstore.index.ntotal
+    ids, docs = [], []
+    for pos in range(n):
+        doc_id = vectorstore.index_to_docstore_id[pos]
+        ids.append(doc_id)
+        docs.append(vectorstore.docstore.search(doc_id))
+
+    out = Path(path) / CHUNKS_DIR
+    tmp = Path(path) / (CHUNKS_DIR + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    _write_column(tmp, "id", ids)
+    _write_column(tmp, "text", [d.page_content for d in docs])
+    for column in COLUMNS:
+        _write_column(tmp, column, [str(d.metadata.get(column) or "") for d in docs])
+    extras = []
+    for d in docs:
+        extra = {k: v for k, v in d.metadata.items() if k not in COLUMNS}
+        extras.append(json.dumps(extra, ensure_ascii=False) if extra else "")
+    _write_column(tmp, "extra", extras)
+
+    hashes = np.fromiter((_id_hash(i) for i in ids), dtype=np.uint64, count=n)
+    order = np.argsort(hashes, kind="stable")
+    np.save(tmp / "id_hash.npy", hashes[order])
+    np.save(tmp / "id_pos.npy", order.astype(np.int64))
+
+    with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({"format": FORMAT_VERSION, "count": n, "columns": ["id", "text", *COLUMNS, "extra"]}, f)
+
+    shutil.rmtree(out, ignore_errors=True)
+    os.replace(tmp, out)
+    return n
+
+
+class ChunkStore:
+    """Lecture seule, memory-mappée ; Document matérialisé à la demande (LRU de cache_size)."""
+
+    def __init__(self, path, cache_size: int = DOCSTORE_CACHE_SIZE):
+        self.dir = Path(path) / CHUNKS_DIR
+        with open(self.dir / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported chunk store format: {meta.get('format')}")
+        self.count = meta["count"]
+        # vues ndarray sur les fichiers mappés : l'indexation de np.memmap coûte plus cher
+        self._columns = {
+            name: (self._map(f"{name}.bin.npy"), self._map(f"{name}.idx.npy"))
+            for name in meta["columns"]
+        }
+        self._hashes = self._map("id_hash.npy")
+        self._positions = self._map("id_pos.npy")
+
+        self.cache_size = cache_size
+        self._docs = OrderedDict()   # position -> Document
+        self._by_id = {}             # id -> position, pour les Documents du LRU
+        self._lock = threading.Lock()
+
+    def _map(self, name: str) -> np.ndarray:
+        return np.load(self.dir / name, mmap_mode="r").view(np.ndarray)
+
+    @classmethod
+    def exists(cls, path) -> bool:
+        return (Path(path) / CHUNKS_DIR / "meta.json").exists()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def value(self, column: str, pos: int) -> str:
+        blob, offsets = self._columns[column]
+        return bytes(blob[offsets[pos]:offsets[pos + 1]]).decode("utf-8")
+
+    def id_at(self, pos: int) -> str:
+        return self.value("id", pos)
+
+    def position(self, doc_id: str):
+        """Position FAISS d'un id (None si absent)."""
+        pos = self._by_id.get(doc_id)
+        if pos is not None:
+            return pos
+        h = np.uint64(_id_hash(doc_id))
+        i = int(np.searchsorted(self._hashes, h))
+        # collisions de hash : on vérifie l'id de chaque candidat
+        while i < self.count and self._hashes[i] == h:
+            pos = int(self._positions[i])
+            if self.id_at(pos) == doc_id:
+                return pos
+            i += 1
+        return None
+
+    def document(self, pos: int) -> Document:
+        with self._lock:
+            doc = self._docs.get(pos)
+            if doc is not None:
+                self._docs.move_to_end(pos)
+                return doc
+        doc = self._build(pos)
+        with self._lock:
+            self._docs[pos] = doc
+            self._by_id[doc.id] = pos
+            while len(self._docs) > self.cache_size:
+                _, old = self._docs.popitem(last=False)
+                self._by_id.pop(old.id, None)
+        return doc
+
+    def documents(self, positions) -> list:
+        return [self.document(int(pos)) for pos in positions if pos >= 0]
+
+    def _build(self, pos: int) -> Document:
+        metadata = {}
+        extra = self.value("extra", pos)
+        if extra:
+            metadata.update(json.loads(extra))
+        for column in COLUMNS:
+            value = self.value(column, pos)
+            if value:
+                metadata[column] = value
+        return Document(id=self.id_at(pos), page_content=self.value("text", pos), metadata=metadata)
+
+    def column(self, name: str) -> list:
+        """Toutes les valeurs d'une colonne de métadonnées (None si vide), sans matérialiser les Documents."""
+        blob, offsets = self._columns[name]
+        data = bytes(blob)
+        return [
+            data[offsets[i]:offsets[i + 1]].decode("utf-8") or None
+            for i in range(self.count)
+        ]
+
+    def disk_bytes(self) -> int:
+        return sum(f.stat().st_size for f in self.dir.iterdir())
+
+
+class ChunkDocstore(Docstore):
+    """Docstore LangChain (lecture seule) adossé au ChunkStore."""
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    def search(self, search: str):
+        pos = self.store.position(search)
+        if pos is None:
+            return f"ID {search} not found."
+        return self.store.document(pos)
+
+
+def documents_at(vectorstore, positions) -> list:
+    """Documents aux positions FAISS (-1 ignoré) ; ChunkStore : sans passer par les ids."""
+    store = getattr(vectorstore.docstore, "store", None)
+    if store is not None:
+        return store.documents(positions)
+    return [
+        vectorstore.docstore.search(vectorstore.index_to_docstore_id[int(pos)])
+        for pos in positions
+        if pos >= 0
+    ]
+
+
+class _PositionIds(Mapping):
+    """index_to_docstore_id sans dict en mémoire : position -> id lu dans la colonne id."""
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    def __getitem__(self, pos):
+        if not 0 <= pos < self.store.count:
+            raise KeyError(pos)
+        return self.store.id_at(pos)
+
+    def __iter__(self):
+        return iter(range(self.store.count))
+
+    def __len__(self):
+        return self.store.count
+
+
+
+# Sauvegarde / chargement d'un vectorstore (index.faiss + chunks/)
+
+def save_vectorstore(vectorstore, path):
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    faiss.write_index(vectorstore.index, str(path / "index.faiss"))
+    write_chunk_store(vectorstore, path)
+    # ancien docstore picklé (copié d'une version précédente) : plus lu, retiré
+    (path / "index.pkl").unlink(missing_ok=True)
+
+
+def _load_legacy(path, embeddings, **kwargs):
+    # index construit avant le ChunkStore : seul format qui demande la désérialisation pickle
+    print(f"[index] {path}: legacy pickled docstore, run a full ingest to convert it")
+    return FAISS.load_local(str(path), embeddings, allow_dangerous_deserialization=True, **kwargs)
+
+
+def open_vectorstore(path, embeddings, index=None):
+    """FAISS en lecture seule pour le service : chunks mappés, index fourni ou lu (mmap)."""
+    if not ChunkStore.exists(path):
+        vectorstore = _load_legacy(path, embeddings)
+        if index is not None:
+            vectorstore.index = index
+        return vectorstore
+    store = ChunkStore(path)
+    if index is None:
+        index = faiss.read_index(str(Path(path) / "index.faiss"), faiss.IO_FLAG_MMAP)
+    return FAISS(embeddings, index, ChunkDocstore(store), _PositionIds(store))
+
+
+def load_mutable_vectorstore(path, embeddings):
+    """FAISS modifiable (ingestion incrémentale) : chunks rechargés dans un docstore en mémoire."""
+    if not ChunkStore.exists(path):
+        return _load_legacy(path, embeddings)
+    store = ChunkStore(path)
+    index = faiss.read_index(str(Path(path) / "index.faiss"))
+    docs = [store.document(pos) for pos in range(len(store))]
+    return FAISS(
+        embeddings,
+        index,
+        InMemoryDocstore({d.id: d for d in docs}),
+        {pos: d.id for pos, d in enumerate(docs)},
+    )
@@ -0,0 +1,157 @@
+# app/client.py
+
+import json
+import urllib.error
+import urllib.request
+
+from .agents import AgentResponse, AgentStream
+from .config import LLM_TIMEOUT
+from .limiter import RequestRejected, RequestTimeout
+from .memory import ConversationMemory
+from .uploads import file_hash
+from .extraction import extract_upload_text
+
+
+
+# Client du serveur HTTP (app/server.py)
+#   Même interface que AgentRouter (route / stream / handle / upload / status) :
+#   Streamlit peut l'utiliser à la place du routeur local (config.API_URL).
+
+class ApiUpload:
+    """Document uploadé côté serveur ; le texte est gardé pour le renvoyer s'il a expiré."""
+
+    def __init__(self, file_id: str, upload_id: str, name: str, n_chunks: int, text: str):
+        self.file_id = file_id        # hash du fichier, comme UploadIndex
+        self.upload_id = upload_id    # identifiant côté serveur (hash du texte)
+        self.name = name
+        self.n_chunks = n_chunks
+        self.text = text
+
+
+def raise_for_status(status: int, message: str):
+    if status == 503:
+        raise RequestRejected(message)
+    if status == 504:
+        raise RequestTimeout(message)
+    raise RuntimeError(f"API error {status}: {message}")
+
+
+class ApiRouter:
+    def __init__(self, base_url: str, timeout: float = LLM_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    # HTTP
+
+    def _open(self, path: str, payload: dict = None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=data,
+            headers={"Content-Type": "application/json"},
+            method="POST" if data is not None else "GET",
+        )
+        try:
+            # marge au-delà du délai serveur (attente en file + génération)
+            return urllib.request.urlopen(request, timeout=self.timeout + 10)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error", "")
+            except ValueError:
+                message = e.reason
+            raise_for_status(e.code, message)
+
+    def _call(self, path: str, payload: dict = None) -> dict:
+        with self._open(path, payload) as response:
+            return json.loads(response.read())
+
+    # interface AgentRouter
+
+    def route(self, question: str) -> str:
+        return self._call("/api/route", {"question": question})["agent"]
+
+    def retrieve(self, question: str, k: int = None, agent: str = None, school: str = None) -> list:
+        payload = {"question": question, "k": k, "agent": agent, "school": school}
+        return self._call("/api/retrieve", payload)["documents"]
+
+    def upload(self, data: bytes, name: str, extract_text=None) -> ApiUpload:
+        # extraction côté client (cache local) : seul le texte est envoyé au serveur
+        text = extract_text(data) if extract_text else extract_upload_text(data, name)
+        result = self._call("/api/upload", {"name": name, "text": text})
+        return ApiUpload(file_hash(data), result["upload_id"], name, result["chunks"], text)
+
+    def handle(self, question: str, history=None, school=None, upload=None,
+               timeout: float = None) -> AgentResponse:
+        stream = self.stream(question, history=history, school=school, upload=upload, timeout=timeout)
+        for _ in stream:
+            pass
+        return stream.to_response()
+
+    def stream(self, question: str, history=None, school=None, upload=None,
+               timeout: float = None) -> AgentStream:
+        # mémoire de la session : seule la fenêtre des derniers échanges est envoyée
+        if isinstance(history, ConversationMemory):
+            upload = upload or history.upload
+            history = history.to_messages()
+        payload = {
+            "question": question,
+            "history": history,
+            "school": school,
+            "upload_id": upload.upload_id if upload is not None else None,
+            "timeout": timeout or self.timeout,
+        }
+        try:
+            response = self._open("/api/ask/stream", payload)
+        except RuntimeError as e:
+            # document expiré côté serveur : on le renvoie une fois
+            if upload is None or "upload_id" not in str(e):
+                raise
+            self._call("/api/upload", {"name": upload.name, "text": upload.text})
+            response = self._open("/api/ask/stream", payload)
+
+        events = self._events(response)
+        event, data = next(events)
+        if event == "error":
+            response.close()
+            raise_for_status(data.get("status", 500), data.get("error", ""))
+        return AgentStream(data["agent"], self._tokens(response, events), query=data.get("query"))
+
+    def generation_stats(self) -> dict:
+        return self.status()["generation"]
+
+    def status(self) -> dict:
+        return self._call("/api/stats")
+
+    def health(self) -> dict:
+        return self._call("/health")
+
+    def reload(self) -> dict:
+        return self._call("/admin/reload", {})
+
+    # SSE
+
+    @staticmethod
+    def _events(response):
+        event, data = None, []
+        for raw in response:
+            line = raw.decode("utf-8").rstrip("\r\n")
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data.append(line[5:].strip())
+            elif not line and data:
+                yield event, json.loads("\n".join(data))
+                event, data = None, []
+
+    @staticmethod
+    def _tokens(response, events):
+        try:
+            for event, data in events:
+                if event == "error":
+                    raise_for_status(data.get("status", 500), data.get("error", ""))
+                if event == "done":
+                    return
+                yield data["token"]
+        finally:
+            # fermer la connexion = le serveur arrête la génération
+            response.close()
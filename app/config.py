@@ -8,5 +8,151 @@ CHUNK_SIZE = 400
 CHUNK_OVERLAP = 60
 WEB_JSONL_PATH = "data/esilv_docs/all_sites_VF.jsonl"
 
+# Extraction du texte des PDF / TXT (ingestion + uploads, voir app/extraction.py)
+EXTRACTION_CACHE_PATH = "storage/extraction_cache"
+EXTRACT_WORKERS = 4              # processus d'extraction
+EXTRACT_PAGES_PER_TASK = 8       # pages par tâche ; un PDF plus petit est extrait sans le pool
+
+# Crawler du site (python -m app.crawler) : écrit WEB_JSONL_PATH
+CRAWL_SITEMAPS = {
+    "esilv": "https://www.esilv.fr/sitemap_index.xml",
+    "emlv": "https://www.emlv.fr/sitemap_index.xml",
+    "iim": "https://www.iim.fr/sitemap_index.xml",
+}
+CRAWL_STATE_PATH = "data/crawl_state.json"
+CRAWL_WORKERS = 8                # requêtes simultanées (tous hôtes confondus)
+CRAWL_HOST_RPS = 2.0             # requêtes par seconde et par hôte
+CRAWL_TIMEOUT = 15               # secondes
+CRAWL_CHECKPOINT_EVERY = 100     # pages entre deux sauvegardes de l'état (reprise)
+CRAWL_USER_AGENT = "ESILV-RAG-crawler/1.0"
+
+# Versions de l'index (VECTORSTORE_PATH/CURRENT -> versions/<version>/)
+INDEX_WATCH = True               # recharger automatiquement une nouvelle version publiée
+INDEX_WATCH_INTERVAL = 5         # secondes entre deux vérifications de CURRENT
+INDEX_KEEP_VERSIONS = 2          # versions terminées gardées sur disque (en plus de celles en cours d'usage)
+
+# Cache disque des embeddings (ingestion + requêtes)
+EMBEDDING_CACHE_PATH = "storage/embedding_cache"
+EMBEDDING_CACHE_MAX_MB = 512
+
+# Pipeline d'ingestion (batches d'embedding, workers, file bornée, checkpoints)
+EMBED_BATCH_SIZE = 64
+EMBED_WORKERS = 4
+EMBED_QUEUE_SIZE = 8
+CHECKPOINT_EVERY = 50
+
+# Déduplication du corpus à l'ingestion (voir app/dedup.py)
+CORPUS_DEDUP = True
+BOILERPLATE_MIN_PAGES = 5        # une ligne présente sur autant de pages est retirée de toutes
+BOILERPLATE_SKETCH_WIDTH = 1 << 20   # count-min sketch 4 x width compteurs 16 bits (~8 Mo)
+NEAR_DUP_THRESHOLD = 0.85        # Jaccard estimé (MinHash) : page ou chunk quasi identique
+LSH_BANDS = 16                   # 16 bandes de 4 lignes : rappel ~1 au-dessus du seuil
+DEDUP_MAX_ITEMS = 200000         # signatures gardées au plus par index LSH
+
+# Index de service construit en fin d'ingestion : flat | ivf_flat | hnsw | ivf_pq
+INDEX_TYPE = "flat"
+INDEX_PARAMS = {
+    "nlist": 256,            # IVF : nombre de listes inversées
+    "nprobe": 16,            # IVF : listes visitées par requête
+    "hnsw_m": 32,            # HNSW : voisins par nœud
+    "ef_construction": 200,
+    "ef_search": 64,
+    "pq_m": 16,              # PQ : sous-quantificateurs (doit diviser la dimension)
+    "pq_bits": 8,
+    "train_size": 20000,     # échantillon d'entraînement IVF / PQ
+}
+
+# Retrieval
+RETRIEVER_K = 6
+SUBINDEX_MAX_MB = 256            # sous-index par filtre (type, école) gardés en mémoire, au total
+DOCSTORE_CACHE_SIZE = 2048       # Documents déjà construits depuis le ChunkStore (LRU par version)
+
+# agent -> type de chunks recherché (métadonnée "type" posée à l'ingestion)
+# None = recherche sur tout l'index
+AGENT_DOC_TYPES = {
+    "admissions": "admissions",
+    "student_life": "student_life",
+    "academics": "academics",
+    "admin": None,
+}
+
+# Recherche hybride : BM25 (index lexical) + FAISS, fusion par rang réciproque
+HYBRID_SEARCH = True
+HYBRID_CANDIDATES = 20   # candidats de chaque côté avant fusion
+RRF_K = 60
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Reranking (cross-encoder local, optionnel : pip install sentence-transformers)
+RERANK = True
+RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"   # multilingue, CPU
+RERANK_CANDIDATES = 30           # chunks sur-récupérés avant reranking
+RERANK_BATCH_SIZE = 16
+RERANK_BUDGET_MS = 300           # au-delà : ordre de la recherche conservé
+RERANK_MIN_SCORE = 0.1           # score (0-1) minimal pour garder un chunk
+
+# Contexte injecté dans le prompt (budget en tokens estimés, voir app/context.py)
+CONTEXT_MAX_TOKENS = 500         # extraits du corpus
+UPLOAD_MAX_TOKENS = 500          # extraits du document uploadé
+CONTEXT_DEDUP_THRESHOLD = 0.8    # Jaccard estimé (MinHash) au-delà duquel un chunk est un doublon
+
+# Documents uploadés : chunks retrouvés par question
+UPLOAD_K = 4
+
+# Cache des questions (embedding + chunks retrouvés) et des réponses
+QUERY_CACHE_SIZE = 1024
+ANSWER_CACHE_SIZE = 2048
+ANSWER_CACHE_TTL = 3600          # secondes
+SEMANTIC_CACHE = False           # réutiliser la réponse d'une question quasi identique
+SEMANTIC_CACHE_THRESHOLD = 0.95  # cosinus minimal
+
+# Routage : mots-clés si un seul agent est cité, sinon questions types embeddées
+SEMANTIC_ROUTING = False         # à activer si python -m benchmarks.routing (vrais embeddings) bat la cascade
+ROUTER_MIN_SIMILARITY = 0.35     # en dessous : route peu sûre, cascade de mots-clés à la place
+ROUTER_MIN_MARGIN = 0.03         # écart minimal avec le 2e agent
+
+# Mémoire de conversation par session (voir app/memory.py)
+MEMORY_TURNS = 6                 # derniers échanges gardés (fenêtre glissante)
+MEMORY_ANSWER_CHARS = 300        # réponse tronquée dans la mémoire
+MEMORY_PROMPT_CHARS = 1500       # échanges récents injectés dans le prompt des relances
+MEMORY_CARRY_TERMS = 8           # termes de la question précédente ajoutés à une relance
+MEMORY_DISPLAY_MESSAGES = 100    # messages affichés par Streamlit (les plus anciens sont oubliés)
+MEMORY_LLM_REWRITE = False       # relance reformulée par le LLM au lieu des termes repris
+REWRITE_CACHE_SIZE = 1024
+
+# Micro-batching des questions simultanées : embedding et recherche FAISS groupés (voir app/batching.py)
+QUERY_BATCHING = True
+EMBED_BATCH_MAX = 32             # questions max par appel d'embedding
+SEARCH_BATCH_MAX = 64            # questions max par index.search
+BATCH_MAX_WAIT_MS = 2            # attente max pour grossir un lot (seulement sous charge)
+
+# Backend LLM : générations simultanées, file d'attente, délai max par requête
+LLM_MAX_CONCURRENCY = 4
+LLM_MAX_QUEUE = 32
+LLM_TIMEOUT = 120                # secondes (attente en file + génération)
+
+# Traces par étape de la chaîne RAG (voir app/tracing.py)
+TRACE_WINDOW = 2000              # dernières requêtes gardées pour les percentiles
+TRACE_PERSIST = True             # spans aussi écrits dans le store SQLite (table spans)
+TRACE_SLOW_MS = 5000             # requête lente : détaillée sur la page Admin
+TRACE_PROFILE = False            # cProfile sur chaque requête, .prof gardé si lente
+TRACE_PROFILE_DIR = "storage/profiles"
+TRACE_MAX_PROFILES = 50
+TRACE_RETENTION_DAYS = 14        # spans plus anciens supprimés du store SQLite
+TRACE_MAX_SPANS = 2_000_000      # et au plus ce nombre de lignes (les plus récentes)
+
+# Statistiques d'usage (SQLite, voir app/analytics.py)
+ANALYTICS_DB_PATH = "data/admin/analytics.db"
+ANALYTICS_CSV_DIR = "data/admin"  # anciens CSV, importés une fois
+ANALYTICS_FLUSH_INTERVAL = 1.0   # secondes max avant l'écriture d'un lot
+ANALYTICS_BATCH_SIZE = 500       # événements max par transaction
+ANALYTICS_PRUNE_INTERVAL = 600   # secondes entre deux purges de la table spans
+
+# Serveur HTTP (python -m app.server) ; API_URL renseigné -> Streamlit devient un client léger
+API_HOST = "127.0.0.1"
+API_PORT = 8000
+API_URL = None                   # ex. "http://127.0.0.1:8000"
+API_MAX_UPLOADS = 64             # documents uploadés gardés en mémoire par le serveur
+
 
 
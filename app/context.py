@@ -0,0 +1,172 @@
+# app/context.py
+
+import re
+import math
+import threading
+
+from .config import CONTEXT_MAX_TOKENS, CONTEXT_DEDUP_THRESHOLD, CHUNK_OVERLAP
+from .minhash import signature, similarity
+
+
+
+# Construction du contexte RAG sous un budget en tokens
+#   1. fusion des chunks adjacents d'une même source (le recouvrement CHUNK_OVERLAP n'est gardé qu'une fois),
+#      sans dépasser le budget : un groupe trop gros serait écarté en entier à l'étape 3
+#   2. suppression des quasi-doublons (MinHash sur shingles de mots)
+#   3. remplissage glouton par pertinence : chunks entiers uniquement, jamais coupés
+#   Les tokens sont estimés (pas de tokenizer gemma en local) : ~4 caractères par token et par mot.
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation du nombre de tokens (sous-mots) : un mot long compte pour plusieurs tokens."""
+    return sum(max(1, math.ceil(len(t) / 4)) for t in _TOKEN_RE.findall(text or ""))
+
+
+def _source(doc):
+    meta = doc.metadata or {}
+    return meta.get("url") or meta.get("source"), meta.get("page")
+
+
+def _overlap(left: str, right: str, max_chars: int = 2 * CHUNK_OVERLAP, min_chars: int = 20) -> int:
+    """Longueur du plus long suffixe de left qui est aussi préfixe de right (0 si aucun)."""
+    for size in range(min(max_chars, len(left), len(right)), min_chars - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class _Group:
+    """Un ou plusieurs chunks contigus d'une même source, fusionnés."""
+
+    def __init__(self, rank: int, doc):
+        self.rank = rank
+        self.source = _source(doc)
+        self.start = (doc.metadata or {}).get("start_index")
+        self.text = doc.page_content
+        self.chunks = 1
+
+    def try_merge(self, other, max_tokens: int = None) -> int:
+        """
+        Fusionne other s'il suit ou précède ce groupe ; renvoie le nb de caractères économisés (-1 sinon).
+        max_tokens : pas de fusion si le groupe obtenu dépasse ce budget.
+        """
+        if other.source != self.source or self.source == (None, None):
+            return -1
+        for left, right, other_first in ((self, other, False), (other, self, True)):
+            if left.start is not None and right.start is not None:
+                # positions connues : right commence avant la fin de left
+                end = left.start + len(left.text)
+                if not (left.start < right.start <= end):
+                    continue
+                size = end - right.start
+                if left.text[len(left.text) - size:] != right.text[:size]:
+                    continue
+            else:
+                size = _overlap(left.text, right.text)
+                if not size:
+                    continue
+            text = left.text + right.text[size:]
+            if max_tokens is not None and estimate_tokens(text) > max_tokens:
+                return -1
+            self.text = text
+            if other_first:
+                self.start = other.start
+            self.rank = min(self.rank, other.rank)
+            self.chunks += other.chunks
+            return size
+        return -1
+
+
+class ContextStats:
+    """Totaux sur toutes les requêtes : tokens envoyés au LLM vs tokens retrouvés mais écartés."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_used = 0
+        self.tokens_overlap = 0
+        self.tokens_duplicate = 0
+        self.tokens_over_budget = 0
+
+    def record(self, report: dict):
+        with self._lock:
+            self.requests += 1
+            self.tokens_used += report["tokens_used"]
+            self.tokens_overlap += report["tokens_overlap"]
+            self.tokens_duplicate += report["tokens_duplicate"]
+            self.tokens_over_budget += report["tokens_over_budget"]
+
+    def summary(self) -> dict:
+        wasted = self.tokens_overlap + self.tokens_duplicate + self.tokens_over_budget
+        total = self.tokens_used + wasted
+        n = self.requests or 1
+        return {
+            "requests": self.requests,
+            "avg_tokens_used": round(self.tokens_used / n, 1),
+            "avg_tokens_wasted": round(wasted / n, 1),
+            "tokens_overlap": self.tokens_overlap,
+            "tokens_duplicate": self.tokens_duplicate,
+            "tokens_over_budget": self.tokens_over_budget,
+            "waste_ratio": round(wasted / total, 3) if total else 0.0,
+        }
+
+
+def pack_context(docs, max_tokens: int = CONTEXT_MAX_TOKENS, dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD):
+    """
+    docs : chunks par pertinence décroissante.
+    Renvoie (texte du contexte, rapport) ; le rapport compte les tokens utilisés et écartés.
+    """
+    report = {
+        "chunks_in": len(docs),
+        "chunks_out": 0,
+        "tokens_retrieved": sum(estimate_tokens(d.page_content) for d in docs),
+        "tokens_used": 0,
+        "tokens_overlap": 0,
+        "tokens_duplicate": 0,
+        "tokens_over_budget": 0,
+    }
+
+    # 1. fusion des chunks contigus (un chunk peut recoller deux groupes déjà formés) ;
+    #    les chunks les plus pertinents fusionnent d'abord, les suivants restent à part si le groupe est plein
+    groups = []
+    for rank, doc in enumerate(docs):
+        current = _Group(rank, doc)
+        merged = True
+        while merged:
+            merged = False
+            for group in groups:
+                saved = group.try_merge(current, max_tokens)
+                if saved >= 0:
+                    report["tokens_overlap"] += estimate_tokens(current.text[:saved]) if saved else 0
+                    groups.remove(group)
+                    current = group
+                    merged = True
+                    break
+        groups.append(current)
+    groups.sort(key=lambda g: g.rank)
+
+    # 2. quasi-doublons : on garde le plus pertinent
+    kept, signatures = [], []
+    for group in groups:
+        sig = signature(group.text)
+        if any(similarity(sig, other) >= dedup_threshold for other in signatures):
+            report["tokens_duplicate"] += estimate_tokens(group.text)
+            continue
+        kept.append(group)
+        signatures.append(sig)
+
+    # 3. remplissage glouton par pertinence
+    parts, used = [], 0
+    for group in kept:
+        tokens = estimate_tokens(group.text)
+        if used + tokens > max_tokens:
+            report["tokens_over_budget"] += tokens
+            continue
+        parts.append(group.text)
+        used += tokens
+        report["chunks_out"] += group.chunks
+
+    report["tokens_used"] = used
+    return "\n\n".join(parts), report
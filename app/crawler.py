@@ -0,0 +1,358 @@
+# app/crawler.py
+
+import os
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+import xml.etree.ElementTree as ET
+
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+
+from .config import (
+    WEB_JSONL_PATH,
+    CRAWL_SITEMAPS,
+    CRAWL_STATE_PATH,
+    CRAWL_WORKERS,
+    CRAWL_HOST_RPS,
+    CRAWL_TIMEOUT,
+    CRAWL_CHECKPOINT_EVERY,
+    CRAWL_USER_AGENT,
+)
+from .ingest import is_useful_url
+
+
+
+# Crawler des sites des écoles -> WEB_JSONL_PATH (une page par ligne : url, title, text)
+#   - sitemaps -> urls filtrées par is_useful_url, écrites dans l'ordre du sitemap
+#   - requêtes concurrentes, connexions réutilisées (une session par thread), débit limité par hôte
+#   - requêtes conditionnelles (ETag / Last-Modified) : une page inchangée (304) est recopiée
+#     depuis le JSONL précédent au lieu d'être retéléchargée et réanalysée
+#   - le JSONL est écrit dans un fichier temporaire, substitué à la fin ; l'état (CRAWL_STATE_PATH)
+#     est sauvegardé toutes les CRAWL_CHECKPOINT_EVERY pages : un crawl interrompu reprend où il s'est arrêté
+#
+#   python -m app.crawler [--fresh] [--sitemap URL ...]
+
+MIN_TEXT_CHARS = 200
+
+
+class HostRateLimiter:
+    """Espace d'au moins 1 / rate secondes deux requêtes vers un même hôte."""
+
+    def __init__(self, rate: float = CRAWL_HOST_RPS):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = {}
+
+    def wait(self, url: str):
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next.get(host, now))
+            self._next[host] = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def _decode(response) -> str:
+    # r.text peut mal deviner l'encodage : décodage tolérant
+    return response.content.decode(response.encoding or "utf-8", errors="ignore")
+
+
+def extract_page(url: str, response):
+    """{"url", "title", "text"} d'une page HTML, None si ce n'est pas du HTML ou si elle est trop courte."""
+    ctype = (response.headers.get("Content-Type") or "").lower()
+    if "text/html" not in ctype:
+        return None
+
+    soup = BeautifulSoup(_decode(response), "html.parser")
+    for tag in soup(["header", "footer", "nav", "script", "style"]):
+        tag.decompose()
+
+    title = (soup.title.get_text(strip=True) if soup.title else "").strip()
+    text = soup.get_text("\n", strip=True)
+    if len(text) < MIN_TEXT_CHARS:
+        return None
+    return {"url": url, "title": title, "text": text}
+
+
+def parse_sitemap(xml: str):
+    """(est un index de sitemaps, liste des <loc>)."""
+    root = ET.fromstring(xml)
+    locs = [(loc.text or "").strip() for loc in root.iterfind(".//{*}loc")]
+    return root.tag.endswith("sitemapindex"), [loc for loc in locs if loc]
+
+
+def load_state(path=CRAWL_STATE_PATH) -> dict:
+    """
+    pages : url -> validateurs (etag, last_modified) + position de la page dans le JSONL publié
+    run   : crawl en cours (pages déjà écrites dans le fichier temporaire et sa taille), None sinon
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"pages": {}, "run": None}
+
+
+def save_state(state: dict, path=CRAWL_STATE_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class Crawler:
+    def __init__(
+        self,
+        sitemaps=None,
+        out_path: str = WEB_JSONL_PATH,
+        state_path: str = CRAWL_STATE_PATH,
+        workers: int = CRAWL_WORKERS,
+        host_rps: float = CRAWL_HOST_RPS,
+        timeout: float = CRAWL_TIMEOUT,
+        checkpoint_every: int = CRAWL_CHECKPOINT_EVERY,
+        fresh: bool = False,
+    ):
+        sitemaps = sitemaps or CRAWL_SITEMAPS
+        self.sitemaps = list(sitemaps.values()) if isinstance(sitemaps, dict) else list(sitemaps)
+        self.out_path = str(out_path)
+        self.state_path = str(state_path)
+        self.workers = workers
+        self.timeout = timeout
+        self.checkpoint_every = checkpoint_every
+        self.fresh = fresh
+        self.limiter = HostRateLimiter(host_rps)
+
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+        self.stats = {
+            "urls": 0,
+            "urls_filtered": 0,
+            "fetched": 0,
+            "not_modified": 0,
+            "not_useful": 0,
+            "gone": 0,
+            "errors": 0,
+            "written": 0,
+            "bytes_downloaded": 0,
+        }
+
+    # --- HTTP ---
+
+    def _session(self):
+        # une session par thread : pool de connexions keep-alive sans partager l'état (cookies) entre threads
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = CRAWL_USER_AGENT
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def _get(self, url: str, headers: dict = None):
+        self.limiter.wait(url)
+        response = self._session().get(url, timeout=self.timeout, headers=headers or {})
+        with self._lock:
+            self.stats["bytes_downloaded"] += len(response.content)
+        return response
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    # --- découverte des urls ---
+
+    def _sitemap_urls(self, sitemap: str) -> list:
+        try:
+            is_index, locs = parse_sitemap(_decode(self._get(sitemap)))
+        except (requests.RequestException, ET.ParseError) as e:
+            print(f"[crawl] sitemap {sitemap} skipped: {e}")
+            return []
+        if not is_index:
+            return locs
+        with ThreadPoolExecutor(self.workers) as pool:
+            return [url for urls in pool.map(self._sitemap_urls, locs) for url in urls]
+
+    def discover(self) -> list:
+        """Urls utiles de tous les sitemaps, sans doublons, dans l'ordre des sitemaps."""
+        urls, seen = [], set()
+        for sitemap in self.sitemaps:
+            for url in self._sitemap_urls(sitemap):
+                if url in seen:
+                    continue
+                seen.add(url)
+                if not is_useful_url(url):
+                    self.stats["urls_filtered"] += 1
+                    continue
+                urls.append(url)
+        self.stats["urls"] = len(urls)
+        return urls
+
+    # --- pages ---
+
+    def _fetch(self, url: str, previous: dict = None):
+        """(statut, page ou None, validateurs) ; statut : fetched | not_modified | gone | error."""
+        headers = {}
+        if previous:
+            if previous.get("etag"):
+                headers["If-None-Match"] = previous["etag"]
+            if previous.get("last_modified"):
+                headers["If-Modified-Since"] = previous["last_modified"]
+        try:
+            response = self._get(url, headers)
+        except requests.RequestException:
+            return "error", None, {}
+        if response.status_code == 304 and previous:
+            return "not_modified", None, {}
+        if response.status_code in (404, 410):
+            return "gone", None, {}
+        if response.status_code != 200:
+            return "error", None, {}
+
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        return "fetched", extract_page(url, response), validators
+
+    @staticmethod
+    def _read_previous(previous_file, entry: dict, url: str):
+        """Ligne de la page dans le JSONL publié (None si absente ou si le fichier a changé depuis)."""
+        if previous_file is None or not entry or entry.get("offset") is None:
+            return None
+        previous_file.seek(entry["offset"])
+        line = previous_file.read(entry["length"])
+        try:
+            return line if json.loads(line)["url"] == url else None
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def run(self) -> dict:
+        t_start = time.perf_counter()
+        state = {"pages": {}, "run": None} if self.fresh else load_state(self.state_path)
+        published = state["pages"]
+        tmp_path = self.out_path + ".tmp"
+
+        run = state.get("run")
+        if run and Path(tmp_path).exists():
+            # reprise : on repart de la dernière sauvegarde de l'état
+            with open(tmp_path, "r+b") as f:
+                f.truncate(run["size"])
+            print(f"[crawl] resuming ({len(run['pages'])} pages already done)")
+        else:
+            run = {"pages": {}, "size": 0}
+            Path(tmp_path).parent.mkdir(parents=True, exist_ok=True)
+            open(tmp_path, "wb").close()
+
+        urls = [url for url in self.discover() if url not in run["pages"]]
+        print(f"[crawl] {self.stats['urls']} urls ({self.stats['urls_filtered']} filtered), {len(urls)} to visit")
+
+        previous_file = open(self.out_path, "rb") if Path(self.out_path).exists() else None
+        done = 0
+        try:
+            with open(tmp_path, "ab") as out, ThreadPoolExecutor(self.workers) as pool:
+                # fenêtre bornée de requêtes en vol ; écriture dans l'ordre du sitemap
+                pending = deque()
+                todo = iter(urls)
+
+                def submit():
+                    url = next(todo, None)
+                    if url is not None:
+                        pending.append((url, pool.submit(self._fetch, url, published.get(url))))
+
+                for _ in range(self.workers * 4):
+                    submit()
+
+                while pending:
+                    url, future = pending.popleft()
+                    submit()
+                    status, page, validators = future.result()
+                    previous = published.get(url)
+                    line = None
+
+                    if status in ("not_modified", "error") and previous:
+                        line = self._read_previous(previous_file, previous, url)
+                        if line is None and previous.get("offset") is not None:
+                            # JSONL précédent illisible pour cette page : téléchargement complet
+                            status, page, validators = self._fetch(url)
+                    if status == "fetched" and page is not None:
+                        line = (json.dumps(page, ensure_ascii=False) + "\n").encode("utf-8")
+
+                    self._count("errors" if status == "error" else status)
+                    if status == "fetched" and page is None:
+                        self.stats["not_useful"] += 1
+
+                    if status in ("fetched", "not_modified") or (status == "error" and line):
+                        # erreur passagère : la version précédente de la page est conservée
+                        entry = dict(previous or {}) if status != "fetched" else dict(validators)
+                        entry["offset"], entry["length"] = None, 0
+                        if line:
+                            entry["offset"], entry["length"] = out.tell(), len(line)
+                            out.write(line)
+                            self.stats["written"] += 1
+                        run["pages"][url] = entry
+
+                    done += 1
+                    if done % self.checkpoint_every == 0:
+                        out.flush()
+                        run["size"] = out.tell()
+                        save_state({"pages": published, "run": run}, self.state_path)
+                        elapsed = time.perf_counter() - t_start
+                        print(f"[crawl] {done}/{len(urls)} pages ({done / elapsed:.1f} pages/s)")
+        finally:
+            if previous_file is not None:
+                previous_file.close()
+            for session in self._sessions:
+                session.close()
+
+        os.replace(tmp_path, self.out_path)
+        save_state({"pages": run["pages"], "run": None}, self.state_path)
+
+        elapsed = time.perf_counter() - t_start
+        report = dict(self.stats)
+        report["seconds"] = round(elapsed, 3)
+        report["pages_per_s"] = round(done / elapsed, 1) if elapsed else 0.0
+        print(
+            f"[crawl] {report['written']} pages written to {self.out_path} in {elapsed:.1f}s "
+            f"(fetched={report['fetched']}, not_modified={report['not_modified']}, "
+            f"not_useful={report['not_useful']}, gone={report['gone']}, errors={report['errors']})"
+        )
+        return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crawler des sites des écoles (JSONL pour l'ingestion)")
+    parser.add_argument("--sitemap", action="append", help="sitemap à parcourir (par défaut : CRAWL_SITEMAPS)")
+    parser.add_argument("--out", default=WEB_JSONL_PATH)
+    parser.add_argument("--state", default=CRAWL_STATE_PATH)
+    parser.add_argument("--workers", type=int, default=CRAWL_WORKERS)
+    parser.add_argument("--rps", type=float, default=CRAWL_HOST_RPS, help="requêtes par seconde et par hôte")
+    parser.add_argument("--fresh", action="store_true", help="ignorer l'état : tout retélécharger")
+    args = parser.parse_args(argv)
+
+    Crawler(
+        sitemaps=args.sitemap,
+        out_path=args.out,
+        state_path=args.state,
+        workers=args.workers,
+        host_rps=args.rps,
+        fresh=args.fresh,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
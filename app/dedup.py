@@ -0,0 +1,206 @@
+# app/dedup.py
+
+import re
+import hashlib
+
+import numpy as np
+
+from .config import (
+    BOILERPLATE_MIN_PAGES,
+    BOILERPLATE_SKETCH_WIDTH,
+    NEAR_DUP_THRESHOLD,
+    LSH_BANDS,
+    DEDUP_MAX_ITEMS,
+)
+from .minhash import NUM_PERM, signature
+
+
+
+# Déduplication du corpus à l'ingestion, en mémoire bornée
+#   0. pré-passe de comptage : chaque ligne distincte d'une page web est comptée une fois par page
+#      (count-min sketch de taille fixe, pas de dictionnaire des lignes)
+#   1. boilerplate : une ligne présente sur au moins BOILERPLATE_MIN_PAGES pages est retirée de toutes,
+#      premières pages comprises ; le résultat ne dépend pas de l'ordre des pages
+#   2. pages quasi identiques (MinHash + LSH) : seule la première rencontrée est indexée
+#   3. chunks quasi identiques d'une page à l'autre : seul le premier est embeddé ; la source du chunk
+#      gardé est notée, pour reprendre les chunks écartés si elle change ou disparaît (app/pipeline.py)
+
+_SPACES = re.compile(r"\s+")
+
+
+def _line_key(line: str) -> bytes:
+    return _SPACES.sub(" ", line).strip().lower().encode("utf-8")
+
+
+class CountMinSketch:
+    """Compteurs approchés (jamais sous-estimés) dans une table depth x width fixe."""
+
+    def __init__(self, width: int = BOILERPLATE_SKETCH_WIDTH, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.uint16)
+        self._rows = np.arange(depth)
+
+    def _cells(self, key: bytes):
+        digest = hashlib.blake2b(key, digest_size=4 * self.depth).digest()
+        return np.frombuffer(digest, dtype=np.uint32).astype(np.int64) % self.width
+
+    def count(self, key: bytes) -> int:
+        return int(self.table[self._rows, self._cells(key)].min())
+
+    def add(self, key: bytes):
+        cells = self._cells(key)
+        values = self.table[self._rows, cells]
+        # mise à jour conservative : seules les cases au minimum augmentent (moins de surestimation)
+        low = values.min()
+        if low < np.iinfo(np.uint16).max:
+            self.table[self._rows, cells] = np.maximum(values, low + 1)
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.nbytes
+
+
+class MinHashLSH:
+    """
+    Index LSH sur des signatures MinHash : bands x rows = NUM_PERM.
+    Les candidats (une bande identique) sont vérifiés sur la signature complète.
+    Au-delà de max_items, l'index n'est plus que consulté (mémoire bornée).
+    """
+
+    def __init__(self, threshold: float = NEAR_DUP_THRESHOLD, bands: int = LSH_BANDS, max_items: int = DEDUP_MAX_ITEMS):
+        if NUM_PERM % bands:
+            raise ValueError(f"bands ({bands}) must divide NUM_PERM ({NUM_PERM})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.max_items = max_items
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = []
+        self._owners = []
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _band_keys(self, sig):
+        return [hash(sig[b * self.rows:(b + 1) * self.rows].tobytes()) for b in range(self.bands)]
+
+    def find(self, sig):
+        """Indice d'un élément indexé de similarité estimée >= threshold (None si aucun)."""
+        sig = sig.astype(np.uint32)
+        seen = set()
+        for bucket, key in zip(self._buckets, self._band_keys(sig)):
+            for i in bucket.get(key, ()):
+                if i in seen:
+                    continue
+                seen.add(i)
+                if np.mean(self._signatures[i] == sig) >= self.threshold:
+                    return i
+        return None
+
+    def query(self, sig) -> bool:
+        return self.find(sig) is not None
+
+    def owner(self, i):
+        return self._owners[i]
+
+    def insert(self, sig, owner=None) -> bool:
+        if len(self._signatures) >= self.max_items:
+            return False
+        sig = sig.astype(np.uint32)     # 32 bits suffisent pour comparer, mémoire divisée par 2
+        i = len(self._signatures)
+        self._signatures.append(sig)
+        self._owners.append(owner)
+        for bucket, key in zip(self._buckets, self._band_keys(sig)):
+            bucket.setdefault(key, []).append(i)
+        return True
+
+
+class CorpusDeduplicator:
+    """État de déduplication d'une ingestion (un seul thread : le producteur du pipeline)."""
+
+    def __init__(
+        self,
+        min_pages: int = BOILERPLATE_MIN_PAGES,
+        threshold: float = NEAR_DUP_THRESHOLD,
+        sketch_width: int = BOILERPLATE_SKETCH_WIDTH,
+        max_items: int = DEDUP_MAX_ITEMS,
+    ):
+        self.min_pages = min_pages
+        self.lines = CountMinSketch(sketch_width)
+        self.pages = MinHashLSH(threshold, max_items=max_items)
+        self.chunks = MinHashLSH(threshold, max_items=max_items)
+        self.counted_pages = 0
+        self.stats = {
+            "boilerplate_lines": 0,
+            "boilerplate_chars": 0,
+            "near_duplicate_pages": 0,
+            "near_duplicate_chunks": 0,
+        }
+
+    def count_lines(self, text: str):
+        """Pré-passe : compte une fois chaque ligne distincte de la page."""
+        for key in {_line_key(ln) for ln in text.split("\n")}:
+            if key:
+                self.lines.add(key)
+        self.counted_pages += 1
+
+    def strip_boilerplate(self, text: str) -> str:
+        """Retire les lignes présentes sur au moins min_pages pages (comptées par count_lines)."""
+        lines = text.split("\n")
+        keys = [_line_key(ln) for ln in lines]
+        frequent = {k for k in set(keys) if k and self.lines.count(k) >= self.min_pages}
+        if not frequent:
+            return text
+
+        kept = []
+        for line, key in zip(lines, keys):
+            if key in frequent:
+                self.stats["boilerplate_lines"] += 1
+                self.stats["boilerplate_chars"] += len(line)
+                continue
+            kept.append(line)
+        return "\n".join(kept).strip()
+
+    def is_duplicate_page(self, text: str) -> bool:
+        sig = signature(text)
+        if self.pages.query(sig):
+            self.stats["near_duplicate_pages"] += 1
+            return True
+        self.pages.insert(sig)
+        return False
+
+    def filter_chunks(self, chunks, owner=None):
+        """
+        Chunks de la source owner : (indices des chunks à garder, sources dont ils répètent un chunk).
+        Les quasi-doublons de chunks déjà vus sont écartés.
+        """
+        kept, depends = [], set()
+        for i, chunk in enumerate(chunks):
+            sig = signature(chunk.page_content)
+            match = self.chunks.find(sig)
+            if match is not None:
+                self.stats["near_duplicate_chunks"] += 1
+                other = self.chunks.owner(match)
+                if other is not None and other != owner:
+                    depends.add(other)
+                continue
+            self.chunks.insert(sig, owner)
+            kept.append(i)
+        return kept, sorted(depends)
+
+    def register_chunks(self, chunks, owner=None):
+        """Chunks déjà dans l'index (source inchangée) : connus pour la suite, sans être comptés."""
+        for chunk in chunks:
+            sig = signature(chunk.page_content)
+            if not self.chunks.query(sig):
+                self.chunks.insert(sig, owner)
+
+    def summary(self) -> dict:
+        return {
+            **self.stats,
+            "pages_counted": self.counted_pages,
+            "pages_indexed": len(self.pages),
+            "chunks_indexed": len(self.chunks),
+            "sketch_mb": round(self.lines.nbytes / 1e6, 1),
+        }
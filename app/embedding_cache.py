@@ -0,0 +1,264 @@
+# app/embedding_cache.py
+
+import os
+import re
+import json
+import time
+import atexit
+import hashlib
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_ollama import OllamaEmbeddings
+
+from .config import EMBEDDING_MODEL, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_MB
+
+try:
+    import fcntl
+except ImportError:  # Windows : un seul process par cache
+    fcntl = None
+
+
+
+# Cache disque des embeddings, partagé entre processus (Streamlit, API, ingestion)
+#   clé = (modèle, hash du texte normalisé)
+#   table de hachage à adressage ouvert, de capacité fixe, entièrement sur disque :
+#     slots.bin   une case de 24 octets par ligne (clé 128 bits + dernier accès)
+#     vectors.f32 la matrice float32 alignée sur les cases (fichier creux, memory-mappé)
+#   une clé est cherchée dans PROBE cases consécutives ; pleines, la moins récemment utilisée
+#   est remplacée (LRU approché). Rien à réécrire au flush : seules les pages modifiées partent.
+#   Écritures sous verrou fcntl exclusif, lectures sous verrou partagé : tous les processus
+#   voient les mêmes cases, sans index en mémoire à recharger.
+
+PROBE = 8
+SLOT_DTYPE = np.dtype([("k0", "<u8"), ("k1", "<u8"), ("atime", "<f8")])
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def cache_key(model: str, text: str) -> str:
+    payload = f"{model}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()
+
+
+def _key_words(keys: List[str]):
+    # 128 premiers bits du sha1 ; k1 jamais nul : (0, 0) marque une case vide
+    k0 = np.array([int(k[:16], 16) for k in keys], dtype=np.uint64)
+    k1 = np.array([int(k[16:32], 16) | 1 for k in keys], dtype=np.uint64)
+    return k0, k1
+
+
+class EmbeddingCache:
+    """
+    Cases (slots.bin) + matrice float32 (vectors.f32), capacité fixée à la création :
+    max_bytes / (dim x 4) lignes. Plusieurs processus peuvent ouvrir le même cache.
+    """
+
+    def __init__(self, model: str, path: str = EMBEDDING_CACHE_PATH, max_mb: int = EMBEDDING_CACHE_MAX_MB):
+        self.model = model
+        self.dir = Path(path) / re.sub(r"[^a-zA-Z0-9_.-]", "_", model)
+        self.meta_path = self.dir / "meta.json"
+        self.slots_path = self.dir / "slots.bin"
+        self.matrix_path = self.dir / "vectors.f32"
+        self.lock_path = self.dir / "lock"
+        self.max_bytes = max_mb * 1024 * 1024
+
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._maps = ()
+        self._slots = None
+        self._matrix = None
+        self._dirty = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.dim = 0
+        self.capacity = 0
+        with self._lock:
+            self._open()
+
+    # --- verrou inter-processus ---
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        if fcntl is None:
+            yield
+            return
+        if self._lock_file is None:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            self._lock_file = open(self.lock_path, "a+b")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    # --- persistance ---
+
+    def _open(self):
+        """Ouvre les fichiers s'ils existent (créés par ce process ou un autre)."""
+        if self._slots is not None or not self.meta_path.exists():
+            return
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.dim = meta["dim"]
+        self.capacity = meta["capacity"]
+        self._maps = (
+            np.memmap(self.slots_path, dtype=SLOT_DTYPE, mode="r+", shape=(self.capacity,)),
+            np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim)),
+        )
+        # vues ndarray sur les mêmes pages : l'indexation de np.memmap coûte plus cher
+        self._slots, self._matrix = (m.view(np.ndarray) for m in self._maps)
+
+    def _create(self, dim: int):
+        # sous verrou exclusif : un autre process a pu créer le cache entre-temps
+        self._open()
+        if self._slots is not None:
+            return
+        self.dir.mkdir(parents=True, exist_ok=True)
+        # ancien format (index.json + matrice par ordre d'insertion) : abandonné
+        for name in ("index.json", "index.tmp"):
+            if (self.dir / name).exists():
+                (self.dir / name).unlink()
+                self.matrix_path.unlink(missing_ok=True)
+        capacity = max(PROBE, self.max_bytes // (dim * 4))
+        # fichiers creux : l'espace disque suit les lignes réellement écrites
+        with open(self.slots_path, "wb") as f:
+            f.truncate(capacity * SLOT_DTYPE.itemsize)
+        with open(self.matrix_path, "wb") as f:
+            f.truncate(capacity * dim * 4)
+        tmp_path = self.meta_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": dim, "capacity": capacity}, f)
+        os.replace(tmp_path, self.meta_path)
+        self._open()
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            for m in self._maps:
+                m.flush()
+            self._dirty = 0
+
+    def maybe_flush(self, every: int = 64):
+        if self._dirty >= every:
+            self.flush()
+
+    # --- cases ---
+
+    def _windows(self, k0):
+        start = (k0 % np.uint64(self.capacity)).astype(np.int64)
+        return (start[:, None] + np.arange(PROBE)) % self.capacity
+
+    # --- API ---
+
+    def get_many(self, keys: List[str]):
+        out = [None] * len(keys)
+        if not keys:
+            return out
+        now = time.time()
+        with self._lock:
+            self._open()
+            if self._slots is None:
+                self.misses += len(keys)
+                return out
+            k0, k1 = _key_words(keys)
+            windows = self._windows(k0)
+            with self._file_lock(exclusive=False):
+                slots = self._slots[windows]
+                match = (slots["k0"] == k0[:, None]) & (slots["k1"] == k1[:, None])
+                for i in np.flatnonzero(match.any(axis=1)):
+                    row = int(windows[i, match[i].argmax()])
+                    self._slots["atime"][row] = now
+                    out[i] = np.array(self._matrix[row])
+            found = sum(v is not None for v in out)
+            self.hits += found
+            self.misses += len(keys) - found
+        return out
+
+    def put_many(self, keys: List[str], vectors):
+        if not keys:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        now = time.time()
+        k0, k1 = _key_words(keys)
+        with self._lock, self._file_lock(exclusive=True):
+            if self._slots is None:
+                self._create(int(vectors.shape[1]))
+            windows = self._windows(k0)
+            for i, vec in enumerate(vectors):
+                window = windows[i]
+                slots = self._slots[window]
+                if ((slots["k0"] == k0[i]) & (slots["k1"] == k1[i])).any():
+                    continue
+                empty = np.flatnonzero(slots["k1"] == 0)
+                if len(empty):
+                    row = int(window[empty[0]])
+                else:
+                    row = int(window[slots["atime"].argmin()])
+                    self.evictions += 1
+                # vecteur d'abord : une case n'annonce jamais une ligne à moitié écrite
+                self._matrix[row] = vec
+                self._slots[row] = (k0[i], k1[i], now)
+                self._dirty += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        entries = int(np.count_nonzero(self._slots["k1"])) if self._slots is not None else 0
+        return {
+            "entries": entries,
+            "capacity": self.capacity,
+            "bytes": entries * self.dim * 4,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+
+# Wrapper LangChain : même interface que OllamaEmbeddings
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings: Embeddings, model: str, cache: EmbeddingCache = None):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache or EmbeddingCache(model)
+        atexit.register(self.cache.flush)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [cache_key(self.model, t) for t in texts]
+        cached = self.cache.get_many(keys)
+
+        missing = [i for i, v in enumerate(cached) if v is None]
+        if missing:
+            # dédoublonnage : un même chunk boilerplate n'est embeddé qu'une fois
+            unique = {}
+            for i in missing:
+                unique.setdefault(keys[i], texts[i])
+            vectors = self.embeddings.embed_documents(list(unique.values()))
+            computed = dict(zip(unique.keys(), vectors))
+            self.cache.put_many(list(computed.keys()), list(computed.values()))
+            for i in missing:
+                cached[i] = computed[keys[i]]
+            self.cache.maybe_flush()
+
+        return [np.asarray(v, dtype=np.float32).tolist() for v in cached]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def build_embeddings(model: str = EMBEDDING_MODEL) -> CachedEmbeddings:
+    return CachedEmbeddings(OllamaEmbeddings(model=model), model)
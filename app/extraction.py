@@ -0,0 +1,265 @@
+# app/extraction.py
+
+import io
+import os
+import json
+import time
+import hashlib
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pypdf
+from langchain_core.documents import Document
+
+from .config import EXTRACTION_CACHE_PATH, EXTRACT_WORKERS, EXTRACT_PAGES_PER_TASK
+
+
+
+# Extraction du texte des PDF / TXT, partagée par l'ingestion et les uploads
+#   - pages extraites par plages dans un pool de processus (pypdf est limité par le GIL)
+#   - cache disque par (hash du fichier, page) : un fichier déjà vu n'est jamais réanalysé
+#   - les pages sont rendues dans l'ordre, au fil de l'eau, avec une fenêtre bornée de tâches en vol
+#   - texte complet de chaque page (plus de coupe à 3000 caractères)
+#
+#   storage/extraction_cache/<hash>/meta.json   nombre de pages, labels, version de l'extracteur
+#   storage/extraction_cache/<hash>/<page>.txt  texte de la page
+
+EXTRACTOR_VERSION = f"pypdf-{pypdf.__version__}"
+
+
+def file_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _extract_pdf_pages(source, start: int, end: int) -> list:
+    """Texte des pages [start, end) ; source = chemin ou contenu du PDF (exécuté dans un worker)."""
+    reader = pypdf.PdfReader(source if isinstance(source, str) else io.BytesIO(source))
+    return [(reader.pages[i].extract_text() or "").strip() for i in range(start, end)]
+
+
+class ExtractionCache:
+    def __init__(self, path: str = EXTRACTION_CACHE_PATH):
+        self.dir = Path(path)
+
+    def _file_dir(self, digest: str) -> Path:
+        return self.dir / digest
+
+    def meta(self, digest: str):
+        try:
+            with open(self._file_dir(digest) / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("extractor") == EXTRACTOR_VERSION else None
+
+    def put_meta(self, digest: str, n_pages: int, labels):
+        self._write(digest, "meta.json", json.dumps(
+            {"extractor": EXTRACTOR_VERSION, "pages": n_pages, "labels": labels}
+        ))
+
+    def get(self, digest: str, page: int):
+        try:
+            return (self._file_dir(digest) / f"{page}.txt").read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def put(self, digest: str, page: int, text: str):
+        self._write(digest, f"{page}.txt", text)
+
+    def _write(self, digest: str, name: str, content: str):
+        path = self._file_dir(digest)
+        path.mkdir(parents=True, exist_ok=True)
+        tmp = path / (name + ".tmp")
+        tmp.write_text(content, encoding="utf-8")
+        os.replace(tmp, path / name)
+
+
+class _Segment:
+    """Pages consécutives d'un fichier : déjà extraites (texts) ou en cours d'extraction (future)."""
+
+    __slots__ = ("digest", "metadata", "pages", "labels", "texts", "future", "cached")
+
+    def __init__(self, digest, metadata, pages, labels, texts=None, future=None, cached=False):
+        self.digest = digest
+        self.metadata = metadata
+        self.pages = pages
+        self.labels = labels
+        self.texts = texts
+        self.future = future
+        self.cached = cached
+
+
+class ExtractionService:
+    def __init__(
+        self,
+        workers: int = EXTRACT_WORKERS,
+        pages_per_task: int = EXTRACT_PAGES_PER_TASK,
+        cache_path: str = EXTRACTION_CACHE_PATH,
+    ):
+        # pas plus de processus que de cœurs : l'extraction est purement CPU
+        self.workers = max(1, min(workers, os.cpu_count() or 1))
+        self.pages_per_task = pages_per_task
+        self.cache = ExtractionCache(cache_path)
+        self._pool = None
+        self._lock = threading.Lock()
+
+        self.files = 0
+        self.pages = 0
+        self.cached_pages = 0
+        self.seconds = 0.0
+
+    # --- pool de processus (créé au premier PDF qui en vaut la peine) ---
+
+    def _submit(self, source, start: int, end: int):
+        with self._lock:
+            if self._pool is None:
+                # spawn : pas de fork d'un processus multi-thread (Streamlit, serveur HTTP)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+        return self._pool.submit(_extract_pdf_pages, source, start, end)
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- découpage d'un PDF en segments ---
+
+    def _pdf_segments(self, source, data: bytes, metadata: dict):
+        digest = file_digest(data)
+        meta = self.cache.meta(digest)
+        if meta is None:
+            reader = pypdf.PdfReader(io.BytesIO(data))
+            labels = list(reader.page_labels)
+            meta = {"pages": len(reader.pages), "labels": labels}
+            self.cache.put_meta(digest, meta["pages"], labels)
+        n_pages, labels = meta["pages"], meta["labels"]
+        metadata = {**metadata, "total_pages": n_pages}
+
+        # plages de pages absentes du cache, au plus pages_per_task pages chacune
+        page = 0
+        while page < n_pages:
+            cached = self.cache.get(digest, page)
+            if cached is not None:
+                yield _Segment(digest, metadata, [page], labels, texts=[cached], cached=True)
+                page += 1
+                continue
+            end = page + 1
+            while end < n_pages and end - page < self.pages_per_task and self.cache.get(digest, end) is None:
+                end += 1
+            pages = list(range(page, end))
+            if self.workers > 1 and n_pages > self.pages_per_task:
+                yield _Segment(digest, metadata, pages, labels, future=self._submit(source, page, end))
+            else:
+                # petit fichier (ou un seul cœur) : pas d'aller-retour avec le pool
+                yield _Segment(digest, metadata, pages, labels, texts=_extract_pdf_pages(source, page, end))
+            page = end
+
+    def _resolve(self, segment) -> list:
+        texts = segment.texts
+        if texts is None:
+            texts = segment.future.result()
+        if segment.cached:
+            self.cached_pages += len(texts)
+        elif segment.digest is not None:
+            for page, text in zip(segment.pages, texts):
+                self.cache.put(segment.digest, page, text)
+        self.pages += len(texts)
+
+        docs = []
+        for page, text in zip(segment.pages, texts):
+            metadata = dict(segment.metadata)
+            if page is not None:
+                metadata["page"] = page
+                metadata["page_label"] = segment.labels[page] if page < len(segment.labels) else str(page + 1)
+            docs.append(Document(page_content=text, metadata=metadata))
+        return docs
+
+    def _segments(self, paths):
+        for path in paths:
+            path = str(path)
+            self.files += 1
+            if path.lower().endswith(".pdf"):
+                with open(path, "rb") as f:
+                    data = f.read()
+                yield from self._pdf_segments(path, data, {"source": path})
+            else:
+                with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                    yield _Segment(None, {"source": path}, [None], [], texts=[f.read()])
+
+    def _ordered(self, segments):
+        # au plus `window` segments en vol : le pool travaille d'avance, la mémoire reste bornée
+        window = max(1, self.workers * 2)
+        pending = deque()
+        try:
+            for segment in segments:
+                pending.append(segment)
+                if len(pending) > window:
+                    yield from self._resolve(pending.popleft())
+            while pending:
+                yield from self._resolve(pending.popleft())
+        finally:
+            for segment in pending:
+                if segment.future is not None:
+                    segment.future.cancel()
+
+    # --- API ---
+
+    def iter_documents(self, paths):
+        """Un Document par page de PDF (un par fichier TXT), dans l'ordre des fichiers et des pages."""
+        # temps compté : celui où l'appelant attend l'extraction (pas celui où il traite les pages)
+        t0 = time.perf_counter()
+        for doc in self._ordered(self._segments(paths)):
+            self.seconds += time.perf_counter() - t0
+            yield doc
+            t0 = time.perf_counter()
+
+    def extract_text(self, data: bytes, name: str) -> str:
+        """Texte complet d'un document uploadé (PDF ou texte)."""
+        if not name.lower().endswith(".pdf"):
+            return data.decode("utf-8", errors="ignore")
+        t0 = time.perf_counter()
+        self.files += 1
+        segments = list(self._pdf_segments(data, data, {"source": "upload", "file": name}))
+        texts = []
+        for segment in segments:
+            texts.extend(d.page_content for d in self._resolve(segment))
+        self.seconds += time.perf_counter() - t0
+        return "\n".join(t for t in texts if t)
+
+    def stats(self) -> dict:
+        return {
+            "files": self.files,
+            "pages": self.pages,
+            "cached_pages": self.cached_pages,
+            "seconds": round(self.seconds, 3),
+            "pages_per_s": round(self.pages / self.seconds, 1) if self.seconds else 0.0,
+        }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_extraction_service() -> ExtractionService:
+    """Service partagé du processus (uploads Streamlit / serveur HTTP)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ExtractionService()
+        return _service
+
+
+def extract_upload_text(data: bytes, name: str) -> str:
+    return get_extraction_service().extract_text(data, name)
@@ -0,0 +1,200 @@
+# app/fake_ollama.py
+
+import sys
+import json
+import time
+import hashlib
+import threading
+import contextlib
+import unicodedata
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+
+# Faux serveur Ollama local (tests / benchmarks sans modèle)
+#   POST /api/embed : embeddings déterministes (bag-of-words hashé)
+#   POST /api/chat  : réponse factice, streamée token par token (NDJSON)
+#   Latence configurable pour simuler un vrai backend
+#   embed_parallel : appels d'embedding traités simultanément (Ollama : OLLAMA_NUM_PARALLEL), 0 = illimité
+
+def fake_answer(messages, n_tokens: int = 20) -> list:
+    """Tokens déterministes construits à partir du dernier message."""
+    last = messages[-1].get("content", "") if messages else ""
+    words = re.findall(r"\w+", last) or ["ok"]
+    return [words[i % len(words)] + " " for i in range(n_tokens)]
+
+
+def fake_embedding(text: str, dim: int = 64) -> list:
+    """
+    Vecteur déterministe : chaque mot (sans accents, minuscule) est hashé
+    dans une dimension, donc deux textes proches ont des vecteurs proches.
+    """
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    vec = np.zeros(dim, dtype=np.float32)
+    for token in re.findall(r"\w+", folded):
+        h = int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16)
+        vec[h % dim] += 1.0 if (h >> 8) % 2 else -1.0
+    norm = np.linalg.norm(vec)
+    if norm == 0:
+        vec[0] = 1.0
+        norm = 1.0
+    return (vec / norm).tolist()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeOllama/0.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        fake = self.server.fake
+        payload = self._read_json()
+
+        if self.path == "/api/embed":
+            texts = payload.get("input") or []
+            if isinstance(texts, str):
+                texts = [texts]
+            fake.count("embed", len(texts))
+            with fake.embed_slots:
+                time.sleep(fake.embed_latency + fake.embed_latency_per_item * len(texts))
+            self._send_json(
+                {
+                    "model": payload.get("model", ""),
+                    "embeddings": [fake_embedding(t, fake.dim) for t in texts],
+                }
+            )
+            return
+
+        if self.path == "/api/chat":
+            self._chat(fake, payload)
+            return
+
+        self._send_json({"error": f"unsupported path {self.path}"}, status=404)
+
+    def _chat(self, fake, payload):
+        fake.count("chat")
+        tokens = fake_answer(payload.get("messages") or [], fake.chat_tokens)
+        model = payload.get("model", "")
+        time.sleep(fake.chat_latency)
+
+        if not payload.get("stream", True):
+            time.sleep(fake.token_latency * len(tokens))
+            self._send_json(
+                {
+                    "model": model,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "done": True,
+                    "done_reason": "stop",
+                }
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for token in tokens:
+                chunk = {"model": model, "message": {"role": "assistant", "content": token}, "done": False}
+                self.wfile.write((json.dumps(chunk) + "\n").encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(fake.token_latency)
+            done = {
+                "model": model,
+                "message": {"role": "assistant", "content": ""},
+                "done": True,
+                "done_reason": "stop",
+                "eval_count": len(tokens),
+            }
+            self.wfile.write((json.dumps(done) + "\n").encode("utf-8"))
+        except (BrokenPipeError, ConnectionResetError):
+            # client parti (requête annulée)
+            fake.count("chat_aborted")
+        self.close_connection = True
+
+
+class FakeOllamaServer:
+    """
+    with FakeOllamaServer(embed_latency=0.01) as fake:
+        OllamaEmbeddings(model="x", base_url=fake.url)
+        ChatOllama(model="x", base_url=fake.url)
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        dim: int = 64,
+        embed_latency: float = 0.0,
+        embed_latency_per_item: float = 0.0,
+        chat_latency: float = 0.0,
+        token_latency: float = 0.0,
+        chat_tokens: int = 20,
+        embed_parallel: int = 0,
+    ):
+        self.dim = dim
+        self.embed_latency = embed_latency
+        self.embed_latency_per_item = embed_latency_per_item
+        self.chat_latency = chat_latency          # avant le premier token
+        self.token_latency = token_latency        # entre deux tokens
+        self.chat_tokens = chat_tokens
+        self.embed_slots = threading.Semaphore(embed_parallel) if embed_parallel else contextlib.nullcontext()
+        self.calls = {}
+        self._calls_lock = threading.Lock()
+
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, endpoint: str, n: int = 1):
+        with self._calls_lock:
+            calls, items = self.calls.get(endpoint, (0, 0))
+            self.calls[endpoint] = (calls + 1, items + n)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 11435
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    server = FakeOllamaServer(port=port, embed_latency=latency)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
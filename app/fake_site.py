@@ -0,0 +1,149 @@
+# app/fake_site.py
+
+import sys
+import time
+import hashlib
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+
+# Faux site d'école local (tests / benchmarks du crawler sans réseau)
+#   GET /sitemap_index.xml      index -> un sitemap par section
+#   GET /sitemap-<section>.xml  urls des pages de la section
+#   GET /<section>/page-<i>     page HTML (ETag + Last-Modified, 304 si inchangée)
+#   Les sections "agenda" et "presse" doivent être écartées par is_useful_url.
+
+SECTIONS = ["formations", "admissions", "vie-etudiante", "agenda", "presse"]
+
+
+def fake_page(section: str, i: int, version: int = 0) -> str:
+    words = f"{section} programme ingénieur projet cours campus étudiant majeure"
+    body = "\n".join(f"<p>{words} paragraphe {j} de la page {i} (version {version}).</p>" for j in range(8))
+    return (
+        f"<html><head><title>{section} {i}</title></head><body>"
+        f"<nav>Accueil Formations Admissions</nav>{body}"
+        f"<footer>Pôle Léonard de Vinci</footer></body></html>"
+    )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = 1 << 16     # en-têtes + corps en une écriture (pas d'attente Nagle / ACK retardé)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b"", ctype: str = "text/html; charset=utf-8", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        site = self.server.site
+        site.count("requests")
+        if site.latency:
+            time.sleep(site.latency)
+
+        path = self.path.split("?")[0]
+        if path == "/sitemap_index.xml":
+            return self._send(200, site.sitemap_index().encode("utf-8"), "application/xml")
+        if path.startswith("/sitemap-") and path.endswith(".xml"):
+            section = path[len("/sitemap-"):-len(".xml")]
+            if section in SECTIONS:
+                return self._send(200, site.sitemap(section).encode("utf-8"), "application/xml")
+
+        parts = path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] in SECTIONS and parts[1].startswith("page-"):
+            i = int(parts[1][len("page-"):])
+            if i < site.pages_per_section and (parts[0], i) not in site.removed:
+                version = site.versions.get((parts[0], i), 0)
+                body = fake_page(parts[0], i, version).encode("utf-8")
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                last_modified = formatdate(site.started + version, usegmt=True)
+                if self.headers.get("If-None-Match") == etag:
+                    site.count("not_modified")
+                    return self._send(304, headers={"ETag": etag})
+                site.count("pages")
+                return self._send(200, body, headers={"ETag": etag, "Last-Modified": last_modified})
+
+        site.count("not_found")
+        self._send(404, b"not found")
+
+
+class FakeSiteServer:
+    """
+    with FakeSiteServer(pages_per_section=50) as site:
+        Crawler(sitemaps=[site.url + "/sitemap_index.xml"]).run()
+        site.change("formations", 3)   # la page change au prochain crawl
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, pages_per_section: int = 20, latency: float = 0.0):
+        self.pages_per_section = pages_per_section
+        self.latency = latency
+        self.started = time.time()
+        self.versions = {}
+        self.removed = set()
+        self.calls = {}
+        self._calls_lock = threading.Lock()
+
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.site = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def sitemap_index(self) -> str:
+        locs = "".join(f"<sitemap><loc>{self.url}/sitemap-{s}.xml</loc></sitemap>" for s in SECTIONS)
+        return f'<?xml version="1.0"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{locs}</sitemapindex>'
+
+    def sitemap(self, section: str) -> str:
+        locs = "".join(
+            f"<url><loc>{self.url}/{section}/page-{i}</loc></url>" for i in range(self.pages_per_section)
+        )
+        return f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{locs}</urlset>'
+
+    def change(self, section: str, i: int):
+        self.versions[(section, i)] = self.versions.get((section, i), 0) + 1
+
+    def remove(self, section: str, i: int):
+        self.removed.add((section, i))
+
+    def count(self, key: str):
+        with self._calls_lock:
+            self.calls[key] = self.calls.get(key, 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server = FakeSiteServer(port=port)
+    print(f"Fake site listening on {server.url}/sitemap_index.xml")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -1,19 +1,14 @@
 # app/ingest.py
 
 import os
+import sys
 import json
 import re
+import hashlib
 from pathlib import Path
 
 from langchain_core.documents import Document
-from langchain_ollama import OllamaEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import (
-    DirectoryLoader,
-    PyPDFLoader,
-    TextLoader,
-)
 
 from .config import (
     DOCS_PATH,
@@ -23,6 +18,9 @@ from .config import (
     CHUNK_OVERLAP,
     WEB_JSONL_PATH,
 )
+from .versions import begin_version, publish_version, discard_version, gc_versions, interrupted_build
+from .extraction import ExtractionService
+from .chunkstore import load_mutable_vectorstore
 
 
 
@@ -119,99 +117,201 @@ def detect_type(url: str) -> str:
     return "academics"
 
 
-def load_documents():
+# Étape "load" : documents bruts, en streaming (PDF page par page, JSONL ligne par ligne)
+
+def iter_raw_documents(stats: dict = None, extractor: ExtractionService = None):
     docs_dir = Path(DOCS_PATH)
     if not docs_dir.exists():
         raise FileNotFoundError(f"Docs directory not found: {docs_dir.resolve()}")
 
-    documents = []
+    stats = stats if stats is not None else {}
+    stats.setdefault("web_bad_lines", 0)
 
+    # PDF et TXT : extraction parallèle + cache par page (app/extraction.py)
+    files = sorted(docs_dir.glob("**/*.pdf")) + sorted(docs_dir.glob("**/*.txt"))
+    if extractor is None:
+        with ExtractionService() as extractor:
+            yield from extractor.iter_documents(files)
+        stats["extraction"] = extractor.stats()
+    else:
+        yield from extractor.iter_documents(files)
 
-    pdf_loader = DirectoryLoader(str(docs_dir), glob="**/*.pdf", loader_cls=PyPDFLoader)
-    pdf_docs = pdf_loader.load()
+    yield from iter_web_documents(stats)
 
 
-    for doc in pdf_docs:
-        doc.page_content = clean_pdf_text(doc.page_content)[:3000]
+def iter_web_documents(stats: dict = None):
+    stats = stats if stats is not None else {}
+    stats.setdefault("web_bad_lines", 0)
 
-    documents.extend(pdf_docs)
+    jsonl_path = Path(WEB_JSONL_PATH)
+    if not jsonl_path.exists():
+        return
 
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                obj = json.loads(line.strip())
+            except Exception:
+                stats["web_bad_lines"] += 1
+                continue
 
-    txt_loader = DirectoryLoader(str(docs_dir), glob="**/*.txt", loader_cls=TextLoader)
-    documents.extend(txt_loader.load())
+            yield Document(
+                page_content=(obj.get("text") or "").strip(),
+                metadata={
+                    "source": "web",
+                    "url": obj.get("url", ""),
+                    "title": obj.get("title", ""),
+                },
+            )
 
 
-    jsonl_path = Path(WEB_JSONL_PATH)
+# Étape "clean" : renvoie None si le document doit être ignoré
+
+def clean_document(doc):
+    meta = doc.metadata
+
+    if meta.get("source") == "web":
+        url = meta.get("url", "")
+        if not doc.page_content or not is_useful_url(url):
+            return None
+
+        text = clean_web_text(doc.page_content)
+        if len(text) < 250:
+            return None
 
-    if jsonl_path.exists():
-        added, skipped = 0, 0
-
-        with open(jsonl_path, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    obj = json.loads(line.strip())
-                except Exception:
-                    skipped += 1
-                    continue
-
-                url = obj.get("url", "")
-                raw_text = (obj.get("text") or "").strip()
-                title = obj.get("title", "")
-
-                if not raw_text or not is_useful_url(url):
-                    skipped += 1
-                    continue
-
-                text = clean_web_text(raw_text)
-                if len(text) < 250:
-                    skipped += 1
-                    continue
-
-                school = detect_school(url)
-                doc_type = detect_type(url)
-
-                documents.append(
-                    Document(
-                        page_content=text,
-                        metadata={
-                            "source": "web",
-                            "url": url,
-                            "title": title,
-                            "school": school,
-                            "type": doc_type,
-                        },
-                    )
-                )
-                added += 1
+        doc.page_content = text
+        meta["school"] = detect_school(url)
+        meta["type"] = detect_type(url)
+        return doc
 
+    if str(meta.get("source", "")).lower().endswith(".pdf"):
+        doc.page_content = clean_pdf_text(doc.page_content)
+    return doc
+
+
+def load_documents():
+    documents = []
+    stats = {}
+    added, skipped = 0, 0
+
+    for raw in iter_raw_documents(stats):
+        is_web = raw.metadata.get("source") == "web"
+        doc = clean_document(raw)
+
+        if doc is None:
+            skipped += 1
+            continue
+        if is_web:
+            added += 1
+        documents.append(doc)
+
+    if Path(WEB_JSONL_PATH).exists():
+        skipped += stats["web_bad_lines"]
         print(f"Loaded {added} web pages ({skipped} skipped).")
 
     print(f"Loaded {len(documents)} raw documents.")
     return documents
 
 
-def split_documents(documents):
+def split_documents(documents, verbose: bool = True):
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
         separators=["\n\n", "\n", ". ", " "],
+        add_start_index=True,  # position du chunk : permet de recoller des chunks voisins
     )
     chunks = splitter.split_documents(documents)
-    print(f"Split into {len(chunks)} chunks.")
+    if verbose:
+        print(f"Split into {len(chunks)} chunks.")
     return chunks
 
 
-def build_vectorstore():
-    docs = load_documents()
-    chunks = split_documents(docs)
+# Manifest d'ingestion incrémentale
+#   source (url ou chemin de fichier) -> hash du contenu + ids des chunks dans FAISS
+
+MANIFEST_NAME = "manifest.json"
+
+
+def source_key(doc) -> str:
+    if doc.metadata.get("source") == "web":
+        return doc.metadata.get("url", "")
+    return str(doc.metadata.get("source", ""))
+
+
+def content_hash(docs) -> str:
+    h = hashlib.sha256()
+    for doc in docs:
+        h.update(doc.page_content.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def chunk_ids(key: str, digest: str, n: int):
+    prefix = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+    return [f"{prefix}-{digest[:8]}-{i}" for i in range(n)]
+
+
+def manifest_settings() -> dict:
+    # Si un de ces paramètres change, les vecteurs existants ne sont plus valides
+    return {
+        "embedding_model": EMBEDDING_MODEL,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+    }
+
+
+def load_manifest(path=VECTORSTORE_PATH) -> dict:
+    manifest_path = Path(path) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict, path=VECTORSTORE_PATH):
+    manifest_path = Path(path) / MANIFEST_NAME
+    tmp_path = manifest_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+
+def load_existing_vectorstore(embeddings, manifest: dict, path=VECTORSTORE_PATH):
+    if not manifest or manifest.get("settings") != manifest_settings():
+        return None
+    if not (Path(path) / "index.faiss").exists():
+        return None
+    return load_mutable_vectorstore(path, embeddings)
+
+
+def build_vectorstore(full: bool = False, embeddings=None) -> dict:
+    """
+    Ingestion incrémentale en streaming (voir app/pipeline.py) :
+    - n'embedde que les sources nouvelles ou modifiées (hash du contenu)
+    - supprime de l'index les vecteurs des sources disparues
+    - full=True force la reconstruction complète
+    L'index est écrit dans une nouvelle version (voir app/versions.py), publiée à la fin :
+    les processus en cours la chargent en arrière-plan, sans redémarrage.
+    """
+    from .pipeline import IngestPipeline
+
+    # reprise : les changements déjà checkpointés comptent comme "unchanged", mais la version
+    # en construction diffère quand même de celle servie et doit être publiée
+    resumed = not full and interrupted_build(VECTORSTORE_PATH) is not None
+    path = begin_version(VECTORSTORE_PATH, full=full)
+    report = IngestPipeline(embeddings=embeddings, full=full, path=path).run()
 
-    embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL)
-    vectorstore = FAISS.from_documents(chunks, embedding=embeddings)
+    changed = full or resumed or report.get("added") or report.get("updated") or report.get("deleted")
+    if "index_type" not in report or not changed:
+        # rien n'a changé : on garde la version servie
+        discard_version(path)
+        return report
 
-    os.makedirs(os.path.dirname(VECTORSTORE_PATH), exist_ok=True)
-    vectorstore.save_local(VECTORSTORE_PATH)
-    print(f"Vectorstore saved to {VECTORSTORE_PATH}")
+    report["version"] = publish_version(path, VECTORSTORE_PATH)
+    removed = gc_versions(VECTORSTORE_PATH)
+    print(f"Published index version {report['version']} (removed old versions: {removed or 'none'})")
+    return report
 
 
 if __name__ == "__main__":
-    build_vectorstore()
+    build_vectorstore(full="--full" in sys.argv)
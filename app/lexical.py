@@ -0,0 +1,172 @@
+# app/lexical.py
+
+import os
+import re
+import json
+import shutil
+import unicodedata
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from .config import BM25_K1, BM25_B
+
+
+
+# Index lexical BM25 (index inversé en mémoire mappée)
+#   construit en fin d'ingestion, stocké dans VECTORSTORE_PATH/lexical/ :
+#     vocab.json   terme -> id
+#     ids.json     position -> id docstore (même ordre que l'index FAISS) ; au service, la table
+#                  position -> id du vectorstore (ChunkStore mappé) est réutilisée à la place
+#     indptr.npy   début des postings de chaque terme (CSR)
+#     postings.npy positions des chunks
+#     weights.npy  poids BM25 précalculé (idf x tf saturé) de chaque posting
+
+LEXICAL_DIR = "lexical"
+
+STOPWORDS = set(
+    """
+    a au aux avec ce ces cet cette dans de des du elle en et eux il ils je la le les leur
+    lui ma mais me meme mes moi mon ne nos notre nous on ou par pas pour qu que qui sa se
+    ses son sur ta te tes toi ton tu un une vos votre vous c d j l m n s t y est sont ete
+    etre avoir ai as avons avez ont faut peut peux quel quelle quels quelles comment
+    combien quoi the of and to in is for on
+    """.split()
+)
+
+
+def fold_accents(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text: str):
+    """Minuscules, sans accents, sans mots vides ; pluriels simples ramenés au singulier."""
+    tokens = []
+    for tok in re.findall(r"[a-z0-9]+", fold_accents((text or "").lower())):
+        if tok in STOPWORDS:
+            continue
+        if len(tok) > 4 and tok[-1] in "sx" and not tok.endswith("ss"):
+            tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+
+def build_lexical_index(vectorstore, path, k1: float = BM25_K1, b: float = BM25_B):
+    """Reconstruit l'index BM25 à partir du docstore, dans l'ordre des positions FAISS."""
+    n = vectorstore.index.ntotal
+    ids = [vectorstore.index_to_docstore_id[pos] for pos in range(n)]
+
+    doc_terms = []
+    lengths = np.zeros(n, dtype=np.float32)
+    df = Counter()
+    for pos, doc_id in enumerate(ids):
+        counts = Counter(tokenize(vectorstore.docstore.search(doc_id).page_content))
+        doc_terms.append(counts)
+        lengths[pos] = sum(counts.values())
+        df.update(counts.keys())
+
+    vocab = {term: i for i, term in enumerate(sorted(df))}
+    avgdl = float(lengths.mean()) if n else 1.0
+    idf = np.array(
+        [np.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5)) for t in sorted(df)], dtype=np.float32
+    )
+
+    # postings triés par terme (CSR)
+    rows, cols, tfs = [], [], []
+    for pos, counts in enumerate(doc_terms):
+        for term, tf in counts.items():
+            rows.append(vocab[term])
+            cols.append(pos)
+            tfs.append(tf)
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int32)
+    tfs = np.asarray(tfs, dtype=np.float32)
+
+    order = np.argsort(rows, kind="stable")
+    rows, cols, tfs = rows[order], cols[order], tfs[order]
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.add.at(indptr, rows + 1, 1)
+    indptr = np.cumsum(indptr)
+
+    norm = k1 * (1 - b + b * lengths[cols] / (avgdl or 1.0))
+    weights = (idf[rows] * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32)
+
+    out = Path(path) / LEXICAL_DIR
+    tmp = Path(path) / (LEXICAL_DIR + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    with open(tmp / "vocab.json", "w", encoding="utf-8") as f:
+        json.dump(vocab, f)
+    with open(tmp / "ids.json", "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+    np.save(tmp / "indptr.npy", indptr)
+    np.save(tmp / "postings.npy", cols)
+    np.save(tmp / "weights.npy", weights)
+
+    shutil.rmtree(out, ignore_errors=True)
+    os.replace(tmp, out)
+    return len(vocab)
+
+
+class LexicalIndex:
+    def __init__(self, path, ids=None):
+        root = Path(path) / LEXICAL_DIR
+        with open(root / "vocab.json", "r", encoding="utf-8") as f:
+            self.vocab = json.load(f)
+        if ids is None:
+            with open(root / "ids.json", "r", encoding="utf-8") as f:
+                ids = json.load(f)
+        self.ids = ids      # position -> id (liste, ou index_to_docstore_id du vectorstore)
+        self.count = len(ids)
+        self.indptr = np.load(root / "indptr.npy", mmap_mode="r")
+        self.postings = np.load(root / "postings.npy", mmap_mode="r")
+        self.weights = np.load(root / "weights.npy", mmap_mode="r")
+
+    @classmethod
+    def load(cls, path, ids=None):
+        """None si l'index n'a pas encore d'index lexical (ancienne ingestion)."""
+        if not (Path(path) / LEXICAL_DIR / "vocab.json").exists():
+            return None
+        return cls(path, ids)
+
+    def search(self, query: str, k: int):
+        """[(id docstore, score)] des k meilleurs chunks BM25."""
+        return [(self.ids[pos], score) for pos, score in self.search_positions(query, k)]
+
+    def search_positions(self, query: str, k: int, positions=None):
+        """[(position FAISS, score)] des k meilleurs chunks BM25, parmi positions si donné (filtre)."""
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids:
+            return []
+
+        postings = [self.postings[self.indptr[t]:self.indptr[t + 1]] for t in term_ids]
+        weights = [self.weights[self.indptr[t]:self.indptr[t + 1]] for t in term_ids]
+        scores = np.bincount(
+            np.concatenate(postings), weights=np.concatenate(weights), minlength=self.count
+        )
+        if positions is not None:
+            # filtre appliqué avant la coupe top-k : les chunks hors filtre ne prennent pas de place
+            scores = scores[positions]
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if positions is not None:
+            return [(int(positions[i]), float(scores[i])) for i in top]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def memory_bytes(self) -> int:
+        return int(self.indptr.nbytes + self.postings.nbytes + self.weights.nbytes)
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60):
+    """Fusionne plusieurs listes d'ids ordonnées ; renvoie les ids triés par score RRF."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,215 @@
+# app/limiter.py
+
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+
+import numpy as np
+
+from .config import LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_TIMEOUT
+
+
+
+# Limiteur de concurrence devant le backend LLM
+#   - au plus max_concurrent générations en même temps, les autres attendent en file (FIFO)
+#   - file bornée : au-delà, la requête est refusée tout de suite
+#   - utilisable depuis un thread (slot) ou une coroutine (aslot), quelle que soit la boucle
+#   - attente en file et temps de service mesurés séparément
+
+class RequestRejected(RuntimeError):
+    """File d'attente pleine."""
+
+
+class RequestTimeout(TimeoutError):
+    """Délai de la requête dépassé (attente en file + génération)."""
+
+
+def deadline_after(timeout: float = LLM_TIMEOUT):
+    return time.monotonic() + timeout if timeout else None
+
+
+def remaining(deadline):
+    """Secondes restantes avant l'échéance (None = pas d'échéance)."""
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise RequestTimeout("request timed out")
+    return left
+
+
+class _Waiter:
+    def __init__(self, loop=None):
+        self.granted = False
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def grant(self):
+        # appelé sous le verrou du limiteur
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class _Samples:
+    """Fenêtre glissante de durées (secondes)."""
+
+    def __init__(self, size: int = 1000):
+        self._values = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._values.append(seconds)
+
+    def summary(self) -> dict:
+        values = np.asarray(self._values, dtype=np.float64)
+        if not len(values):
+            return {"p50": 0.0, "p95": 0.0, "mean": 0.0}
+        return {
+            "p50": round(float(np.percentile(values, 50)), 3),
+            "p95": round(float(np.percentile(values, 95)), 3),
+            "mean": round(float(values.mean()), 3),
+        }
+
+
+class ConcurrencyLimiter:
+    def __init__(
+        self,
+        max_concurrent: int = LLM_MAX_CONCURRENCY,
+        max_queue: int = LLM_MAX_QUEUE,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = deque()
+
+        self.queue_wait = _Samples()
+        self.service = _Samples()
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.cancelled = 0
+
+    def _enter(self, waiter) -> bool:
+        """True si un slot est libre tout de suite, sinon le waiter est mis en file."""
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                return True
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise RequestRejected("LLM queue is full")
+            self._waiters.append(waiter)
+            return False
+
+    def _abandon(self, waiter, timed_out: bool):
+        """Le demandeur renonce (timeout / annulation) : rend le slot s'il l'avait déjà reçu."""
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.cancelled += 1
+            if not waiter.granted:
+                self._waiters.remove(waiter)
+                return
+        self._release()
+
+    def _release(self):
+        with self._lock:
+            if self._waiters:
+                # le slot passe directement au suivant : _active ne change pas
+                self._waiters.popleft().grant()
+            else:
+                self._active -= 1
+
+    def _finish(self, started: float, ok: bool):
+        self.service.add(time.perf_counter() - started)
+        if ok:
+            self.completed += 1
+        self._release()
+
+    @contextmanager
+    def slot(self, deadline=None):
+        timeout = remaining(deadline)
+        queued = time.perf_counter()
+        waiter = _Waiter()
+        if not self._enter(waiter):
+            if not waiter.event.wait(timeout):
+                self._abandon(waiter, timed_out=True)
+                raise RequestTimeout("timed out waiting for an LLM slot")
+        started = time.perf_counter()
+        self.queue_wait.add(started - queued)
+
+        ok = False
+        try:
+            yield
+            ok = True
+        except RequestTimeout:
+            self.timeouts += 1
+            raise
+        except GeneratorExit:
+            # flux abandonné par le client (changement de page, rerun Streamlit)
+            self.cancelled += 1
+            raise
+        finally:
+            self._finish(started, ok)
+
+    @asynccontextmanager
+    async def aslot(self, deadline=None):
+        timeout = remaining(deadline)
+        queued = time.perf_counter()
+        waiter = _Waiter(asyncio.get_running_loop())
+        if not self._enter(waiter):
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+            except asyncio.TimeoutError:
+                self._abandon(waiter, timed_out=True)
+                raise RequestTimeout("timed out waiting for an LLM slot")
+            except asyncio.CancelledError:
+                self._abandon(waiter, timed_out=False)
+                raise
+        started = time.perf_counter()
+        self.queue_wait.add(started - queued)
+
+        ok = False
+        try:
+            yield
+            ok = True
+        except RequestTimeout:
+            self.timeouts += 1
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled += 1
+            raise
+        finally:
+            self._finish(started, ok)
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "queued": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "queue_wait": self.queue_wait.summary(),
+            "service": self.service.summary(),
+        }
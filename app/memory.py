@@ -0,0 +1,256 @@
+# app/memory.py
+
+import re
+import sys
+import threading
+from collections import OrderedDict, deque
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from .config import (
+    LLM_TIMEOUT,
+    MEMORY_TURNS,
+    MEMORY_ANSWER_CHARS,
+    MEMORY_PROMPT_CHARS,
+    MEMORY_CARRY_TERMS,
+    MEMORY_LLM_REWRITE,
+    REWRITE_CACHE_SIZE,
+)
+from .cache import normalize_question
+from .lexical import STOPWORDS, fold_accents, tokenize
+from .limiter import deadline_after
+
+
+
+# Mémoire de conversation d'une session, bornée
+#   - fenêtre glissante des MEMORY_TURNS derniers échanges (réponses tronquées)
+#   - document uploadé gardé par référence (UploadIndex partagé), jamais recopié par message
+#   - chaque échange garde sa question autonome : une relance peut en enchaîner une autre
+# Relances ("et pour le MSc ?") : la question autonome envoyée au retrieval reprend les termes
+# de la question précédente (sans LLM) ; les questions autonomes passent telles quelles.
+# Le résultat est mis en cache (question, question précédente) ; MEMORY_LLM_REWRITE fait
+# reformuler la relance par le LLM à la place.
+
+FOLLOW_UP_STARTS = ("et", "mais", "aussi", "sinon", "alors", "pareil", "idem", "ensuite", "puis")
+ANAPHORS = {
+    "il", "elle", "ils", "elles", "ca", "cela", "celui", "celle", "ceux", "celles",
+    "lui", "leur", "leurs", "ce", "cet", "cette", "ces", "lequel", "laquelle", "lesquels", "lesquelles",
+}
+QUESTION_WORDS = {"pourquoi", "quand", "lequel", "oui", "non", "merci", "ok", "precisement", "exemple"}
+SELF_CONTAINED_TERMS = 6         # au-delà, une question avec un pronom est considérée autonome
+# tournures où le pronom ne renvoie à rien : "qu'est-ce que", "faut-il", "y a-t-il", "il y a", "s'il"
+IMPERSONAL = re.compile(r"\best[- ]ce\b|-(?:t-)?(?:il|elle|ils|elles|on)\b|\bil y a\b|\bs'il\b")
+
+
+def _words(text: str):
+    text = IMPERSONAL.sub(" ", fold_accents((text or "").lower()).replace("’", "'"))
+    return re.findall(r"[a-z0-9]+", text)
+
+
+def is_self_contained(question: str) -> bool:
+    """Heuristique : la question se comprend-elle sans l'historique ?"""
+    words = _words(question)
+    if not words:
+        return True
+    if words[0] in FOLLOW_UP_STARTS:
+        return False
+    terms = [t for t in tokenize(question) if t not in QUESTION_WORDS]
+    if not terms:
+        # "Pourquoi ?", "Comment ?" : rien à chercher sans le contexte
+        return False
+    return not (ANAPHORS.intersection(words) and len(terms) < SELF_CONTAINED_TERMS)
+
+
+class Turn:
+    __slots__ = ("question", "query", "answer", "agent")
+
+    def __init__(self, question: str, query: str, answer: str, agent: str = None):
+        self.question = question
+        self.query = query          # question autonome utilisée pour le retrieval
+        self.answer = answer
+        self.agent = agent
+
+
+class ConversationMemory:
+    """
+    memory = ConversationMemory()
+    memory.upload = upload_index                  # une seule référence pour toute la session
+    memory.add_turn(question, answer, agent, query=stream.query)
+    Taille constante quelle que soit la longueur de la conversation.
+    """
+
+    def __init__(self, max_turns: int = MEMORY_TURNS, answer_chars: int = MEMORY_ANSWER_CHARS):
+        self.turns = deque(maxlen=max_turns)
+        self.answer_chars = answer_chars
+        self.upload = None          # UploadIndex / ApiUpload de la session
+        self.user_context = ""      # ancien format d'historique : texte du document (voir from_messages)
+        self.total_turns = 0
+
+    def add_turn(self, question: str, answer: str, agent: str = None, query: str = None):
+        answer = answer or ""
+        if len(answer) > self.answer_chars:
+            answer = answer[:self.answer_chars].rstrip() + "…"
+        self.turns.append(Turn(question, query or question, answer, agent))
+        self.total_turns += 1
+
+    @property
+    def last(self):
+        return self.turns[-1] if self.turns else None
+
+    def format(self, max_chars: int = MEMORY_PROMPT_CHARS) -> str:
+        """Derniers échanges pour le prompt, les plus anciens retirés en premier."""
+        blocks, size = [], 0
+        for turn in reversed(self.turns):
+            block = f"Utilisateur : {turn.question}\nAssistant : {turn.answer}"
+            if blocks and size + len(block) > max_chars:
+                break
+            blocks.append(block)
+            size += len(block)
+        return "\n".join(reversed(blocks))[-max_chars:]
+
+    def to_messages(self) -> list:
+        """Fenêtre au format historique (API HTTP) ; la question autonome suit la question."""
+        messages = []
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn.question, "query": turn.query})
+            messages.append({"role": "assistant", "content": turn.answer, "agent": turn.agent})
+        return messages
+
+    @classmethod
+    def from_messages(cls, messages, max_turns: int = MEMORY_TURNS):
+        """Historique [{"role", "content", ...}] (API, anciens appelants) -> mémoire bornée."""
+        memory = cls(max_turns=max_turns)
+        pending = None
+        for msg in messages or []:
+            if msg.get("role") == "user":
+                pending = msg
+                if msg.get("uploaded_doc"):
+                    memory.user_context = msg["uploaded_doc"][:2000]
+            elif msg.get("role") == "assistant" and pending is not None:
+                memory.add_turn(pending.get("content", ""), msg.get("content", ""), msg.get("agent"),
+                                query=pending.get("query"))
+                pending = None
+        return memory
+
+    def memory_bytes(self) -> int:
+        """Octets propres à la session (le document uploadé est partagé, compté à part)."""
+        size = sum(sys.getsizeof(o) for o in (self, self.__dict__, self.turns, self.user_context))
+        for turn in self.turns:
+            size += sys.getsizeof(turn) + sum(
+                sys.getsizeof(getattr(turn, name)) for name in Turn.__slots__
+            )
+        return size
+
+
+def as_memory(history):
+    """history : ConversationMemory, liste de messages ou None."""
+    if history is None or isinstance(history, ConversationMemory):
+        return history
+    return ConversationMemory.from_messages(history)
+
+
+class StandaloneQuestion:
+    __slots__ = ("question", "query", "conversation", "rewritten")
+
+    def __init__(self, question: str, query: str = None, conversation: str = ""):
+        self.question = question            # question posée, affichée dans le prompt
+        self.query = query or question      # question autonome : routage, retrieval, cache
+        self.conversation = conversation    # échanges récents (relances seulement)
+        self.rewritten = query is not None and query != question
+
+
+REWRITE_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            "Reformule la dernière question de l'utilisateur pour qu'elle se comprenne sans "
+            "l'historique. Réponds uniquement par la question reformulée, en français.",
+        ),
+        ("human", "Historique :\n{conversation}\n\nDernière question : {question}"),
+    ]
+)
+
+
+class QuestionRewriter:
+    """Question autonome pour le retrieval, à partir de la mémoire de la session."""
+
+    def __init__(self, resources=None, use_llm: bool = MEMORY_LLM_REWRITE, maxsize: int = REWRITE_CACHE_SIZE):
+        self.resources = resources
+        self.use_llm = use_llm
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.skipped = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def rewrite(self, question: str, memory=None) -> StandaloneQuestion:
+        last = memory.last if memory is not None else None
+        if last is None or is_self_contained(question):
+            with self._lock:
+                self.skipped += 1
+            return StandaloneQuestion(question)
+
+        conversation = memory.format()
+        # la question précédente est déjà autonome : elle suffit comme clé
+        key = (normalize_question(question), normalize_question(last.query))
+        with self._lock:
+            query = self._cache.get(key)
+            if query is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if query is None:
+            query, cacheable = self._rewrite(question, last.query, conversation)
+            # repli après un échec du LLM : pas mis en cache, la prochaine relance réessaie le LLM
+            if cacheable:
+                with self._lock:
+                    self._cache[key] = query
+                    while len(self._cache) > self.maxsize:
+                        self._cache.popitem(last=False)
+        return StandaloneQuestion(question, query, conversation)
+
+    def _rewrite(self, question: str, previous: str, conversation: str):
+        """(question autonome, True si elle peut être mise en cache)."""
+        if self.use_llm and self.resources is not None:
+            try:
+                messages = REWRITE_PROMPT.invoke({"conversation": conversation, "question": question})
+                with self.resources.llm_limiter.slot(deadline_after(LLM_TIMEOUT)):
+                    text = self.resources.llm.invoke(messages).content.strip()
+                if text:
+                    return text, True
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"[memory] LLM rewrite failed, carrying terms over: {e}")
+            return carry_over(question, previous), False
+        return carry_over(question, previous), True
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._cache),
+            "skipped": self.skipped,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "errors": self.errors,
+        }
+
+
+def carry_over(question: str, previous: str, max_terms: int = MEMORY_CARRY_TERMS) -> str:
+    """Relance + termes de la question autonome précédente absents de la relance."""
+    seen = set(_words(question))
+    terms = []
+    for word in re.findall(r"\w+", previous or ""):
+        folded = fold_accents(word.lower())
+        if len(folded) < 3 or folded in STOPWORDS or folded in ANAPHORS or folded in seen \
+                or folded in FOLLOW_UP_STARTS:
+            continue
+        seen.add(folded)
+        terms.append(word)
+        if len(terms) >= max_terms:
+            break
+    return f"{question.strip()} {' '.join(terms)}" if terms else question
@@ -0,0 +1,43 @@
+# app/minhash.py
+
+import re
+import zlib
+
+import numpy as np
+
+
+
+# MinHash sur des shingles de mots
+#   deux textes dont les signatures coïncident sur une fraction f des permutations
+#   ont une similarité de Jaccard estimée à f (sur leurs ensembles de shingles)
+
+NUM_PERM = 64
+SHINGLE_SIZE = 5
+
+_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    words = re.findall(r"\w+", (text or "").lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def signature(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """Signature MinHash (NUM_PERM entiers) ; hash stable d'un processus à l'autre (crc32)."""
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) for s in shingles(text, size)), dtype=np.uint64
+    )
+    if len(hashes) == 0:
+        return np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    # (a * h + b) mod p pour chaque permutation, minimum sur les shingles
+    permuted = (_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME
+    return permuted.min(axis=1)
+
+
+def similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    return float(np.mean(sig_a == sig_b))
@@ -0,0 +1,490 @@
+# app/pipeline.py
+
+import os
+import math
+import time
+import queue
+import threading
+from collections import defaultdict
+
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+
+from .config import (
+    VECTORSTORE_PATH,
+    EMBED_BATCH_SIZE,
+    EMBED_WORKERS,
+    EMBED_QUEUE_SIZE,
+    CHECKPOINT_EVERY,
+    CORPUS_DEDUP,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+)
+from .embedding_cache import build_embeddings
+from .ann import write_serving_index
+from .lexical import build_lexical_index
+from .chunkstore import save_vectorstore
+from .dedup import CorpusDeduplicator
+from .extraction import ExtractionService
+from .ingest import (
+    iter_raw_documents,
+    iter_web_documents,
+    clean_document,
+    split_documents,
+    source_key,
+    content_hash,
+    chunk_ids,
+    manifest_settings,
+    load_manifest,
+    save_manifest,
+    load_existing_vectorstore,
+)
+
+
+
+# Pipeline d'ingestion en streaming
+#   load -> clean -> dedup -> split -> [file bornée] -> N workers d'embedding -> ajout FAISS
+# La mémoire reste bornée par (taille de file x taille de batch),
+# et un checkpoint régulier (index + manifest) permet de reprendre une ingestion interrompue.
+# Avec la déduplication, une pré-passe sur le JSONL compte les lignes des pages web (boilerplate).
+# Le hash d'une source (détection des changements) porte sur son texte nettoyé, avant dedup.
+
+_DONE = object()
+
+
+class StageTimer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = defaultdict(float)
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.seconds[stage] += seconds
+
+    def summary(self) -> dict:
+        return {k: round(v, 3) for k, v in self.seconds.items()}
+
+
+class EmbedBatch:
+    __slots__ = ("key", "digest", "n_batches", "texts", "metadatas", "ids", "reused", "depends", "vectors")
+
+    def __init__(self, key, digest, n_batches, texts, metadatas, ids, reused=(), depends=()):
+        self.key = key
+        self.digest = digest
+        self.n_batches = n_batches
+        self.texts = texts
+        self.metadatas = metadatas
+        self.ids = ids
+        self.reused = list(reused)      # ids de la version indexée, gardés tels quels
+        self.depends = list(depends)    # sources des chunks dont un chunk écarté était le doublon
+        self.vectors = None
+
+
+class IngestPipeline:
+    def __init__(
+        self,
+        embeddings=None,
+        full: bool = False,
+        path: str = VECTORSTORE_PATH,
+        batch_size: int = EMBED_BATCH_SIZE,
+        workers: int = EMBED_WORKERS,
+        queue_size: int = EMBED_QUEUE_SIZE,
+        checkpoint_every: int = CHECKPOINT_EVERY,
+        dedup: bool = CORPUS_DEDUP,
+    ):
+        self.embeddings = embeddings or build_embeddings()
+        self.cache = getattr(self.embeddings, "cache", None)
+        self.full = full
+        self.path = path
+        self.batch_size = batch_size
+        self.workers = workers
+        self.queue_size = queue_size
+        self.checkpoint_every = checkpoint_every
+        self.dedup = CorpusDeduplicator() if dedup else None
+        self.extractor = ExtractionService()
+
+        self.timer = StageTimer()
+        self.report = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+        self.load_stats = {}
+        self.skipped = 0
+        self.chunks_embedded = 0
+        self.chunks_saved = 0
+        self.calls_saved = 0
+
+        self._stop = threading.Event()
+        self._seen = set()
+        # sources dont les chunks indexés n'ont pas changé pendant ce run
+        self._stable = set()
+
+    # --- utilitaires de file (abandon propre si le writer échoue) ---
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    # --- étapes load + clean : regroupe les pages consécutives d'une même source ---
+
+    def _iter_sources(self):
+        raw_iter = iter_raw_documents(self.load_stats, self.extractor)
+        current_key, group = None, []
+
+        while True:
+            t0 = time.perf_counter()
+            raw = next(raw_iter, None)
+            self.timer.add("load", time.perf_counter() - t0)
+            if raw is None:
+                break
+
+            t0 = time.perf_counter()
+            doc = clean_document(raw)
+            self.timer.add("clean", time.perf_counter() - t0)
+            if doc is None:
+                self.skipped += 1
+                continue
+
+            key = source_key(doc)
+            if group and key != current_key:
+                yield current_key, group
+                group = []
+            current_key = key
+            group.append(doc)
+
+        if group:
+            yield current_key, group
+
+    # --- étape dedup : boilerplate, pages et chunks quasi identiques ---
+
+    def _count_boilerplate(self):
+        """Pré-passe : lignes des pages web comptées avant tout retrait (indépendant de l'ordre)."""
+        t0 = time.perf_counter()
+        seen = set()
+        for raw in iter_web_documents():
+            doc = clean_document(raw)
+            if doc is None:
+                continue
+            key = source_key(doc)
+            if key in seen:
+                continue
+            seen.add(key)
+            self.dedup.count_lines(doc.page_content)
+        self.timer.add("dedup", time.perf_counter() - t0)
+
+    def _count_saved(self, before: int, after: int):
+        self.chunks_saved += before - after
+        self.calls_saved += math.ceil(before / self.batch_size) - math.ceil(after / self.batch_size)
+
+    def _dedup_source(self, group):
+        """Copie du groupe sans le boilerplate, et True si la source est un quasi-doublon."""
+        if group[0].metadata.get("source") == "web":
+            stripped = []
+            for doc in group:
+                text = self.dedup.strip_boilerplate(doc.page_content)
+                if text:
+                    stripped.append(Document(page_content=text, metadata=dict(doc.metadata)))
+            group = stripped
+        text = "\n".join(doc.page_content for doc in group)
+        return group, not group or self.dedup.is_duplicate_page(text)
+
+    @staticmethod
+    def _estimate_chunks(group) -> int:
+        """Nombre de chunks d'une source écartée sans la découper (pas de CHUNK_SIZE - CHUNK_OVERLAP)."""
+        step = CHUNK_SIZE - CHUNK_OVERLAP
+        return sum(math.ceil(max(len(d.page_content) - CHUNK_OVERLAP, 1) / step) for d in group)
+
+    # --- producteur : split + découpage en batches ---
+
+    def _produce(self, task_q, result_q, old_sources):
+        try:
+            if self.dedup is not None:
+                self._count_boilerplate()
+            for key, group in self._iter_sources():
+                if self._stop.is_set():
+                    return
+                if key in self._seen:
+                    # même url présente deux fois dans le JSONL : on garde la première
+                    self.skipped += 1
+                    continue
+
+                # hash du texte nettoyé : ne dépend pas du boilerplate retiré des autres pages
+                digest = content_hash(group)
+                if self.dedup is not None:
+                    t0 = time.perf_counter()
+                    group, duplicate = self._dedup_source(group)
+                    if duplicate:
+                        # source absente de _seen : retirée de l'index si elle y était
+                        previous = old_sources.get(key)
+                        if not previous or previous["hash"] != digest:
+                            self._count_saved(self._estimate_chunks(group), 0)
+                        self.timer.add("dedup", time.perf_counter() - t0)
+                        continue
+                    self.timer.add("dedup", time.perf_counter() - t0)
+                self._seen.add(key)
+
+                previous = old_sources.get(key)
+                reused = []
+                if previous and previous["hash"] == digest:
+                    # chunks écartés comme doublons d'une source modifiée ou supprimée depuis
+                    # (ou pas encore vue : ordre changé) : on les reprend
+                    if all(dep in self._stable for dep in previous.get("depends", ())):
+                        self.report["unchanged"] += 1
+                        self._stable.add(key)
+                        if self.dedup is not None:
+                            # ses chunks sont déjà indexés : les doublons à venir doivent les voir
+                            t0 = time.perf_counter()
+                            self.dedup.register_chunks(split_documents(group, verbose=False), key)
+                            self.timer.add("dedup", time.perf_counter() - t0)
+                        continue
+                    # mêmes ids que la version indexée : seuls les chunks manquants sont embeddés
+                    reused = previous["ids"]
+                    self._stable.add(key)
+                self.report["updated" if previous else "added"] += 1
+
+                t0 = time.perf_counter()
+                chunks = split_documents(group, verbose=False)
+                self.timer.add("split", time.perf_counter() - t0)
+
+                ids = chunk_ids(key, digest, len(chunks))
+                indexed = set(reused)
+                fresh = [i for i, chunk_id in enumerate(ids) if chunk_id not in indexed]
+                depends = []
+                if self.dedup is not None:
+                    t0 = time.perf_counter()
+                    self.dedup.register_chunks([c for c, i in zip(chunks, ids) if i in indexed], key)
+                    kept, depends = self.dedup.filter_chunks([chunks[i] for i in fresh], key)
+                    self._count_saved(len(fresh), len(kept))
+                    fresh = [fresh[i] for i in kept]
+                    self.timer.add("dedup", time.perf_counter() - t0)
+                chunks = [chunks[i] for i in fresh]
+                ids = [ids[i] for i in fresh]
+                starts = range(0, len(chunks), self.batch_size) if chunks else [0]
+                for start in starts:
+                    part = chunks[start:start + self.batch_size]
+                    batch = EmbedBatch(
+                        key,
+                        digest,
+                        len(starts),
+                        [c.page_content for c in part],
+                        [c.metadata for c in part],
+                        ids[start:start + self.batch_size],
+                        reused=reused,
+                        depends=depends,
+                    )
+                    if not self._put(task_q, batch):
+                        return
+        except Exception as exc:
+            self._put(result_q, exc)
+        finally:
+            for _ in range(self.workers):
+                self._put(task_q, _DONE)
+
+    # --- workers d'embedding ---
+
+    def _embed_worker(self, task_q, result_q):
+        while True:
+            batch = task_q.get()
+            if batch is _DONE or self._stop.is_set():
+                self._put(result_q, _DONE)
+                return
+            try:
+                t0 = time.perf_counter()
+                batch.vectors = self.embeddings.embed_documents(batch.texts) if batch.texts else []
+                self.timer.add("embed", time.perf_counter() - t0)
+            except Exception as exc:
+                self._put(result_q, exc)
+                continue
+            if not self._put(result_q, batch):
+                return
+
+    # --- writer (thread principal) : ajout FAISS + checkpoints ---
+
+    def _checkpoint(self, vectorstore, sources, pending):
+        if vectorstore is None:
+            return
+        t0 = time.perf_counter()
+        os.makedirs(self.path, exist_ok=True)
+        save_vectorstore(vectorstore, self.path)
+        save_manifest(
+            {"settings": manifest_settings(), "sources": sources, "pending": pending},
+            self.path,
+        )
+        if self.cache is not None:
+            self.cache.flush()
+        self.timer.add("checkpoint", time.perf_counter() - t0)
+
+    def _drop(self, vectorstore, stale):
+        if not stale:
+            return
+        t0 = time.perf_counter()
+        vectorstore.delete(stale)
+        stale.clear()
+        self.timer.add("add", time.perf_counter() - t0)
+
+    def run(self) -> dict:
+        t_start = time.perf_counter()
+
+        manifest = {} if self.full else load_manifest(self.path)
+        vectorstore = load_existing_vectorstore(self.embeddings, manifest, self.path)
+        if vectorstore is None:
+            manifest = {}
+
+        # sources présentes dans l'index (peut diminuer au fil des mises à jour)
+        sources = dict(manifest.get("sources", {}))
+        old_sources = dict(sources)
+
+        # reprise : on retire les chunks d'une source laissée à moitié indexée
+        leftover = [i for ids in manifest.get("pending", {}).values() for i in ids]
+        if leftover:
+            vectorstore.delete(leftover)
+            print(f"Resuming interrupted ingest ({len(leftover)} partial chunks dropped).")
+
+        task_q = queue.Queue(maxsize=self.queue_size)
+        result_q = queue.Queue(maxsize=self.queue_size)
+
+        producer = threading.Thread(
+            target=self._produce, args=(task_q, result_q, old_sources), daemon=True
+        )
+        workers = [
+            threading.Thread(target=self._embed_worker, args=(task_q, result_q), daemon=True)
+            for _ in range(self.workers)
+        ]
+        producer.start()
+        for w in workers:
+            w.start()
+
+        pending = {}          # source -> ids déjà ajoutés
+        # chunks des anciennes versions des sources modifiées : FAISS.delete reconstruit ses
+        # tables d'ids à chaque appel, on les retire donc en un seul appel par checkpoint
+        stale = []
+        remaining = {}        # source -> batches encore attendus
+        done_workers = 0
+        batches = 0
+
+        try:
+            while done_workers < self.workers:
+                item = result_q.get()
+                if item is _DONE:
+                    done_workers += 1
+                    continue
+                if isinstance(item, Exception):
+                    raise item
+
+                t0 = time.perf_counter()
+                key = item.key
+                if key not in remaining:
+                    remaining[key] = item.n_batches
+                    # ids réutilisés comptés comme en attente : une reprise les retire avec le reste
+                    pending[key] = list(item.reused)
+                    previous = sources.pop(key, None)
+                    if previous:
+                        reused = set(item.reused)
+                        stale.extend(i for i in previous["ids"] if i not in reused)
+
+                if item.texts:
+                    text_embeddings = list(zip(item.texts, item.vectors))
+                    if vectorstore is None:
+                        vectorstore = FAISS.from_embeddings(
+                            text_embeddings,
+                            self.embeddings,
+                            metadatas=item.metadatas,
+                            ids=item.ids,
+                        )
+                    else:
+                        vectorstore.add_embeddings(
+                            text_embeddings, metadatas=item.metadatas, ids=item.ids
+                        )
+                self.timer.add("add", time.perf_counter() - t0)
+
+                pending[key].extend(item.ids)
+                remaining[key] -= 1
+                if remaining[key] == 0:
+                    sources[key] = {"hash": item.digest, "ids": pending.pop(key)}
+                    if item.depends:
+                        sources[key]["depends"] = item.depends
+                    del remaining[key]
+
+                batches += 1
+                self.chunks_embedded += len(item.texts)
+                if batches % self.checkpoint_every == 0:
+                    self._drop(vectorstore, stale)
+                    self._checkpoint(vectorstore, sources, pending)
+                    elapsed = time.perf_counter() - t_start
+                    print(
+                        f"[ingest] {self.chunks_embedded} chunks "
+                        f"({self.chunks_embedded / elapsed:.1f} chunks/s)"
+                    )
+        except BaseException:
+            self._stop.set()
+            raise
+        finally:
+            producer.join(timeout=1)
+            self.extractor.close()
+
+        for key in list(sources):
+            if key not in self._seen:
+                stale.extend(sources.pop(key)["ids"])
+                self.report["deleted"] += 1
+        self._drop(vectorstore, stale)
+
+        if vectorstore is None:
+            print("Nothing to index.")
+            return self.report
+
+        self._checkpoint(vectorstore, sources, {})
+
+        t0 = time.perf_counter()
+        meta = write_serving_index(vectorstore, self.path)
+        self.timer.add("ann_build", time.perf_counter() - t0)
+        self.report["index_type"] = meta["index_type"]
+
+        t0 = time.perf_counter()
+        build_lexical_index(vectorstore, self.path)
+        self.timer.add("lexical", time.perf_counter() - t0)
+
+        elapsed = time.perf_counter() - t_start
+        self.report["chunks"] = self.chunks_embedded
+        self.report["skipped"] = self.skipped + self.load_stats.get("web_bad_lines", 0)
+        self.report["seconds"] = round(elapsed, 3)
+        self.report["chunks_per_s"] = round(self.chunks_embedded / elapsed, 1) if elapsed else 0.0
+        self.report["stages"] = self.timer.summary()
+        self.report["extraction"] = self.extractor.stats()
+        if self.dedup is not None:
+            self.report["dedup"] = {
+                **self.dedup.summary(),
+                "chunks_saved": self.chunks_saved,
+                "embed_calls_saved": self.calls_saved,
+            }
+
+        print(
+            f"Vectorstore saved to {self.path} "
+            f"(added={self.report['added']}, updated={self.report['updated']}, "
+            f"deleted={self.report['deleted']}, unchanged={self.report['unchanged']})"
+        )
+        print(
+            f"Embedded {self.chunks_embedded} chunks in {elapsed:.1f}s "
+            f"({self.report['chunks_per_s']} chunks/s) | stages: {self.report['stages']}"
+        )
+        extraction = self.report["extraction"]
+        print(
+            f"Extracted {extraction['pages']} PDF/TXT pages from {extraction['files']} files "
+            f"({extraction['cached_pages']} from cache, {extraction['pages_per_s']} pages/s)"
+        )
+        if self.dedup is not None:
+            dedup = self.report["dedup"]
+            print(
+                f"Dedup: {dedup['boilerplate_lines']} boilerplate lines, "
+                f"{dedup['near_duplicate_pages']} near-duplicate pages, "
+                f"{dedup['near_duplicate_chunks']} near-duplicate chunks "
+                f"-> {self.chunks_saved} chunks / {self.calls_saved} embedding calls saved"
+            )
+        if self.cache is not None:
+            cache_stats = self.cache.stats()
+            print(
+                f"Embedding cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                f"(hit rate {cache_stats['hit_rate']})"
+            )
+        return self.report
@@ -1,50 +1,143 @@
 # app/rag.py
 
-from langchain_ollama import ChatOllama, OllamaEmbeddings
-from langchain_community.vectorstores import FAISS
+import time
+import asyncio
+
+import os
+
+import faiss
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableParallel, RunnablePassthrough
+from langchain_core.runnables import RunnableLambda
 
-from .config import OLLAMA_MODEL, EMBEDDING_MODEL, VECTORSTORE_PATH
+from .config import (
+    OLLAMA_MODEL,
+    VECTORSTORE_PATH,
+    RETRIEVER_K,
+    AGENT_DOC_TYPES,
+    HYBRID_SEARCH,
+    HYBRID_CANDIDATES,
+    RRF_K,
+    RERANK,
+    RERANK_CANDIDATES,
+    CONTEXT_MAX_TOKENS,
+    UPLOAD_MAX_TOKENS,
+)
+from .embedding_cache import build_embeddings
+from .ann import read_index_meta, load_serving_index
+from .chunkstore import open_vectorstore
+from .resources import get_resources
+from .cache import normalize_question, text_hash
+from .lexical import reciprocal_rank_fusion
+from .subindex import matches_filter
+from .limiter import RequestTimeout, remaining
+from .context import pack_context
+from .tracing import NO_TRACE
 
 
 
 # Load FAISS vectorstore
 
-def load_vectorstore():
-    embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL)
-    return FAISS.load_local(
-        VECTORSTORE_PATH,
-        embeddings,
-        allow_dangerous_deserialization=True,
+def load_vectorstore(embeddings=None, path: str = VECTORSTORE_PATH):
+    if embeddings is None:
+        embeddings = build_embeddings()
+
+    # index_meta.json décide quel index servir (voir app/ann.py)
+    ann = load_serving_index(path, read_index_meta(path))
+    # l'index exact n'est que mappé si un index ANN le remplace
+    index = faiss.read_index(
+        os.path.join(path, "index.faiss"),
+        faiss.IO_FLAG_MMAP if ann is not None else 0,
     )
+    if ann is not None and ann.ntotal == index.ntotal:
+        index = ann
+    # chunks mappés depuis le ChunkStore (voir app/chunkstore.py), plus de pickle à charger
+    return open_vectorstore(path, embeddings, index=index)
+
+
+
+# Retrieval avec cache niveau 1 (embedding + ids des chunks)
+#   doc_type / school : recherche dans le sous-index correspondant (voir app/subindex.py)
+#   trace : durées embed / search / rerank de la requête (voir app/tracing.py)
+
+def retrieve(question: str, resources=None, k: int = RETRIEVER_K, doc_type: str = None, school: str = None,
+             rerank: bool = RERANK, trace=NO_TRACE):
+    resources = resources or get_resources()
+    reranker = resources.reranker if rerank else None
+    if reranker is not None and reranker.model is None:
+        reranker = None
+    # sur-récupération seulement si un cross-encoder reranque ensuite
+    n = max(k, RERANK_CANDIDATES) if reranker is not None else k
+
+    # lease : la version servie ne peut pas être supprimée pendant la recherche
+    with resources.lease() as vectorstore:
+        key = (normalize_question(question), k, doc_type, school, reranker is not None, vectorstore.version)
+
+        with trace.span("search"):
+            hit = resources.query_cache.get(key)
+            docs = vectorstore.get_by_ids(hit["doc_ids"]) if hit is not None else []
+        if hit is not None and len(docs) == len(hit["doc_ids"]):
+            return docs, hit["embedding"]
+
+        with trace.span("embed"):
+            embedding = resources.embed_question(question)
+        with trace.span("search"):
+            if HYBRID_SEARCH and vectorstore.lexical is not None:
+                docs = hybrid_search(vectorstore, question, embedding, n, doc_type, school)
+            else:
+                docs = vectorstore.search(embedding, k=n, doc_type=doc_type, school=school)
+        if reranker is not None:
+            with trace.span("rerank"):
+                docs = reranker.rerank(question, docs, k)
+        resources.query_cache.put(key, embedding, [d.id for d in docs])
+        return docs, embedding
+
+
+def hybrid_search(vectorstore, question, embedding, k, doc_type=None, school=None):
+    """FAISS + BM25, fusionnés par rang réciproque (RRF)."""
+    dense = vectorstore.search(embedding, k=HYBRID_CANDIDATES, doc_type=doc_type, school=school)
+    # BM25 limité aux positions du sous-index avant la coupe top-k (sinon peu de candidats filtrés)
+    entry = vectorstore.subindexes.get(doc_type, school) if doc_type or school else None
+    allowed = entry[1] if entry is not None else None
+    found = vectorstore.lexical.search_positions(question, HYBRID_CANDIDATES, positions=allowed)
+    lexical = [
+        d for d in vectorstore.documents([pos for pos, _ in found])
+        if matches_filter(d.metadata, doc_type, school)
+    ]
+
+    by_id = {d.id: d for d in dense + lexical}
+    fused = reciprocal_rank_fusion([[d.id for d in dense], [d.id for d in lexical]], RRF_K)
+    return [by_id[doc_id] for doc_id in fused[:k]]
+
+
+def format_docs(docs, max_tokens=CONTEXT_MAX_TOKENS):
+    # chunks entiers, fusionnés et dédoublonnés, dans le budget de tokens (voir app/context.py)
+    return pack_context(docs, max_tokens)[0]
 
 
 
 # Build RAG chain
 
-def build_rag_chain(system_prompt: str, agent_type: str = None):
+def build_rag_chain(system_prompt: str, agent_type: str = None, resources=None):
     """
     RAG final :
-    - FAISS reçoit TOUJOURS une string (la question)
+    - FAISS reçoit TOUJOURS une string (la question, ou sa forme autonome pour une relance)
+    - conversation = derniers échanges, seulement pour une relance (voir app/memory.py)
     - user_context = document uploadé (temporaire)
     - PAS de dict mal formé
+    - index FAISS + LLM partagés via le registre (chargés une seule fois)
+    - cache des réponses (niveau 2) devant le LLM
     """
 
-    llm = ChatOllama(model=OLLAMA_MODEL, temperature=0)
-    vectorstore = load_vectorstore()
-
-
-    retriever = vectorstore.as_retriever(
-        search_kwargs={"k": 6}#meilleur extraits dans la base FAISS
-    )
+    resources = resources or get_resources()
+    llm = resources.llm
+    doc_type = AGENT_DOC_TYPES.get(agent_type)  # None -> recherche globale
 
     prompt = ChatPromptTemplate.from_messages(
         [
             ("system", system_prompt),
             (
                 "human",
+                "Échanges précédents (si relance) :\n{conversation}\n\n"
                 "Question : {question}\n\n"
                 "Contexte institutionnel (RAG) :\n{context}\n\n"
                 "Document utilisateur (si fourni) :\n{user_context}\n\n"
@@ -52,26 +145,133 @@ def build_rag_chain(system_prompt: str, agent_type: str = None):
             ),
         ]
     )
-    
 
+    def prepare(inputs):
+        trace = inputs.get("trace") or NO_TRACE
+
+        # On cherche dans FAISS (meilleurs extraits) avec la question autonome
+        query = inputs.get("query") or inputs["question"]
+        docs, embedding = retrieve(
+            query,
+            resources,
+            doc_type=doc_type,
+            school=inputs.get("school"),
+            trace=trace,
+        )
 
-    def format_docs(docs, max_chars=2000):
-        return "\n\n".join(d.page_content for d in docs)[:max_chars]
+        # document uploadé : on retrouve ses meilleurs passages avec le même embedding
+        user_context = inputs.get("user_context", "")
+        upload = inputs.get("upload")
+        if upload is not None:
+            with trace.span("search"):
+                upload_docs = upload.search(embedding)
+            with trace.span("format"):
+                user_context = format_docs(upload_docs, UPLOAD_MAX_TOKENS)
 
+        with trace.span("format"):
+            context, report = pack_context(docs, CONTEXT_MAX_TOKENS)
+        resources.context_stats.record(report)
 
-    rag_chain = (
-        RunnableParallel(
-        {
-            "question": RunnablePassthrough(),# On garde la question brute
-            "context": (lambda x: x["question"]) | retriever | format_docs,# On cherche dans FAISS
-            "user_context": RunnablePassthrough(),# On garde le document uploadé
+        return {
+            "question": inputs["question"],
+            "query": query,
+            "conversation": inputs.get("conversation", ""),
+            "context": context,
+            "user_context": user_context,
+            "question_embedding": embedding,
+            "deadline": inputs.get("deadline"),
+            "trace": trace,
         }
-    )
-    | prompt # On injecte tout dans le moule
-    | llm # Le modèle génère la réponse
-    | StrOutputParser() # On transforme la sortie en texte simple
 
+    async def aprepare(inputs):
+        # FAISS + embeddings (avec caches) restent synchrones : hors de la boucle
+        return await asyncio.to_thread(prepare, inputs)
 
-    )
+    # prompt puis LLM, appelés séparément pour mesurer l'assemblage du prompt à part ;
+    # pas de StrOutputParser : on lit chunk.content nous-mêmes, sinon fermer le flux
+    # (client parti) attend la fin de la génération au lieu de couper la requête Ollama
+
+    def cache_args(inputs):
+        # relance : la réponse dépend aussi des échanges précédents
+        context_hash = text_hash(inputs["context"], inputs["user_context"], inputs["conversation"])
+        return agent_type, inputs["query"], context_hash, OLLAMA_MODEL
+
+    def answer(inputs):
+        # générateur : invoke() concatène les tokens, stream() les renvoie un par un
+        trace = inputs["trace"]
+        args = cache_args(inputs)
+        with trace.span("cache"):
+            cached = resources.answer_cache.get(*args, embedding=inputs["question_embedding"])
+        if cached is not None:
+            yield cached
+            return
+
+        with trace.span("prompt"):
+            messages = prompt.invoke(inputs) # On injecte tout dans le moule
+
+        # la génération passe par le limiteur partagé (file d'attente + délai max)
+        deadline = inputs["deadline"]
+        tokens = []
+        queued = time.perf_counter()
+        with resources.llm_limiter.slot(deadline):
+            started = time.perf_counter()
+            trace.add("queue", started - queued)
+            stream = llm.stream(messages) # Le modèle génère la réponse
+            try:
+                for chunk in stream:
+                    remaining(deadline)
+                    token = chunk.content
+                    if not token:
+                        continue
+                    if not tokens:
+                        trace.add("ttft", time.perf_counter() - started)
+                    tokens.append(token)
+                    yield token
+            finally:
+                # client parti / délai dépassé : on coupe la requête Ollama
+                stream.close()
+                trace.add("generation", time.perf_counter() - started)
+        resources.answer_cache.put(*args, "".join(tokens), embedding=inputs["question_embedding"])
+
+    async def aanswer(inputs):
+        trace = inputs["trace"]
+        args = cache_args(inputs)
+        with trace.span("cache"):
+            cached = resources.answer_cache.get(*args, embedding=inputs["question_embedding"])
+        if cached is not None:
+            yield cached
+            return
+
+        with trace.span("prompt"):
+            messages = prompt.invoke(inputs)
+
+        deadline = inputs["deadline"]
+        tokens = []
+        queued = time.perf_counter()
+        async with resources.llm_limiter.aslot(deadline):
+            started = time.perf_counter()
+            trace.add("queue", started - queued)
+            stream = llm.astream(messages)
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), remaining(deadline))
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise RequestTimeout("LLM generation timed out")
+                    token = chunk.content
+                    if not token:
+                        continue
+                    if not tokens:
+                        trace.add("ttft", time.perf_counter() - started)
+                    tokens.append(token)
+                    yield token
+            finally:
+                await stream.aclose()
+                trace.add("generation", time.perf_counter() - started)
+        resources.answer_cache.put(*args, "".join(tokens), embedding=inputs["question_embedding"])
+
+    rag_chain = RunnableLambda(prepare, afunc=aprepare) | RunnableLambda(answer, afunc=aanswer)
 
     return rag_chain
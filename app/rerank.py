@@ -0,0 +1,96 @@
+# app/rerank.py
+
+import time
+import threading
+
+import numpy as np
+
+from .config import (
+    RERANK_MODEL,
+    RERANK_BATCH_SIZE,
+    RERANK_BUDGET_MS,
+    RERANK_MIN_SCORE,
+)
+
+
+
+# Reranking des candidats par un cross-encoder local (CPU)
+#   - la recherche (FAISS / hybride) sur-récupère RERANK_CANDIDATES chunks
+#   - le cross-encoder note chaque paire (question, chunk), par batches
+#   - on garde les k meilleurs chunks au-dessus du seuil (app/context.py les fait tenir dans le budget)
+#   - budget de latence : s'il est dépassé, on garde l'ordre de la recherche
+#   sentence-transformers est optionnel : sans lui, l'étape est ignorée.
+
+def load_cross_encoder(model_name: str = RERANK_MODEL):
+    try:
+        from sentence_transformers import CrossEncoder
+    except ImportError:
+        print("[rerank] sentence-transformers not installed: reranking disabled")
+        return None
+    return CrossEncoder(model_name, device="cpu")
+
+
+class Reranker:
+    def __init__(
+        self,
+        model=None,
+        batch_size: int = RERANK_BATCH_SIZE,
+        budget_ms: float = RERANK_BUDGET_MS,
+        min_score: float = RERANK_MIN_SCORE,
+    ):
+        self.model = model          # objet avec .predict(paires) -> scores
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self.min_score = min_score
+
+        self._lock = threading.Lock()
+        self.count = 0
+        self.fallbacks = 0
+        self.total_ms = 0.0
+
+    def score(self, question: str, docs):
+        """Scores des docs, ou None si le budget de latence est dépassé."""
+        start = time.perf_counter()
+        budget = self.budget_ms / 1000
+        scores = []
+        for i in range(0, len(docs), self.batch_size):
+            batch = docs[i:i + self.batch_size]
+            elapsed = time.perf_counter() - start
+            # on ne lance pas un batch qui finirait hors budget (estimé sur les précédents)
+            if i and elapsed + elapsed / i * len(batch) > budget:
+                return None
+            pairs = [(question, d.page_content) for d in batch]
+            scores.extend(np.asarray(self.model.predict(pairs), dtype=np.float32).reshape(-1))
+        if time.perf_counter() - start > budget:
+            return None
+        return np.asarray(scores, dtype=np.float32)
+
+    def rerank(self, question: str, docs, k: int):
+        """Top-k docs reranqués (moins si peu sont pertinents) ; ordre d'origine en cas de repli."""
+        if self.model is None or not docs:
+            return docs[:k]
+
+        t0 = time.perf_counter()
+        scores = self.score(question, docs)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        with self._lock:
+            self.count += 1
+            self.total_ms += elapsed_ms
+            if scores is None:
+                self.fallbacks += 1
+        if scores is None:
+            return docs[:k]
+
+        order = np.argsort(-scores, kind="stable")
+        # au moins le meilleur chunk, même sous le seuil
+        kept = [docs[i] for i in order if scores[i] >= self.min_score] or [docs[order[0]]]
+        return kept[:k]
+
+    def stats(self) -> dict:
+        n = self.count or 1
+        return {
+            "enabled": self.model is not None,
+            "count": self.count,
+            "fallbacks": self.fallbacks,
+            "avg_ms": round(self.total_ms / n, 2),
+        }
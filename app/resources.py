@@ -0,0 +1,412 @@
+# app/resources.py
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+from langchain_ollama import ChatOllama
+
+from .config import (
+    OLLAMA_MODEL,
+    VECTORSTORE_PATH,
+    INDEX_WATCH,
+    RERANK,
+    TRACE_PERSIST,
+    QUERY_BATCHING,
+    EMBED_BATCH_MAX,
+    SEARCH_BATCH_MAX,
+    BATCH_MAX_WAIT_MS,
+)
+from .embedding_cache import build_embeddings
+from .cache import QueryCache, AnswerCache, normalize_question
+from .subindex import SubIndexes
+from .chunkstore import documents_at
+from .ann import serving_index_bytes
+from .lexical import LexicalIndex
+from .limiter import ConcurrencyLimiter
+from .rerank import Reranker, load_cross_encoder
+from .context import ContextStats
+from .tracing import Tracer
+from .batching import MicroBatcher
+from .memory import QuestionRewriter
+from .versions import IndexWatcher, current_version, resolve_index_path, gc_versions
+
+
+
+# Handle lecture seule sur le vectorstore partagé
+
+class VectorStoreHandle:
+    """
+    Vue lecture seule sur le FAISS partagé :
+    les agents peuvent chercher, jamais ajouter / supprimer.
+    """
+
+    def __init__(self, vectorstore, lexical=None, version: str = "", path: str = None, lock=None):
+        self._vs = vectorstore
+        self.subindexes = SubIndexes(vectorstore, path=path, lock=lock)
+        self.index_bytes = serving_index_bytes(vectorstore.index, path)   # une fois par version
+        self.lexical = lexical  # index BM25 (None si absent)
+        self.version = version
+        self.refs = 0           # requêtes en cours sur cette version (voir SharedResources.lease)
+        self.batcher = None     # recherches regroupées entre requêtes (voir SharedResources)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs):
+        return self._vs.similarity_search(query, k=k, **kwargs)
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs):
+        return self._vs.similarity_search_with_score(query, k=k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs):
+        return self._vs.similarity_search_by_vector(embedding, k=k, **kwargs)
+
+    def get_by_ids(self, ids):
+        return self._vs.get_by_ids(ids)
+
+    def documents(self, positions):
+        """Documents aux positions FAISS (positions de l'index lexical comprises)."""
+        return documents_at(self._vs, positions)
+
+    def search(self, embedding, k: int = 4, doc_type: str = None, school: str = None):
+        """Recherche globale, ou restreinte au sous-index (type, école) si un filtre est donné."""
+        if self.batcher is not None:
+            return self.batcher.submit((self, embedding, k, doc_type, school))
+        return self.search_many([embedding], k, doc_type=doc_type, school=school)[0]
+
+    def search_many(self, embeddings, k: int = 4, doc_type: str = None, school: str = None):
+        """Un seul index.search pour plusieurs questions (même filtre) : une liste de Documents par question."""
+        if doc_type or school:
+            found = self.subindexes.search_many(embeddings, k, doc_type=doc_type, school=school)
+            if found is not None:
+                return found
+
+        vs = self._vs
+        queries = np.asarray(embeddings, dtype=np.float32)
+        if vs._normalize_L2:
+            faiss.normalize_L2(queries)
+        _, found = vs.index.search(queries, k)
+        return [documents_at(vs, row) for row in found]
+
+    def as_retriever(self, **kwargs):
+        return self._vs.as_retriever(**kwargs)
+
+    @property
+    def ntotal(self) -> int:
+        return self._vs.index.ntotal
+
+
+
+# Registre process-wide
+
+class SharedResources:
+    """
+    Charge UNE fois par process :
+    - l'index FAISS (désérialisé depuis VECTORSTORE_PATH)
+    - le client d'embeddings
+    - le client LLM
+    Tous les agents et toutes les sessions Streamlit reçoivent les mêmes objets.
+    path / embeddings / llm permettent d'injecter d'autres instances (benchmarks).
+    watch=True : un thread recharge l'index quand une ingestion publie une nouvelle version.
+    batching=True : embeddings de questions et recherches FAISS concurrents regroupés (app/batching.py).
+    """
+
+    def __init__(self, path: str = VECTORSTORE_PATH, embeddings=None, llm=None, watch: bool = False,
+                 batching: bool = QUERY_BATCHING):
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        # chargements paresseux des modèles (lents) : hors de _lock, que lease() prend à chaque requête
+        self._models_lock = threading.Lock()
+        self._router_lock = threading.Lock()
+        self._reranker_lock = threading.Lock()
+        self.path = path
+        self.watch = watch
+        self._watcher = None
+        self._retired = []      # anciennes versions encore utilisées par des requêtes
+        self._embeddings = embeddings
+        self._llm = llm
+        self._vectorstore = None
+        self._handle = None
+        self.load_seconds = 0.0
+        self.loaded_at = None
+        self.index_version = ""
+
+        # caches partagés devant la chaîne RAG (voir app/cache.py)
+        self.query_cache = QueryCache()
+        self.answer_cache = AnswerCache()
+        # embedding de la question, partagé entre routage et retrieval
+        self.question_cache = QueryCache()
+        self._semantic_router = None
+        self._reranker = None
+
+        # tokens de contexte envoyés au LLM vs écartés (doublons, recouvrements, budget)
+        self.context_stats = ContextStats()
+
+        # générations LLM simultanées bornées, pour toutes les sessions
+        self.llm_limiter = ConcurrencyLimiter()
+
+        # durée de chaque étape des requêtes, par agent (voir app/tracing.py)
+        self.tracer = Tracer()
+
+        # relances de conversation -> question autonome, cache partagé entre sessions (voir app/memory.py)
+        self.rewriter = QuestionRewriter(self)
+
+        # questions des sessions simultanées : un appel d'embedding / un index.search par lot
+        self.embed_batcher = None
+        self.search_batcher = None
+        if batching:
+            self.embed_batcher = MicroBatcher(
+                self._embed_batch, EMBED_BATCH_MAX, BATCH_MAX_WAIT_MS, name="embed-batcher"
+            )
+            self.search_batcher = MicroBatcher(
+                self._search_batch, SEARCH_BATCH_MAX, BATCH_MAX_WAIT_MS, name="search-batcher"
+            )
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            with self._models_lock:
+                if self._embeddings is None:
+                    self._embeddings = build_embeddings()
+        return self._embeddings
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._models_lock:
+                if self._llm is None:
+                    self._llm = ChatOllama(model=OLLAMA_MODEL, temperature=0)
+        return self._llm
+
+    @property
+    def semantic_router(self):
+        if self._semantic_router is None:
+            embeddings = self.embeddings
+            with self._router_lock:
+                if self._semantic_router is None:
+                    from .semantic_router import SemanticRouter
+
+                    self._semantic_router = SemanticRouter(embeddings)
+        return self._semantic_router
+
+    @property
+    def reranker(self) -> Reranker:
+        if self._reranker is None:
+            with self._reranker_lock:
+                if self._reranker is None:
+                    self._reranker = Reranker(load_cross_encoder() if RERANK else None)
+        return self._reranker
+
+    def embed_question(self, question: str):
+        """Embedding de la question, calculé une seule fois par question normalisée."""
+        key = normalize_question(question)
+        hit = self.question_cache.get(key)
+        if hit is not None:
+            return hit["embedding"]
+        if self.embed_batcher is not None:
+            embedding = self.embed_batcher.submit(question)
+        else:
+            embedding = self.embeddings.embed_query(question)
+        self.question_cache.put(key, embedding, None)
+        return embedding
+
+    def _embed_batch(self, questions):
+        # une même question posée par plusieurs sessions n'est embeddée qu'une fois
+        unique = list(dict.fromkeys(questions))
+        vectors = dict(zip(unique, self.embeddings.embed_documents(unique)))
+        return [vectors[q] for q in questions]
+
+    @staticmethod
+    def _search_batch(requests):
+        # requêtes groupées par (version, filtre) ; chaque groupe cherche avec le plus grand k demandé
+        groups = {}
+        for i, (handle, embedding, k, doc_type, school) in enumerate(requests):
+            groups.setdefault((id(handle), doc_type, school), []).append(i)
+        results = [None] * len(requests)
+        for positions in groups.values():
+            handle, _, _, doc_type, school = requests[positions[0]]
+            k = max(requests[i][2] for i in positions)
+            found = handle.search_many([requests[i][1] for i in positions], k, doc_type=doc_type, school=school)
+            for i, docs in zip(positions, found):
+                results[i] = docs[:requests[i][2]]
+        return results
+
+    @property
+    def vectorstore(self) -> VectorStoreHandle:
+        if self._handle is None:
+            embeddings = self.embeddings
+            with self._lock:
+                if self._handle is None:
+                    self._install(*self._load(embeddings))
+                    if self.watch:
+                        self._watcher = IndexWatcher(self).start()
+        return self._handle
+
+    @contextmanager
+    def lease(self):
+        """
+        Handle de la version courante pour la durée d'une requête :
+        une version remplacée n'est supprimée du disque qu'une fois relâchée.
+        """
+        self.vectorstore  # chargement initial si besoin
+        # lecture du handle courant et prise de référence dans la même section critique :
+        # un reload + gc_versions ne peut pas se glisser entre les deux
+        with self._lock:
+            handle = self._handle
+            handle.refs += 1
+        try:
+            yield handle
+        finally:
+            with self._lock:
+                handle.refs -= 1
+                release = handle.refs == 0 and handle in self._retired
+            if release:
+                self._collect()
+
+    def _collect(self):
+        with self._lock:
+            self._retired = [h for h in self._retired if h.refs > 0]
+            in_use = {h.version for h in self._retired}
+        if current_version(self.path) is not None:
+            removed = gc_versions(self.path, in_use=in_use)
+            if removed:
+                print(f"[index] removed old versions: {', '.join(removed)}")
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._handle is not None
+
+    def _load(self, embeddings):
+        from .rag import load_vectorstore
+
+        t0 = time.perf_counter()
+        path = resolve_index_path(self.path)
+        version = current_version(self.path) or self._read_index_version(path)
+        vectorstore = load_vectorstore(embeddings, path)
+        # position -> id déjà mappé par le ChunkStore : pas de copie de ids.json par process
+        lexical = LexicalIndex.load(path, ids=vectorstore.index_to_docstore_id)
+        handle = VectorStoreHandle(vectorstore, lexical, version, path=path, lock=self._lock)
+        return vectorstore, handle, time.perf_counter() - t0
+
+    def _install(self, vectorstore, handle, load_seconds):
+        previous = self._handle
+        handle.batcher = self.search_batcher
+        self._vectorstore = vectorstore
+        self._handle = handle
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.index_version = handle.version
+        if previous is not None and previous.version != handle.version:
+            self._retired.append(previous)
+
+    def reload(self) -> dict:
+        """
+        Recharge l'index depuis le disque sans redémarrer :
+        le nouvel index est chargé à côté, puis remplace l'ancien d'un coup
+        (les requêtes en cours finissent sur l'ancien).
+        """
+        with self._reload_lock:
+            loaded = self._load(self.embeddings)
+            with self._lock:
+                self._install(*loaded)
+            self.invalidate_caches()
+            self._collect()
+        return {
+            "index_version": self.index_version,
+            "index_vectors": self._handle.ntotal,
+            "load_seconds": round(self.load_seconds, 3),
+        }
+
+    @staticmethod
+    def _read_index_version(path) -> str:
+        # ancienne disposition (pas de CURRENT) : date de l'index
+        index_file = os.path.join(path, "index.faiss")
+        if not os.path.exists(index_file):
+            return ""
+        return str(int(os.path.getmtime(index_file)))
+
+    def invalidate_caches(self):
+        """À appeler quand l'index est reconstruit / rechargé."""
+        self.query_cache.clear()
+        self.answer_cache.clear()
+
+    def memory_report(self) -> dict:
+        """Estimation de la mémoire tenue par le registre (octets)."""
+        report = {
+            "vectorstore_loaded": self._vectorstore is not None,
+            "index_vectors": 0,
+            "index_dim": 0,
+            "index_bytes": 0,
+            "docstore_docs": 0,
+            "docstore_bytes": 0,
+            "load_seconds": round(self.load_seconds, 3),
+            "loaded_at": self.loaded_at,
+            "index_version": self.index_version,
+            "retired_versions": [h.version for h in self._retired],
+        }
+        vs = self._vectorstore
+        if vs is None:
+            return report
+
+        index = vs.index
+        report["index_type"] = type(index).__name__
+        report["index_vectors"] = int(index.ntotal)
+        report["index_dim"] = int(index.d)
+        report["index_bytes"] = self._handle.index_bytes
+
+        report["subindex_bytes"] = self._handle.subindexes.memory_bytes()
+        lexical = self._handle.lexical
+        report["lexical_bytes"] = lexical.memory_bytes() if lexical is not None else 0
+        store = getattr(vs.docstore, "store", None)
+        report["docstore_mmap"] = store is not None
+        if store is not None:
+            # ChunkStore : fichiers mappés, pages partagées entre processus (taille sur disque)
+            report["docstore_docs"] = len(store)
+            report["docstore_bytes"] = store.disk_bytes()
+            return report
+        docs = getattr(vs.docstore, "_dict", {})
+        report["docstore_docs"] = len(docs)
+        report["docstore_bytes"] = sum(
+            sys.getsizeof(d.page_content) + sys.getsizeof(d.metadata)
+            for d in docs.values()
+        )
+        return report
+
+    def embedding_cache_stats(self) -> dict:
+        cache = getattr(self._embeddings, "cache", None)
+        return cache.stats() if cache is not None else {}
+
+    def cache_stats(self) -> dict:
+        return {
+            "query": self.query_cache.stats(),
+            "question_embedding": self.question_cache.stats(),
+            "answer": self.answer_cache.stats(),
+            "rewrite": self.rewriter.stats(),
+        }
+
+    def batching_stats(self) -> dict:
+        if self.embed_batcher is None:
+            return {}
+        return {"embed": self.embed_batcher.stats(), "search": self.search_batcher.stats()}
+
+    def rerank_stats(self) -> dict:
+        return self._reranker.stats() if self._reranker is not None else {}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_resources() -> SharedResources:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = SharedResources(watch=INDEX_WATCH)
+                if TRACE_PERSIST:
+                    from .analytics import get_analytics
+
+                    _registry.tracer.sink = get_analytics().record_spans
+    return _registry
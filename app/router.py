@@ -2,47 +2,136 @@
 
 from typing import Dict
 import re
+import asyncio
 
-from .agents import create_agents, AgentResponse
+from .agents import create_agents, AgentResponse, AgentStream, AgentAsyncStream
+from .config import SEMANTIC_ROUTING, LLM_TIMEOUT
+from .resources import get_resources
+from .memory import as_memory
+from .uploads import get_upload_index
+from .extraction import extract_upload_text, get_extraction_service
+
+
+SCHOOLS = ("esilv", "emlv", "iim")
+
+
+def detect_question_school(question: str):
+    """École citée dans la question (seulement si une seule est citée)."""
+    q = question.lower()
+    found = [s for s in SCHOOLS if re.search(rf"\b{s}\b", q)]
+    return found[0] if len(found) == 1 else None
+
+
+AGENT_KEYWORDS = {
+    "admissions": [
+        "admission", "candidature", "postuler", "inscription",
+        "prérequis", "conditions", "dossier",
+    ],
+    "student_life": [
+        "club", "bde", "association", "associations",
+        "campus", "événement", "event", "soirée", "international",
+    ],
+    "academics": [
+        "formation", "majeure", "msc", "bachelor",
+        "cours", "matière", "ects", "crédits",
+        "examen", "partiel", "projet",
+    ],
+}
+
+
+def keyword_matches(question: str):
+    """Agents dont au moins un mot-clé apparaît dans la question."""
+    q = question.lower()
+    return [agent for agent, words in AGENT_KEYWORDS.items() if any(w in q for w in words)]
+
+
+def keyword_route(question: str) -> str:
+    """Ancienne cascade : premier agent cité, sinon admin."""
+    matched = keyword_matches(question)
+    return matched[0] if matched else "admin"
 
 
 class AgentRouter:
-    def __init__(self):
-        self.agents = create_agents()
+    def __init__(self, resources=None, semantic: bool = SEMANTIC_ROUTING):
+        self.resources = resources or get_resources()
+        self.agents = create_agents(resources=self.resources)
+        self.semantic = semantic
 
 
+    def _traced_route(self, question: str, history=None):
+        # la trace de la requête commence au routage ; l'agent la complète
+        trace = self.resources.tracer.trace()
+        # relance ("et pour le MSc ?") : routage et retrieval sur la question autonome
+        memory = as_memory(history)
+        with trace.span("rewrite"):
+            standalone = self.resources.rewriter.rewrite(question, memory)
+        with trace.span("route"):
+            agent_key = self.route(standalone.query)
+        school = detect_question_school(question) or detect_question_school(standalone.query)
+        return self.agents[agent_key], trace, memory, standalone, school
+
     def route(self, question: str) -> str:
-        q = question.lower()
+        # chemin rapide : un seul agent cité par mots-clés
+        matched = keyword_matches(question)
+        if len(matched) == 1:
+            return matched[0]
+        if not self.semantic:
+            return keyword_route(question)
 
-        # admissions
-        if any(w in q for w in [
-        "admission", "candidature", "postuler", "inscription",
-        "prérequis", "conditions", "dossier"
-        ]):
-            return "admissions"
+        # sinon (aucun ou plusieurs agents cités) : questions types embeddées ;
+        # l'embedding est gardé par le registre et réutilisé par le retrieval
+        embedding = self.resources.embed_question(question)
+        semantic = self.resources.semantic_router
+        agent, score, margin = semantic.classify(question, embedding)
+        # route peu sûre : la cascade de mots-clés fait au moins aussi bien
+        return agent if semantic.is_confident(score, margin) else keyword_route(question)
 
-        # vie étudiante
-        if any(w in q for w in [
-        "club", "bde", "association", "associations",
-        "campus", "événement", "event", "soirée", "international"
-        ]):
-            return "student_life"
+    def handle(self, question: str, history=None, school=None, upload=None,
+               timeout: float = LLM_TIMEOUT) -> AgentResponse:
+        agent, trace, memory, standalone, detected = self._traced_route(question, history)
+        return agent.run(question, history=memory, school=school or detected, upload=upload, timeout=timeout,
+                         trace=trace, standalone=standalone)
+
+    def stream(self, question: str, history=None, school=None, upload=None,
+               timeout: float = LLM_TIMEOUT) -> AgentStream:
+        agent, trace, memory, standalone, detected = self._traced_route(question, history)
+        return agent.stream(question, history=memory, school=school or detected, upload=upload, timeout=timeout,
+                            trace=trace, standalone=standalone)
 
-        # académique
-        if any(w in q for w in [
-            "formation", "majeure", "msc", "bachelor",
-            "cours", "matière", "ects", "crédits",
-            "examen", "partiel", "projet"
-            ]   ):
-            return "academics"
+    async def ahandle(self, question: str, history=None, school=None, upload=None,
+                      timeout: float = LLM_TIMEOUT) -> AgentResponse:
+        stream = await self.astream(question, history=history, school=school, upload=upload, timeout=timeout)
+        async for _ in stream:
+            pass
+        return stream.to_response()
 
-        # PAS de fallback flou
-        return "admin"
+    async def astream(self, question: str, history=None, school=None, upload=None,
+                      timeout: float = LLM_TIMEOUT) -> AgentAsyncStream:
+        # le routage peut embedder la question : hors de la boucle
+        agent, trace, memory, standalone, detected = await asyncio.to_thread(self._traced_route, question, history)
+        return agent.astream(question, history=memory, school=school or detected, upload=upload, timeout=timeout,
+                             trace=trace, standalone=standalone)
 
+    def upload(self, data: bytes, name: str, extract_text=None):
+        """Index éphémère d'un document uploadé (réutilisé si déjà indexé)."""
+        extract_text = extract_text or (lambda d: extract_upload_text(d, name))
+        return get_upload_index(data, name, extract_text, self.resources.embeddings)
 
-        
+    def generation_stats(self) -> dict:
+        return {agent.name: agent.stats.summary() for agent in self.agents.values()}
 
-    def handle(self, question: str, history=None) -> AgentResponse:
-        agent_key = self.route(question)
-        agent = self.agents[agent_key]
-        return agent.run(question, history=history)
+    def status(self) -> dict:
+        """Tout ce qu'affiche la page Admin (même format via l'API HTTP)."""
+        resources = self.resources
+        return {
+            "generation": self.generation_stats(),
+            "limiter": resources.llm_limiter.stats(),
+            "memory": resources.memory_report(),
+            "caches": resources.cache_stats(),
+            "embedding_cache": resources.embedding_cache_stats(),
+            "rerank": resources.rerank_stats(),
+            "batching": resources.batching_stats(),
+            "context": resources.context_stats.summary(),
+            "extraction": get_extraction_service().stats(),
+            "tracing": resources.tracer.summary(),
+        }
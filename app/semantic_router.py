@@ -0,0 +1,129 @@
+# app/semantic_router.py
+
+import threading
+
+import numpy as np
+
+from .config import ROUTER_MIN_SIMILARITY, ROUTER_MIN_MARGIN
+
+
+
+# Routage sémantique
+#   Quelques questions types par agent, embeddées une seule fois (cache disque des embeddings) ;
+#   une question est classée par UN produit matriciel contre toutes ces questions types.
+#   Aucune ne reprend benchmarks/questions.jsonl (jeu d'évaluation du routage) : voir
+#   benchmarks/routing.py, qui signale les questions types trop proches.
+#   Une route peu sûre (score ou marge trop faible) n'est pas suivie : AgentRouter.route
+#   revient à la cascade de mots-clés.
+
+ROUTING_EXEMPLARS = {
+    "admissions": [
+        "Quelles étapes suivre pour déposer un dossier sur Parcoursup ?",
+        "Quelles notes faut-il avoir au lycée pour être pris ?",
+        "Existe-t-il une voie d'accès pour les titulaires d'un BTS ou d'un BUT ?",
+        "Quelle est la date limite d'inscription aux épreuves de sélection ?",
+        "Les candidats étrangers peuvent-ils s'inscrire ?",
+        "Y a-t-il des bourses ou des réductions sur le prix de l'année ?",
+        "Comment se déroulent les oraux de sélection ?",
+        "what are the entry requirements for international applicants",
+        "J'ai reçu une réponse négative, puis-je retenter l'an prochain ?",
+        "Quel niveau de maths est exigé pour candidater ?",
+        "Les inscriptions sont-elles encore ouvertes pour la rentrée ?",
+        "Combien de places sont ouvertes chaque année à l'admission ?",
+    ],
+    "academics": [
+        "Quelle spécialisation choisir en dernière année ?",
+        "Combien d'heures de cours y a-t-il par semaine ?",
+        "Le diplôme est-il reconnu par la CTI ?",
+        "Quels langages de programmation sont enseignés ?",
+        "Peut-on faire un double diplôme avec une autre école ?",
+        "Comment sont calculées les moyennes et la validation des crédits ?",
+        "Existe-t-il un parcours en cybersécurité ?",
+        "what modules are taught in the master's programme",
+        "Quel est le programme du semestre à l'étranger pour les ingénieurs ?",
+        "Les projets de fin d'études se font-ils en entreprise ?",
+        "Comment se passent les rattrapages si je rate une matière ?",
+    ],
+    "student_life": [
+        "Y a-t-il une salle de sport ou une équipe de foot ?",
+        "Comment créer une nouvelle association ?",
+        "Quand a lieu le gala de fin d'année ?",
+        "Y a-t-il une cafétéria ou un restaurant universitaire ?",
+        "Quelles destinations sont possibles pour un semestre à l'étranger ?",
+        "Existe-t-il des résidences étudiantes à proximité ?",
+        "Comment rencontrer d'autres élèves à la rentrée ?",
+        "is there a student union or sports teams",
+        "Quelles activités proposent les associations le week-end ?",
+        "Le campus a-t-il une bibliothèque ouverte le soir ?",
+        "Comment s'engager dans une association humanitaire ?",
+    ],
+    "admin": [
+        "Comment récupérer ma carte d'étudiant perdue ?",
+        "Quelle est la procédure pour signaler un retard ?",
+        "Où déposer une convention de stage à signer ?",
+        "Comment obtenir un duplicata de mon diplôme ?",
+        "Quelles sanctions sont prévues en cas de fraude ?",
+        "À quelle adresse envoyer un courrier à la scolarité ?",
+        "Salut, merci pour ton aide !",
+        "Bonsoir, qui es-tu ?",
+        "Comment mettre à jour mes coordonnées auprès de l'administration ?",
+        "Quel justificatif fournir après un arrêt maladie ?",
+        "Le service de scolarité est-il ouvert pendant les vacances ?",
+    ],
+}
+
+
+class SemanticRouter:
+    def __init__(self, embeddings, exemplars: dict = None):
+        self.embeddings = embeddings
+        self.exemplars = exemplars or ROUTING_EXEMPLARS
+        self.agents = list(self.exemplars)
+        self.verbose = True     # routes peu sûres affichées (coupé par les benchmarks)
+        self.low_confidence = 0
+        self._matrix = None
+        self._starts = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._matrix is not None:
+            return
+        with self._lock:
+            if self._matrix is not None:
+                return
+            texts, starts = [], []
+            for agent in self.agents:
+                starts.append(len(texts))
+                texts.extend(self.exemplars[agent])
+            matrix = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+            self._starts = np.asarray(starts)
+            self._matrix = matrix
+
+    def scores(self, embedding) -> np.ndarray:
+        """Similarité cosinus maximale par agent (ordre de self.agents)."""
+        self._load()
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) + 1e-12)
+        sims = self._matrix @ query
+        return np.maximum.reduceat(sims, self._starts)
+
+    @staticmethod
+    def is_confident(score: float, margin: float) -> bool:
+        return score >= ROUTER_MIN_SIMILARITY and margin >= ROUTER_MIN_MARGIN
+
+    def classify(self, question: str, embedding=None):
+        """(agent, score, marge) ; embedding = celui de la question s'il est déjà calculé."""
+        if embedding is None:
+            embedding = self.embeddings.embed_query(question)
+        scores = self.scores(embedding)
+        order = np.argsort(-scores)
+        best = float(scores[order[0]])
+        margin = best - float(scores[order[1]]) if len(order) > 1 else best
+        agent = self.agents[order[0]]
+
+        if not self.is_confident(best, margin):
+            self.low_confidence += 1
+            if self.verbose:
+                print(f"[router] low-confidence route {question!r} -> {agent} (score={best:.3f}, margin={margin:.3f}), "
+                      f"keywords used instead")
+        return agent, best, margin
@@ -0,0 +1,340 @@
+# app/server.py
+
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .config import API_HOST, API_PORT, API_MAX_UPLOADS, AGENT_DOC_TYPES, RETRIEVER_K, LLM_TIMEOUT
+from .limiter import RequestRejected, RequestTimeout
+from .rag import retrieve
+from .router import AgentRouter, detect_question_school
+
+
+
+# Serveur HTTP des agents RAG (sans Streamlit)
+#   Un seul processus, un thread par requête : tous partagent le même index et le même LLM.
+#
+#   GET  /health            état du service (ne charge pas l'index)
+#   GET  /api/stats         statistiques de la page Admin
+#   POST /api/route         {"question"} -> agent choisi
+#   POST /api/retrieve      {"question", "k"?, "agent"?, "school"?} -> chunks retrouvés
+#   POST /api/ask           {"question", "history"?, "school"?, "upload_id"?, "timeout"?} -> réponse
+#                           history : [{"role": "user" | "assistant", "content", ...}]
+#   POST /api/ask/stream    idem, réponse en Server-Sent Events (agent, token..., done)
+#   POST /api/upload        {"name", "text"} -> upload_id, à passer ensuite à /api/ask
+#   POST /admin/reload      recharge l'index depuis le disque sans redémarrer
+#
+#   python -m app.server --port 8000
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def error_status(exc) -> int:
+    if isinstance(exc, ApiError):
+        return exc.status
+    if isinstance(exc, RequestRejected):
+        return 503
+    if isinstance(exc, RequestTimeout):
+        return 504
+    return 500
+
+
+def document_json(doc) -> dict:
+    return {"id": doc.id, "content": doc.page_content, "metadata": doc.metadata}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "ESILVAssistant/0.1"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.api.verbose:
+            super().log_message(format, *args)
+
+    # I/O
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            raise ApiError(400, "invalid JSON body")
+        if not isinstance(payload, dict):
+            raise ApiError(400, "JSON body must be an object")
+        return payload
+
+    def _send_json(self, payload, status: int = 200):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_event(self, data: dict, event: str = None):
+        message = f"event: {event}\n" if event else ""
+        message += f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+        self.wfile.write(message.encode("utf-8"))
+        self.wfile.flush()
+
+    # routes
+
+    def do_GET(self):
+        api = self.server.api
+        try:
+            # chemin sans la query string : /health?x=1 -> /health
+            path = urlsplit(self.path).path
+            if path == "/health":
+                self._send_json(api.health())
+            elif path == "/api/stats":
+                self._send_json(api.router.status())
+            else:
+                raise ApiError(404, f"unknown path {path}")
+        except Exception as e:
+            self._send_json({"error": str(e)}, status=error_status(e))
+
+    def do_POST(self):
+        api = self.server.api
+        try:
+            path = urlsplit(self.path).path
+            payload = self._read_json()
+            if path == "/api/ask/stream":
+                self._stream_answer(api, payload)
+                return
+
+            handlers = {
+                "/api/route": api.route,
+                "/api/retrieve": api.retrieve,
+                "/api/ask": api.ask,
+                "/api/upload": api.upload,
+                "/admin/reload": lambda payload: api.resources.reload(),
+            }
+            if path not in handlers:
+                raise ApiError(404, f"unknown path {path}")
+            self._send_json(handlers[path](payload))
+        except Exception as e:
+            self._send_json({"error": str(e)}, status=error_status(e))
+
+    def _stream_answer(self, api, payload):
+        # erreurs avant le premier octet (question manquante, upload inconnu) : réponse JSON classique
+        stream = api.stream(payload)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        tokens = iter(stream)
+        try:
+            self._send_event({"agent": stream.agent_name, "query": stream.query}, event="agent")
+            for token in tokens:
+                self._send_event({"token": token})
+            self._send_event({"answer": stream.answer}, event="done")
+        except (BrokenPipeError, ConnectionResetError):
+            # client parti : fermer le flux libère le slot LLM et coupe la requête Ollama
+            pass
+        except Exception as e:
+            self._send_event({"error": str(e), "status": error_status(e)}, event="error")
+        finally:
+            tokens.close()
+
+
+class ApiServer:
+    """
+    with ApiServer(port=0) as api:
+        urllib.request.urlopen(api.url + "/health")
+    """
+
+    def __init__(self, host: str = API_HOST, port: int = API_PORT, router=None, verbose: bool = False):
+        self.router = router or AgentRouter()
+        self.resources = self.router.resources
+        self.verbose = verbose
+
+        # documents uploadés : gardés en mémoire (LRU) tant que les clients s'en servent
+        self._uploads = OrderedDict()
+        self._uploads_lock = threading.Lock()
+
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.api = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # endpoints
+
+    def health(self) -> dict:
+        resources = self.resources
+        limiter = resources.llm_limiter
+        return {
+            "status": "ok",
+            "index_loaded": resources.is_loaded,
+            "index_version": resources.index_version,
+            "loaded_at": resources.loaded_at,
+            "llm_active": limiter.active,
+            "llm_queued": limiter.queued,
+        }
+
+    def route(self, payload: dict) -> dict:
+        question = self._question(payload)
+        return {
+            "agent": self.router.route(question),
+            "school": payload.get("school") or detect_question_school(question),
+        }
+
+    def retrieve(self, payload: dict) -> dict:
+        question = self._question(payload)
+        agent = payload.get("agent")
+        school = payload.get("school") or detect_question_school(question)
+        t0 = time.perf_counter()
+        docs, _ = retrieve(
+            question,
+            self.resources,
+            k=self._number(payload, "k", RETRIEVER_K, int),
+            doc_type=AGENT_DOC_TYPES.get(agent),
+            school=school,
+        )
+        return {
+            "documents": [document_json(d) for d in docs],
+            "seconds": round(time.perf_counter() - t0, 4),
+        }
+
+    def ask(self, payload: dict) -> dict:
+        t0 = time.perf_counter()
+        stream = self.stream(payload)
+        for _ in stream:
+            pass
+        return {
+            "agent": stream.agent_name,
+            "answer": stream.answer,
+            "seconds": round(time.perf_counter() - t0, 3),
+        }
+
+    def stream(self, payload: dict):
+        return self.router.stream(
+            self._question(payload),
+            history=self._history(payload),
+            school=payload.get("school"),
+            upload=self._get_upload(payload.get("upload_id")),
+            timeout=self._number(payload, "timeout", LLM_TIMEOUT, float),
+        )
+
+    def upload(self, payload: dict) -> dict:
+        text = payload.get("text") or ""
+        name = payload.get("name") or "document"
+        index = self.router.upload(text.encode("utf-8"), name, lambda data: text)
+        with self._uploads_lock:
+            self._uploads[index.file_id] = index
+            self._uploads.move_to_end(index.file_id)
+            while len(self._uploads) > API_MAX_UPLOADS:
+                self._uploads.popitem(last=False)
+        return {"upload_id": index.file_id, "name": name, "chunks": index.n_chunks}
+
+    # helpers
+
+    @staticmethod
+    def _question(payload: dict) -> str:
+        question = payload.get("question") or ""
+        if not isinstance(question, str):
+            raise ApiError(400, "'question' must be a string")
+        question = question.strip()
+        if not question:
+            raise ApiError(400, "missing 'question'")
+        return question
+
+    @staticmethod
+    def _number(payload: dict, key: str, default, cast):
+        value = payload.get(key)
+        if value is None or value == "":
+            return default
+        try:
+            value = cast(value)
+        except (TypeError, ValueError, OverflowError):
+            raise ApiError(400, f"'{key}' must be a number")
+        if not math.isfinite(value):
+            raise ApiError(400, f"'{key}' must be a finite number")
+        if value <= 0:
+            raise ApiError(400, f"'{key}' must be positive")
+        return value
+
+    @staticmethod
+    def _history(payload: dict):
+        history = payload.get("history")
+        if history is None:
+            return None
+        if not isinstance(history, list):
+            raise ApiError(400, "'history' must be a list of messages")
+        for msg in history:
+            if not isinstance(msg, dict) or msg.get("role") not in ("user", "assistant"):
+                raise ApiError(400, "each 'history' message must be an object with role 'user' or 'assistant'")
+            for key in ("content", "query", "agent", "uploaded_doc"):
+                if msg.get(key) is not None and not isinstance(msg[key], str):
+                    raise ApiError(400, f"history '{key}' must be a string")
+        return history
+
+    def _get_upload(self, upload_id):
+        if not upload_id:
+            return None
+        with self._uploads_lock:
+            index = self._uploads.get(upload_id)
+            if index is not None:
+                self._uploads.move_to_end(upload_id)
+        if index is None:
+            raise ApiError(404, "unknown upload_id (expired): upload the document again")
+        return index
+
+    # cycle de vie
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serveur HTTP des agents RAG")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--preload", action="store_true", help="charger l'index avant d'accepter des requêtes")
+    parser.add_argument("--verbose", action="store_true", help="logger chaque requête")
+    args = parser.parse_args(argv)
+
+    server = ApiServer(args.host, args.port, verbose=args.verbose)
+    if args.preload:
+        server.resources.vectorstore
+    print(f"API listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
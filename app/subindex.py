@@ -0,0 +1,183 @@
+# app/subindex.py
+
+import os
+import threading
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+from .config import SUBINDEX_MAX_MB
+from .chunkstore import documents_at
+
+
+
+# Sous-index FAISS par métadonnées (type / école)
+#   Les chunks web portent "type" (detect_type) et "school" (detect_school) ;
+#   les PDF / TXT n'ont pas ces tags et restent visibles dans tous les sous-index.
+# Les vecteurs sont relus dans l'index exact (index.faiss mappé), jamais reconstruits depuis
+# un index PQ (approché). Les sous-index gardés tiennent dans SUBINDEX_MAX_MB (LRU) ; un filtre
+# trop large pour le budget est cherché dans l'index servi avec un sélecteur de positions.
+
+def matches_filter(metadata: dict, doc_type=None, school=None) -> bool:
+    if doc_type and metadata.get("type") not in (doc_type, None):
+        return False
+    if school and metadata.get("school") not in (school, None):
+        return False
+    return True
+
+
+def _ensure_direct_map(index, lock=None):
+    # index IVF : il faut la table position -> liste inversée ; elle modifie l'index servi
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None or ivf.direct_map.type != faiss.DirectMap.NoMap:
+        return
+    with lock or threading.Lock():
+        if ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.make_direct_map()
+
+
+def selector_params(index, positions):
+    """Paramètres de recherche limitée à des positions, en gardant nprobe / efSearch de l'index."""
+    sel = faiss.IDSelectorBatch(positions)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=sel, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=sel)
+
+
+def reconstruct_vectors(index, lock=None) -> np.ndarray:
+    """Relit tous les vecteurs de l'index (float32, dans l'ordre des positions)."""
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    try:
+        return index.reconstruct_n(0, index.ntotal)
+    except RuntimeError:
+        _ensure_direct_map(index, lock)
+        return index.reconstruct_n(0, index.ntotal)
+
+
+class SubIndexes:
+    """
+    Construit à la demande un petit index exact par filtre (type, école),
+    mis en cache (LRU, max_mb au total) pour la durée de vie du vectorstore.
+    path : dossier de la version (index.faiss exact) ; lock : verrou des ressources partagées,
+    pris pour modifier l'index servi.
+    """
+
+    def __init__(self, vectorstore, path: str = None, lock=None, max_mb: float = SUBINDEX_MAX_MB):
+        self._vs = vectorstore
+        self._path = path
+        self._index_lock = lock
+        self._lock = threading.Lock()
+        self._subs = OrderedDict()
+        self._columns = None
+        self._exact = None
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.evicted = 0
+        self.selector_searches = 0
+
+    def _load_columns(self):
+        vs = self._vs
+        store = getattr(vs.docstore, "store", None)
+        if store is not None:
+            # ChunkStore : colonnes lues directement, sans matérialiser les Documents
+            return np.array(store.column("type"), dtype=object), np.array(store.column("school"), dtype=object)
+        types, schools = [], []
+        for pos in range(vs.index.ntotal):
+            doc = vs.docstore.search(vs.index_to_docstore_id[pos])
+            meta = getattr(doc, "metadata", {}) or {}
+            types.append(meta.get("type"))
+            schools.append(meta.get("school"))
+        return np.array(types, dtype=object), np.array(schools, dtype=object)
+
+    def _exact_index(self):
+        """Index exact aligné sur les positions servies : l'index servi s'il est plat, sinon index.faiss mappé."""
+        index = self._vs.index
+        if isinstance(index, faiss.IndexFlat):
+            return index
+        if self._exact is None and self._path:
+            index_file = os.path.join(self._path, "index.faiss")
+            if os.path.exists(index_file):
+                exact = faiss.read_index(index_file, faiss.IO_FLAG_MMAP)
+                if exact.ntotal == index.ntotal:
+                    self._exact = exact
+        if self._exact is not None:
+            return self._exact
+        # pas d'index exact sur disque (vectorstore injecté) : reconstruction depuis l'index servi
+        _ensure_direct_map(index, self._index_lock)
+        return index
+
+    def _positions(self, doc_type, school):
+        if self._columns is None:
+            self._columns = self._load_columns()
+        types, schools = self._columns
+
+        mask = np.ones(len(types), dtype=bool)
+        if doc_type:
+            mask &= (types == doc_type) | (types == None)  # noqa: E711
+        if school:
+            mask &= (schools == school) | (schools == None)  # noqa: E711
+        return np.flatnonzero(mask).astype(np.int64)
+
+    def _build(self, positions):
+        index = self._vs.index
+        if len(positions) * index.d * 4 + positions.nbytes > self.max_bytes:
+            # au-delà du budget : pas de copie, sélecteur sur l'index servi
+            return None
+        sub = faiss.IndexFlat(index.d, index.metric_type)
+        sub.add(self._exact_index().reconstruct_batch(positions))
+        return sub
+
+    @staticmethod
+    def _entry_bytes(entry) -> int:
+        sub, positions = entry
+        return positions.nbytes + (sub.ntotal * sub.d * 4 if sub is not None else 0)
+
+    def get(self, doc_type=None, school=None):
+        """(sous-index ou None, positions), ou None si aucun chunk ne correspond."""
+        key = (doc_type, school)
+        with self._lock:
+            if key in self._subs:
+                self._subs.move_to_end(key)
+                return self._subs[key]
+            positions = self._positions(doc_type, school)
+            entry = (self._build(positions), positions) if len(positions) else None
+            self._subs[key] = entry
+            total = self.memory_bytes()
+            while total > self.max_bytes and len(self._subs) > 1:
+                _, old = self._subs.popitem(last=False)
+                if old is not None:
+                    total -= self._entry_bytes(old)
+                    self.evicted += 1
+        return entry
+
+    def search(self, embedding, k: int, doc_type=None, school=None):
+        """Renvoie les k meilleurs Documents du sous-index (None si aucun chunk ne correspond)."""
+        found = self.search_many([embedding], k, doc_type=doc_type, school=school)
+        return None if found is None else found[0]
+
+    def search_many(self, embeddings, k: int, doc_type=None, school=None):
+        """Une recherche FAISS pour plusieurs questions : une liste de Documents par question."""
+        entry = self.get(doc_type, school)
+        if entry is None:
+            return None
+        sub, positions = entry
+
+        queries = np.asarray(embeddings, dtype=np.float32)
+        if self._vs._normalize_L2:
+            faiss.normalize_L2(queries)
+        k = min(k, len(positions))
+        if sub is not None:
+            _, found = sub.search(queries, k)
+            found = np.where(found >= 0, positions[np.maximum(found, 0)], -1)
+        else:
+            self.selector_searches += 1
+            _, found = self._vs.index.search(queries, k, params=selector_params(self._vs.index, positions))
+
+        return [documents_at(self._vs, row) for row in found]
+
+    def memory_bytes(self) -> int:
+        return sum(self._entry_bytes(entry) for entry in list(self._subs.values()) if entry is not None)
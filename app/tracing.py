@@ -0,0 +1,204 @@
+# app/tracing.py
+
+import os
+import time
+import cProfile
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+import numpy as np
+
+from .config import TRACE_WINDOW, TRACE_SLOW_MS, TRACE_PROFILE, TRACE_PROFILE_DIR, TRACE_MAX_PROFILES
+
+
+
+# Traces des requêtes : durée de chaque étape, par agent
+#   rewrite     relance de conversation -> question autonome (voir app/memory.py)
+#   route       routage (mots-clés ou questions types embeddées)
+#   embed       embedding de la question (cache compris)
+#   search      FAISS (+ BM25 et fusion si recherche hybride)
+#   rerank      cross-encoder
+#   format      contexte : fusion, dédoublonnage, budget (pack_context)
+#   cache       lecture du cache des réponses
+#   prompt      assemblage du prompt
+#   queue       attente d'un slot LLM
+#   ttft        requête LLM -> premier token
+#   generation  requête LLM -> dernier token
+#   total       question -> dernier token rendu à l'appelant
+# Chaque requête porte sa Trace dans les inputs de la chaîne ; à la fin, les durées vont dans
+# des fenêtres glissantes en mémoire (p50 / p95 / p99 pour la page Admin) et, si un sink est
+# branché, dans le store SQLite (table spans, voir app/analytics.py).
+# TRACE_PROFILE : chaque requête synchrone tourne sous cProfile ; les requêtes plus lentes que
+# TRACE_SLOW_MS laissent un .prof dans TRACE_PROFILE_DIR (snakeviz / flameprof pour le flame graph).
+
+STAGES = (
+    "rewrite", "route", "embed", "search", "rerank", "format",
+    "cache", "prompt", "queue", "ttft", "generation", "total",
+)
+
+
+class _NullTrace:
+    """Trace qui n'enregistre rien (appels directs de retrieve, benchmarks)."""
+
+    agent = None
+
+    def span(self, stage: str):
+        return nullcontext()
+
+    def add(self, stage: str, seconds: float):
+        pass
+
+
+NO_TRACE = _NullTrace()
+
+
+class Trace:
+    """Durées des étapes d'une requête (secondes), enregistrées par le Tracer à la fin."""
+
+    def __init__(self, tracer, agent: str = None):
+        self.tracer = tracer
+        self.agent = agent
+        self.spans = []
+        self.started = time.perf_counter()
+        self._profiler = None
+        self._finished = False
+
+    @contextmanager
+    def span(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((stage, time.perf_counter() - t0))
+
+    def add(self, stage: str, seconds: float):
+        self.spans.append((stage, seconds))
+
+    def start_profile(self):
+        # un profiler par thread : seul le chemin synchrone (un thread par requête) est profilé
+        if self.tracer.profile and self._profiler is None:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        if self._profiler is not None:
+            self._profiler.disable()
+        self.add("total", time.perf_counter() - self.started)
+        self.tracer.record(self)
+
+
+class _Window:
+    """Dernières durées d'une étape (secondes)."""
+
+    __slots__ = ("values", "count")
+
+    def __init__(self, size: int):
+        self.values = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, seconds: float):
+        self.values.append(seconds)
+        self.count += 1
+
+    def summary(self) -> dict:
+        values = np.asarray(self.values, dtype=np.float64) * 1000
+        p50, p95, p99 = np.percentile(values, [50, 95, 99]) if len(values) else (0.0, 0.0, 0.0)
+        return {"count": self.count, "p50_ms": round(float(p50), 1),
+                "p95_ms": round(float(p95), 1), "p99_ms": round(float(p99), 1)}
+
+
+class Tracer:
+    def __init__(
+        self,
+        window: int = TRACE_WINDOW,
+        slow_ms: float = TRACE_SLOW_MS,
+        profile: bool = TRACE_PROFILE,
+        profile_dir: str = TRACE_PROFILE_DIR,
+        max_profiles: int = TRACE_MAX_PROFILES,
+        sink=None,
+    ):
+        self.window = window
+        self.slow_ms = slow_ms
+        self.profile = profile
+        self.profile_dir = Path(profile_dir)
+        self.max_profiles = max_profiles
+        self.sink = sink        # sink(agent, [(étape, secondes)]) : persistance optionnelle
+        self._lock = threading.Lock()
+        self._windows = {}      # (étape, agent) -> _Window ; agent None = tous agents confondus
+        self.requests = 0
+        self.slow = deque(maxlen=20)
+        self.profiles = 0
+
+    def trace(self, agent: str = None) -> Trace:
+        return Trace(self, agent)
+
+    def _window(self, stage: str, agent):
+        window = self._windows.get((stage, agent))
+        if window is None:
+            window = self._windows[(stage, agent)] = _Window(self.window)
+        return window
+
+    def record(self, trace: Trace):
+        # une étape appelée plusieurs fois dans la requête (ex. embed) compte pour sa somme
+        totals = {}
+        for stage, seconds in trace.spans:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        with self._lock:
+            self.requests += 1
+            for stage, seconds in totals.items():
+                self._window(stage, None).add(seconds)
+                if trace.agent:
+                    self._window(stage, trace.agent).add(seconds)
+
+        total_ms = totals["total"] * 1000
+        if total_ms >= self.slow_ms:
+            profile = self._dump_profile(trace, total_ms) if trace._profiler is not None else None
+            with self._lock:
+                self.slow.append({
+                    "agent": trace.agent,
+                    "total_ms": round(total_ms, 1),
+                    "stages_ms": {s: round(v * 1000, 1) for s, v in totals.items()},
+                    "profile": profile,
+                })
+        if self.sink is not None:
+            try:
+                self.sink(trace.agent, list(totals.items()))
+            except Exception as e:
+                print(f"[tracing] sink failed: {e}")
+
+    def _dump_profile(self, trace: Trace, total_ms: float) -> str:
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        path = self.profile_dir / f"{int(time.time() * 1000)}-{trace.agent or 'unknown'}-{int(total_ms)}ms.prof"
+        trace._profiler.dump_stats(str(path))
+        # on ne garde que les max_profiles derniers
+        dumps = sorted(self.profile_dir.glob("*.prof"), key=os.path.getmtime)
+        for old in dumps[:-self.max_profiles]:
+            old.unlink(missing_ok=True)
+        with self._lock:
+            self.profiles += 1
+        return str(path)
+
+    def summary(self) -> dict:
+        with self._lock:
+            windows = {key: w.summary() for key, w in self._windows.items()}
+            slow = list(self.slow)
+        order = {stage: i for i, stage in enumerate(STAGES)}
+
+        def stages(agent):
+            found = sorted((s for s, a in windows if a == agent), key=lambda s: order.get(s, len(STAGES)))
+            return {s: windows[(s, agent)] for s in found}
+
+        agents = sorted({a for _, a in windows if a is not None})
+        return {
+            "requests": self.requests,
+            "stages": stages(None),
+            "agents": {agent: stages(agent) for agent in agents},
+            "slow_ms": self.slow_ms,
+            "slow": slow,
+            "profiles": self.profiles,
+        }
@@ -0,0 +1,83 @@
+# app/uploads.py
+
+import hashlib
+import threading
+import weakref
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from .config import CHUNK_SIZE, CHUNK_OVERLAP, UPLOAD_K
+
+
+
+# Index éphémère pour les documents uploadés
+#   - un index en mémoire par fichier (clé = hash du contenu), découpé comme le corpus
+#   - embeddings via le cache disque : ré-uploader le même fichier ne coûte rien
+#   - partagé entre sessions tant qu'une session le référence, libéré ensuite (weakref)
+
+def file_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class UploadIndex:
+    def __init__(self, file_id: str, name: str, chunks, vectors):
+        self.file_id = file_id
+        self.name = name
+        self.chunks = chunks
+        self.vectors = np.asarray(vectors, dtype=np.float32).reshape(len(chunks), -1)
+
+    @classmethod
+    def build(cls, file_id: str, name: str, text: str, embeddings):
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            separators=["\n\n", "\n", ". ", " "],
+        )
+        chunks = [c for c in splitter.split_text(text or "") if c.strip()]
+        vectors = embeddings.embed_documents(chunks) if chunks else []
+        return cls(file_id, name, chunks, vectors)
+
+    def search(self, embedding, k: int = UPLOAD_K):
+        """Top-k chunks (distance L2, comme l'index FAISS), du plus proche au moins proche."""
+        if not self.chunks:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        dists = ((self.vectors - query) ** 2).sum(axis=1)
+        k = min(k, len(self.chunks))
+        top = np.argpartition(dists, k - 1)[:k]
+        top = top[np.argsort(dists[top])]
+        return [
+            Document(page_content=self.chunks[i], metadata={"source": "upload", "file": self.name})
+            for i in top
+        ]
+
+    @property
+    def n_chunks(self) -> int:
+        return len(self.chunks)
+
+    def memory_bytes(self) -> int:
+        return self.vectors.nbytes + sum(len(c) for c in self.chunks)
+
+
+_live = weakref.WeakValueDictionary()
+_live_lock = threading.Lock()
+
+
+def get_upload_index(data: bytes, name: str, extract_text, embeddings) -> UploadIndex:
+    """extract_text(data) -> str n'est appelé que si ce fichier n'est pas déjà indexé."""
+    file_id = file_hash(data)
+    with _live_lock:
+        index = _live.get(file_id)
+    if index is not None:
+        return index
+
+    index = UploadIndex.build(file_id, name, extract_text(data), embeddings)
+    with _live_lock:
+        _live[file_id] = index
+    return index
+
+
+def live_uploads() -> int:
+    return len(_live)
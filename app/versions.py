@@ -0,0 +1,173 @@
+# app/versions.py
+
+import os
+import time
+import shutil
+import threading
+from pathlib import Path
+
+from .config import VECTORSTORE_PATH, INDEX_KEEP_VERSIONS, INDEX_WATCH_INTERVAL
+
+
+
+# Versions de l'index
+#   VECTORSTORE_PATH/
+#     CURRENT              nom de la version servie (écrit de façon atomique)
+#     versions/<version>/  un index complet (FAISS, manifest, ANN, lexical)
+#   Une ingestion écrit une nouvelle version à côté de celle servie, puis bascule CURRENT.
+#   Sans CURRENT (ancienne disposition), les fichiers à la racine sont servis tels quels.
+
+CURRENT_NAME = "CURRENT"
+VERSIONS_DIR = "versions"
+BUILDING_MARKER = ".building"
+
+
+def versions_root(root=VECTORSTORE_PATH) -> Path:
+    return Path(root) / VERSIONS_DIR
+
+
+def current_version(root=VECTORSTORE_PATH):
+    """Nom de la version servie, None si l'index n'est pas versionné."""
+    try:
+        name = (Path(root) / CURRENT_NAME).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    return name or None
+
+
+def resolve_index_path(root=VECTORSTORE_PATH) -> str:
+    """Dossier à charger : la version courante, ou la racine (ancienne disposition)."""
+    version = current_version(root)
+    if version is None:
+        return str(root)
+    return str(versions_root(root) / version)
+
+
+def _copy_index(src: Path, dst: Path):
+    # copie et non lien dur : FAISS réécrit index.faiss en place
+    for item in src.iterdir():
+        if item.name in (CURRENT_NAME, VERSIONS_DIR) or item.name.endswith(".tmp"):
+            continue
+        if item.is_dir():
+            shutil.copytree(item, dst / item.name)
+        else:
+            shutil.copy2(item, dst / item.name)
+
+
+def interrupted_build(root=VECTORSTORE_PATH):
+    """Dernière construction interrompue (marqueur .building), None s'il n'y en a pas."""
+    building = [p for p in _list_versions(root) if (p / BUILDING_MARKER).exists()]
+    return building[-1] if building else None
+
+
+def begin_version(root=VECTORSTORE_PATH, full: bool = False) -> str:
+    """
+    Dossier où écrire la prochaine version.
+    - reprend une construction interrompue (marqueur .building) si elle existe
+    - sinon copie la version servie (ingestion incrémentale) ou part de zéro (full)
+    """
+    resumed = interrupted_build(root)
+    if resumed is not None and not full:
+        print(f"Resuming index build in {resumed}")
+        return str(resumed)
+    for path in _list_versions(root):
+        if (path / BUILDING_MARKER).exists():
+            shutil.rmtree(path, ignore_errors=True)
+
+    path = versions_root(root) / _next_version(root)
+    path.mkdir(parents=True)
+    (path / BUILDING_MARKER).touch()
+
+    source = Path(resolve_index_path(root))
+    if not full and (source / "index.faiss").exists():
+        _copy_index(source, path)
+    return str(path)
+
+
+def publish_version(path, root=VECTORSTORE_PATH):
+    """Bascule CURRENT sur la version construite (remplacement atomique du fichier)."""
+    path = Path(path)
+    (path / BUILDING_MARKER).unlink(missing_ok=True)
+    tmp = Path(root) / (CURRENT_NAME + ".tmp")
+    tmp.write_text(path.name, encoding="utf-8")
+    os.replace(tmp, Path(root) / CURRENT_NAME)
+    return path.name
+
+
+def _next_version(root) -> str:
+    # numéro croissant en tête : l'ordre alphabétique est l'ordre de création
+    numbers = [int(p.name[1:7]) for p in _list_versions(root) if p.name[1:7].isdigit()]
+    current = current_version(root) or ""
+    if current[1:7].isdigit():
+        numbers.append(int(current[1:7]))
+    return f"v{max(numbers, default=0) + 1:06d}-{time.strftime('%Y%m%d-%H%M%S')}"
+
+
+def discard_version(path):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _list_versions(root):
+    base = versions_root(root)
+    if not base.exists():
+        return []
+    return sorted(p for p in base.iterdir() if p.is_dir())
+
+
+def gc_versions(root=VECTORSTORE_PATH, keep: int = INDEX_KEEP_VERSIONS, in_use=()) -> list:
+    """
+    Supprime les anciennes versions : jamais la courante, ni une version en construction,
+    ni une version encore utilisée par ce processus ; garde les `keep` plus récentes
+    (le temps que les autres processus basculent à leur tour).
+    """
+    current = current_version(root)
+    finished = [p for p in _list_versions(root) if not (p / BUILDING_MARKER).exists()]
+    protected = {current, *in_use} | {p.name for p in finished[max(0, len(finished) - keep):]}
+
+    removed = []
+    for path in finished:
+        if path.name in protected:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(path.name)
+    return removed
+
+
+class IndexWatcher:
+    """
+    Thread qui surveille CURRENT et recharge l'index en arrière-plan quand il change
+    (resources.reload() charge la nouvelle version à côté puis bascule).
+    """
+
+    def __init__(self, resources, interval: float = INDEX_WATCH_INTERVAL):
+        self.resources = resources
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self) -> bool:
+        """True si une nouvelle version a été chargée."""
+        version = current_version(self.resources.path)
+        if version is None or version == self.resources.index_version:
+            return False
+        try:
+            self.resources.reload()
+        except Exception as e:
+            # version illisible : on garde l'ancienne et on réessaiera
+            print(f"[index] reload of {version} failed: {e}")
+            return False
+        print(f"[index] now serving version {self.resources.index_version}")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="index-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,106 @@
+# benchmarks/analytics.py
+#
+# Page Admin et journalisation : anciens CSV (ré-analysés à chaque affichage) vs store SQLite
+# (agrégats tenus à jour à l'écriture), pour un historique de N questions.
+#   python -m benchmarks.analytics --events 200000
+
+import argparse
+import csv
+import json
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from app.analytics import AnalyticsStore
+
+AGENTS = ["AcademicsAgent", "AdmissionsAgent", "StudentLifeAgent", "AdminAgent"]
+
+
+def csv_append(path: Path, header, row):
+    # ancienne écriture : ouverture + écriture synchrones à chaque événement
+    exists = path.exists()
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if not exists:
+            writer.writerow(header)
+        writer.writerow(row)
+
+
+def csv_admin(usage_path: Path, votes_path: Path):
+    # ancienne page Admin : relit et ré-analyse tout l'historique
+    with open(usage_path, encoding="utf-8") as f:
+        per_agent = Counter(r["agent"] for r in csv.DictReader(f))
+    votes = defaultdict(lambda: {"up": 0, "down": 0})
+    with open(votes_path, encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            votes[r["agent"]][r["vote"]] += 1
+    return per_agent, votes
+
+
+def timed_ms(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return round(best * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=200000, help="questions dans l'historique")
+    parser.add_argument("--writes", type=int, default=2000, help="événements pour mesurer l'écriture")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        usage_path, votes_path = tmp / "usage.csv", tmp / "votes.csv"
+
+        # historique : écrit en bloc (hors mesure)
+        with open(usage_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["agent", "question"])
+            writer.writerows([AGENTS[i % 4], f"question {i}"] for i in range(args.events))
+        with open(votes_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["msg_id", "agent", "vote"])
+            writer.writerows([i, AGENTS[i % 4], "up" if i % 3 else "down"] for i in range(args.events // 4))
+
+        store = AnalyticsStore(tmp / "analytics.db")
+        for i in range(args.events):
+            store.record_usage(AGENTS[i % 4], f"question {i}")
+        for i in range(args.events // 4):
+            store.record_vote(i, AGENTS[i % 4], "up" if i % 3 else "down")
+        store.flush(timeout=600)
+
+        t0 = time.perf_counter()
+        for i in range(args.writes):
+            csv_append(usage_path, ["agent", "question"], [AGENTS[i % 4], f"new {i}"])
+        csv_write_us = (time.perf_counter() - t0) / args.writes * 1e6
+
+        t0 = time.perf_counter()
+        for i in range(args.writes):
+            store.record_usage(AGENTS[i % 4], f"new {i}")
+        enqueue_us = (time.perf_counter() - t0) / args.writes * 1e6
+        store.flush()
+
+        report = {
+            "events": args.events,
+            "admin_page_ms": {
+                "csv": timed_ms(lambda: csv_admin(usage_path, votes_path)),
+                "sqlite_aggregates": timed_ms(store.summary),
+            },
+            "write_per_event_us": {
+                "csv_append": round(csv_write_us, 1),
+                "sqlite_enqueue": round(enqueue_us, 1),
+            },
+            "writer": store.stats(),
+        }
+        store.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
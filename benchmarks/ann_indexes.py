@@ -0,0 +1,86 @@
+# benchmarks/ann_indexes.py
+#
+# Rappel@k / latence / mémoire des index ANN par rapport à l'index exact (flat).
+#   python -m benchmarks.ann_indexes --synthetic --chunks 50000
+#   python -m benchmarks.ann_indexes            (index réel + Ollama)
+
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from app.ann import INDEX_TYPES, build_ann_index, index_memory_bytes
+from app.config import INDEX_PARAMS, RETRIEVER_K
+from app.fake_ollama import FakeOllamaServer
+from app.subindex import reconstruct_vectors
+
+from .common import load_questions, latency_summary, synthetic_resources, real_resources
+
+
+def held_out_queries(resources, vectors, n_extra: int = 200, seed: int = 0):
+    """Questions étiquetées + chunks bruités (absents de l'index tels quels)."""
+    questions = [q["question"] for q in load_questions()]
+    queries = [resources.embeddings.embed_query(q) for q in questions]
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), size=min(n_extra, len(vectors)), replace=False)
+    noisy = vectors[rows] + rng.normal(0, 0.05, size=(len(rows), vectors.shape[1]))
+    return np.vstack([np.asarray(queries, dtype=np.float32), noisy.astype(np.float32)])
+
+
+def recall_at_k(found, truth) -> float:
+    hits = [len(set(f) & set(t)) / len(t) for f, t in zip(found.tolist(), truth.tolist())]
+    return float(np.mean(hits))
+
+
+def run(resources, k: int = RETRIEVER_K, types=INDEX_TYPES, params: dict = None) -> dict:
+    base = resources.vectorstore._vs.index
+    vectors = reconstruct_vectors(base)
+    queries = held_out_queries(resources, vectors)
+    params = {**INDEX_PARAMS, **(params or {})}
+
+    report = {"vectors": int(len(vectors)), "dim": int(vectors.shape[1]), "queries": len(queries), "k": k}
+    truth = None
+    for index_type in types:
+        t0 = time.perf_counter()
+        index, effective = build_ann_index(vectors, index_type, params, base.metric_type)
+        build_s = time.perf_counter() - t0
+
+        latencies = []
+        found = np.zeros((len(queries), k), dtype=np.int64)
+        for i, q in enumerate(queries):
+            t0 = time.perf_counter()
+            _, ids = index.search(q[None, :], k)
+            latencies.append(time.perf_counter() - t0)
+            found[i] = ids[0]
+
+        if index_type == "flat":
+            truth = found
+        report[index_type] = {
+            "effective_type": effective,
+            "build_s": round(build_s, 3),
+            "memory_mb": round(index_memory_bytes(index) / 1e6, 2),
+            f"recall_at_{k}": round(recall_at_k(found, truth), 4) if truth is not None else None,
+            **latency_summary(latencies),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--synthetic", action="store_true", help="corpus synthétique + faux Ollama")
+    parser.add_argument("--chunks", type=int, default=50000)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        with FakeOllamaServer() as fake, tempfile.TemporaryDirectory() as tmp:
+            report = run(synthetic_resources(tmp, fake, n_chunks=args.chunks))
+    else:
+        report = run(real_resources())
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/batching.py
+#
+# Micro-batching des questions (app/batching.py) : retrieve() à froid (embedding + FAISS) par N
+# utilisateurs simultanés, avec et sans regroupement ; débit, latence et appels d'embedding.
+# Le faux serveur traite embed_parallel appels d'embedding à la fois, comme Ollama.
+#   python -m benchmarks.batching --users 1 4 16 64
+
+import argparse
+import json
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.fake_ollama import FakeOllamaServer
+from app.rag import retrieve
+from app.resources import SharedResources
+
+from .common import load_questions, latency_summary, fake_embeddings, build_synthetic_vectorstore
+from .load_test import user_questions
+
+
+def run_level(resources, fake, questions, users: int, requests: int, k: int) -> dict:
+    resources.invalidate_caches()
+    resources.question_cache.clear()
+    calls = fake.calls.get("embed", (0, 0))[0]
+    latencies = []
+
+    def user(u):
+        for question in user_questions(questions, u, requests):
+            t0 = time.perf_counter()
+            retrieve(question, resources, k=k, rerank=False)
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user, range(users)))
+    wall = time.perf_counter() - t0
+    return {
+        "throughput_qps": round(len(latencies) / wall, 1),
+        **latency_summary(latencies),
+        "embed_calls": fake.calls.get("embed", (0, 0))[0] - calls,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=8, help="questions par utilisateur")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="secondes par appel d'embedding")
+    parser.add_argument("--embed-latency-per-item", type=float, default=0.001)
+    parser.add_argument("--embed-parallel", type=int, default=1)
+    args = parser.parse_args()
+
+    questions = load_questions()
+    with FakeOllamaServer(
+        embed_latency=args.embed_latency,
+        embed_latency_per_item=args.embed_latency_per_item,
+        embed_parallel=args.embed_parallel,
+    ) as fake, tempfile.TemporaryDirectory() as tmp:
+        build_synthetic_vectorstore(tmp, fake_embeddings(fake), n_chunks=args.chunks)
+        modes = {
+            "unbatched": SharedResources(path=tmp, embeddings=fake_embeddings(fake), batching=False),
+            "batched": SharedResources(path=tmp, embeddings=fake_embeddings(fake), batching=True),
+        }
+        report = {"chunks": args.chunks, "levels": {}}
+        for users in args.users:
+            level = {}
+            for name, resources in modes.items():
+                resources.vectorstore  # chargement hors mesure
+                level[name] = run_level(resources, fake, questions, users, args.requests, args.k)
+            level["speedup"] = round(level["batched"]["throughput_qps"] / level["unbatched"]["throughput_qps"], 2)
+            report["levels"][f"users_{users}"] = level
+        report["batching"] = modes["batched"].batching_stats()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
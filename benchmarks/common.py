@@ -0,0 +1,143 @@
+# benchmarks/common.py
+
+import json
+import random
+import time
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+from langchain_ollama import OllamaEmbeddings
+
+from app.lexical import build_lexical_index
+from app.chunkstore import save_vectorstore
+from app.resources import SharedResources, get_resources
+
+
+
+# Outils communs aux benchmarks
+#   - jeu de questions étiquetées (agent attendu + mots-clés attendus dans les chunks)
+#   - corpus synthétique + faux serveur Ollama pour tourner sans modèle
+
+QUESTIONS_PATH = Path(__file__).with_name("questions.jsonl")
+
+SCHOOLS = ["esilv", "emlv", "iim"]
+
+VOCABULARY = {
+    "admissions": (
+        "admission concours avenir candidature parcoursup dossier prérequis calendrier "
+        "frais de scolarité entretien motivation admission parallèle licence bac"
+    ),
+    "academics": (
+        "majeure cours ECTS semestre projet MSc bachelor programme ingénieur data "
+        "intelligence artificielle finance fintech alternance partiel examen création numérique"
+    ),
+    "student_life": (
+        "association BDE club sport campus soirée événement logement international "
+        "échange étudiant intégration ambiance vie étudiante"
+    ),
+    None: (
+        "certificat de scolarité absence justificatif règlement intérieur attestation "
+        "stage dossier administratif horaires service relevé de notes"
+    ),
+}
+
+BOILERPLATE = (
+    "Le Pôle Léonard de Vinci réunit trois écoles sur le campus de Paris La Défense. "
+    "Découvrez nos formations et rencontrez nos équipes lors des journées portes ouvertes."
+)
+
+
+def fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def load_questions(path=QUESTIONS_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def is_hit(doc, expected) -> bool:
+    content = fold(doc.page_content)
+    return any(fold(word) in content for word in expected)
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    return float(np.percentile(np.asarray(values, dtype=np.float64), p))
+
+
+def latency_summary(seconds) -> dict:
+    ms = [s * 1000 for s in seconds]
+    return {
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "mean_ms": round(float(np.mean(ms)) if ms else 0.0, 3),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+
+def synthetic_documents(n_chunks: int = 3000, seed: int = 0, boilerplate_ratio: float = 0.3):
+    """Chunks (~400 caractères) répartis par type et par école, avec du boilerplate répété."""
+    rng = random.Random(seed)
+    types = list(VOCABULARY)
+    docs = []
+    for i in range(n_chunks):
+        doc_type = types[i % len(types)]
+        words = VOCABULARY[doc_type].split()
+        text = " ".join(rng.choice(words) for _ in range(55))
+        if rng.random() < boilerplate_ratio:
+            text = BOILERPLATE + " " + text
+        text = text[:400]
+
+        if doc_type is None:
+            metadata = {"source": f"data/esilv_docs/reglement_{i}.pdf", "page": i % 20}
+        else:
+            school = SCHOOLS[(i // len(types)) % len(SCHOOLS)]
+            metadata = {
+                "source": "web",
+                "url": f"https://www.{school}.fr/{doc_type}/page-{i}",
+                "title": f"{doc_type} {i}",
+                "school": school,
+                "type": doc_type,
+            }
+        docs.append(Document(page_content=text, metadata=metadata))
+    return docs
+
+
+def fake_embeddings(fake_server):
+    return OllamaEmbeddings(model="fake-embed", base_url=fake_server.url)
+
+
+def build_synthetic_vectorstore(path, embeddings, n_chunks: int = 3000, seed: int = 0):
+    docs = synthetic_documents(n_chunks, seed=seed)
+    texts = [d.page_content for d in docs]
+    vectors = embeddings.embed_documents(texts)
+    vectorstore = FAISS.from_embeddings(
+        list(zip(texts, vectors)),
+        embeddings,
+        metadatas=[d.metadata for d in docs],
+        ids=[f"synthetic-{i}" for i in range(len(docs))],
+    )
+    save_vectorstore(vectorstore, path)
+    build_lexical_index(vectorstore, path)
+    return vectorstore
+
+
+def synthetic_resources(path, fake_server, n_chunks: int = 3000, llm=None) -> SharedResources:
+    embeddings = fake_embeddings(fake_server)
+    build_synthetic_vectorstore(path, embeddings, n_chunks=n_chunks)
+    return SharedResources(path=str(path), embeddings=embeddings, llm=llm)
+
+
+def real_resources() -> SharedResources:
+    return get_resources()
@@ -0,0 +1,62 @@
+# benchmarks/crawl.py
+#
+# Crawler contre le faux site local (latence simulée par requête) :
+# séquentiel (1 worker, comme l'ancien notebook) vs concurrent, puis re-crawl conditionnel (304).
+#   python -m benchmarks.crawl --pages 60 --latency 0.05
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from app.crawler import Crawler
+from app.fake_site import FakeSiteServer
+
+
+def crawl(site, tmp: Path, name: str, workers: int, rps: float, fresh: bool = True) -> dict:
+    calls = dict(site.calls)
+    t0 = time.perf_counter()
+    report = Crawler(
+        sitemaps=[site.url + "/sitemap_index.xml"],
+        out_path=tmp / f"{name}.jsonl",
+        state_path=tmp / f"{name}_state.json",
+        workers=workers,
+        host_rps=rps,
+        fresh=fresh,
+    ).run()
+    wall = time.perf_counter() - t0
+    return {
+        "workers": workers,
+        "wall_s": round(wall, 3),
+        "pages_per_s": report["pages_per_s"],
+        "fetched": report["fetched"],
+        "not_modified": report["not_modified"],
+        "bytes_downloaded": report["bytes_downloaded"],
+        "pages_served": site.calls.get("pages", 0) - calls.get("pages", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=60, help="pages par section du faux site")
+    parser.add_argument("--latency", type=float, default=0.05, help="secondes par requête")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rps", type=float, default=0, help="limite par hôte (0 : aucune)")
+    args = parser.parse_args()
+
+    with FakeSiteServer(pages_per_section=args.pages, latency=args.latency) as site, \
+            tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        report = {
+            "sequential": crawl(site, tmp, "sequential", 1, args.rps),
+            "concurrent": crawl(site, tmp, "concurrent", args.workers, args.rps),
+            "recrawl": crawl(site, tmp, "concurrent", args.workers, args.rps, fresh=False),
+        }
+        report["speedup"] = round(report["sequential"]["wall_s"] / report["concurrent"]["wall_s"], 2)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# benchmarks/docstore.py
+#
+# Docstore picklé (FAISS.save_local / load_local, ancien format) vs ChunkStore en colonnes mappées
+# (app/chunkstore.py), sur un gros corpus synthétique : taille sur disque, temps jusqu'à la
+# première réponse (chargement + 1re recherche), mémoire du processus, lecture des top-k.
+# Chaque format est mesuré dans un processus neuf.
+#   python -m benchmarks.docstore --chunks 200000
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from app.chunkstore import save_vectorstore
+
+from .common import synthetic_documents
+
+
+class _NoEmbeddings(Embeddings):
+    # les recherches du benchmark passent des vecteurs : aucun appel d'embedding
+    def embed_documents(self, texts):
+        raise NotImplementedError
+
+    def embed_query(self, text):
+        raise NotImplementedError
+
+
+def process_memory() -> dict:
+    """RSS du processus (Mo) : privée (anon) et pages de fichiers mappés (partageables)."""
+    values = {}
+    with open("/proc/self/status", "r", encoding="utf-8") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                values[key] = int(rest.split()[0]) / 1024
+    return values
+
+
+def dir_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def child(mode: str, path: str, dim: int, lookups: int):
+    from app.rag import load_vectorstore
+
+    before = process_memory()
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((lookups, dim)).astype(np.float32)
+
+    t0 = time.perf_counter()
+    if mode == "pickle":
+        vs = FAISS.load_local(path, _NoEmbeddings(), allow_dangerous_deserialization=True)
+    else:
+        vs = load_vectorstore(_NoEmbeddings(), path)
+    load_s = time.perf_counter() - t0
+    vs.similarity_search_by_vector(queries[0].tolist(), k=6)
+    first_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for q in queries:
+        vs.similarity_search_by_vector(q.tolist(), k=6)
+    search_ms = (time.perf_counter() - t0) / lookups * 1000
+
+    after = process_memory()
+    print(json.dumps({
+        "load_s": round(load_s, 3),
+        "first_answer_s": round(first_s, 3),
+        "search_top6_ms": round(search_ms, 3),
+        "rss_mb": round(after["VmRSS"] - before["VmRSS"], 1),
+        "private_mb": round(after.get("RssAnon", 0) - before.get("RssAnon", 0), 1),
+        "file_mapped_mb": round(after.get("RssFile", 0) - before.get("RssFile", 0), 1),
+    }))
+
+
+def measure(mode: str, path: Path, dim: int, lookups: int) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.docstore", "--child", mode, str(path),
+         "--dim", str(dim), "--lookups", str(lookups)],
+        capture_output=True, text=True, check=True, cwd=Path(__file__).resolve().parent.parent,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], args.dim, args.lookups)
+        return
+
+    docs = synthetic_documents(args.chunks)
+    vectors = np.random.default_rng(0).standard_normal((len(docs), args.dim)).astype(np.float32)
+    vs = FAISS.from_embeddings(
+        list(zip((d.page_content for d in docs), vectors.tolist())),
+        _NoEmbeddings(),
+        metadatas=[d.metadata for d in docs],
+        ids=[f"chunk-{i}" for i in range(len(docs))],
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_dir, store_dir = Path(tmp) / "pickle", Path(tmp) / "chunkstore"
+        t0 = time.perf_counter()
+        vs.save_local(str(pickle_dir))
+        pickle_save = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        save_vectorstore(vs, store_dir)
+        store_save = time.perf_counter() - t0
+        del vs, docs, vectors
+
+        report = {"chunks": args.chunks}
+        for mode, path, save_s in (("pickle", pickle_dir, pickle_save), ("chunkstore", store_dir, store_save)):
+            report[mode] = {
+                "disk_mb": round(dir_bytes(path) / 1e6, 1),
+                "save_s": round(save_s, 3),
+                **measure(mode, path, args.dim, args.lookups),
+            }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/filtered_retrieval.py
+#
+# Recherche globale (k=6 sur tout l'index) vs recherche filtrée par agent / école.
+#   python -m benchmarks.filtered_retrieval --synthetic
+#   python -m benchmarks.filtered_retrieval            (index réel + Ollama)
+
+import argparse
+import json
+import tempfile
+import time
+
+from app.config import AGENT_DOC_TYPES, RETRIEVER_K
+from app.fake_ollama import FakeOllamaServer
+
+from .common import (
+    load_questions,
+    is_hit,
+    latency_summary,
+    synthetic_resources,
+    real_resources,
+)
+
+
+def type_precision(docs, doc_type) -> float:
+    if not docs or not doc_type:
+        return 1.0
+    ok = sum(1 for d in docs if d.metadata.get("type") in (doc_type, None))
+    return ok / len(docs)
+
+
+def run(resources, repeats: int = 20, k: int = RETRIEVER_K) -> dict:
+    questions = load_questions()
+    handle = resources.vectorstore
+    embeddings = [resources.embeddings.embed_query(q["question"]) for q in questions]
+
+    # construction des sous-index (coût payé une fois par chargement)
+    t0 = time.perf_counter()
+    for q in questions:
+        handle.subindexes.get(AGENT_DOC_TYPES.get(q["agent"]), q.get("school"))
+    build_seconds = time.perf_counter() - t0
+
+    results = {}
+    for mode in ("global", "filtered"):
+        latencies, precision, hits, type_prec = [], [], [], []
+        for q, emb in zip(questions, embeddings):
+            doc_type = AGENT_DOC_TYPES.get(q["agent"])
+            kwargs = {"doc_type": doc_type, "school": q.get("school")} if mode == "filtered" else {}
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                docs = handle.search(emb, k=k, **kwargs)
+                latencies.append(time.perf_counter() - t0)
+            if q["expected"]:
+                flags = [is_hit(d, q["expected"]) for d in docs]
+                precision.append(sum(flags) / max(1, len(flags)))
+                hits.append(any(flags))
+            type_prec.append(type_precision(docs, doc_type))
+
+        results[mode] = {
+            **latency_summary(latencies),
+            "precision_at_k": round(sum(precision) / max(1, len(precision)), 3),
+            "hit_rate_at_k": round(sum(hits) / max(1, len(hits)), 3),
+            "type_precision": round(sum(type_prec) / max(1, len(type_prec)), 3),
+        }
+
+    results["subindex_build_s"] = round(build_seconds, 3)
+    results["index_vectors"] = handle.ntotal
+    results["k"] = k
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--synthetic", action="store_true", help="corpus synthétique + faux Ollama")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        with FakeOllamaServer() as fake, tempfile.TemporaryDirectory() as tmp:
+            resources = synthetic_resources(tmp, fake, n_chunks=args.chunks)
+            report = run(resources, repeats=args.repeats)
+    else:
+        report = run(real_resources(), repeats=args.repeats)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# benchmarks/hybrid_retrieval.py
+#
+# FAISS seul vs FAISS + BM25 (fusion RRF) : surcoût de latence et gain de rappel.
+#   python -m benchmarks.hybrid_retrieval --synthetic
+#   python -m benchmarks.hybrid_retrieval            (index réel + Ollama)
+
+import argparse
+import json
+import tempfile
+import time
+
+from app.config import AGENT_DOC_TYPES, RETRIEVER_K
+from app.fake_ollama import FakeOllamaServer
+from app.rag import hybrid_search
+
+from .common import load_questions, is_hit, latency_summary, synthetic_resources, real_resources
+
+
+def run(resources, repeats: int = 20, k: int = RETRIEVER_K) -> dict:
+    handle = resources.vectorstore
+    if handle.lexical is None:
+        raise SystemExit("No lexical index next to the vectorstore: re-run the ingestion.")
+
+    questions = [q for q in load_questions() if q["expected"]]
+    embeddings = [resources.embeddings.embed_query(q["question"]) for q in questions]
+
+    modes = {
+        "dense": lambda q, emb, dt, sc: handle.search(emb, k=k, doc_type=dt, school=sc),
+        "hybrid": lambda q, emb, dt, sc: hybrid_search(handle, q, emb, k, dt, sc),
+        "lexical_only": lambda q, emb, dt, sc: handle.lexical.search(q, k),
+    }
+
+    report = {"k": k, "questions": len(questions), "index_vectors": handle.ntotal}
+    for name, search in modes.items():
+        latencies, hits, precision = [], [], []
+        for q, emb in zip(questions, embeddings):
+            doc_type, school = AGENT_DOC_TYPES.get(q["agent"]), q.get("school")
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                docs = search(q["question"], emb, doc_type, school)
+                latencies.append(time.perf_counter() - t0)
+            if name == "lexical_only":
+                continue
+            flags = [is_hit(d, q["expected"]) for d in docs]
+            hits.append(any(flags))
+            precision.append(sum(flags) / max(1, len(flags)))
+
+        report[name] = latency_summary(latencies)
+        if hits:
+            report[name]["hit_rate_at_k"] = round(sum(hits) / len(hits), 3)
+            report[name]["precision_at_k"] = round(sum(precision) / len(precision), 3)
+
+    report["overhead_p50_ms"] = round(report["hybrid"]["p50_ms"] - report["dense"]["p50_ms"], 3)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--synthetic", action="store_true", help="corpus synthétique + faux Ollama")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        with FakeOllamaServer() as fake, tempfile.TemporaryDirectory() as tmp:
+            report = run(synthetic_resources(tmp, fake, n_chunks=args.chunks), repeats=args.repeats)
+    else:
+        report = run(real_resources(), repeats=args.repeats)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# benchmarks/load_test.py
+#
+# N utilisateurs simultanés contre le faux serveur Ollama (embeddings + chat) :
+# débit, latence de bout en bout, temps jusqu'au premier token,
+# et, côté limiteur, attente en file vs temps de service.
+#   python -m benchmarks.load_test --users 16 --concurrency 4
+#   python -m benchmarks.load_test --users 16 --mode threads
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_ollama import ChatOllama
+
+from app.fake_ollama import FakeOllamaServer
+from app.limiter import ConcurrencyLimiter
+from app.router import AgentRouter
+
+from .common import load_questions, latency_summary, synthetic_resources
+
+
+def user_questions(questions, user: int, n: int):
+    # question unique par utilisateur / requête : pas de hit du cache de réponses
+    return [
+        f"{questions[(user + i) % len(questions)]['question']} (utilisateur {user}, requête {i})"
+        for i in range(n)
+    ]
+
+
+async def run_async(router, questions, users: int, requests: int, timeout: float):
+    e2e, ttft, errors = [], [], Counter()
+
+    async def user(u):
+        for question in user_questions(questions, u, requests):
+            t0 = time.perf_counter()
+            first = None
+            try:
+                stream = await router.astream(question, timeout=timeout)
+                async for _ in stream:
+                    if first is None:
+                        first = time.perf_counter() - t0
+            except Exception as e:
+                errors[type(e).__name__] += 1
+                continue
+            e2e.append(time.perf_counter() - t0)
+            ttft.append(first or 0.0)
+
+    await asyncio.gather(*(user(u) for u in range(users)))
+    return e2e, ttft, errors
+
+
+def run_threads(router, questions, users: int, requests: int, timeout: float):
+    e2e, ttft, errors = [], [], Counter()
+
+    def user(u):
+        for question in user_questions(questions, u, requests):
+            t0 = time.perf_counter()
+            first = None
+            try:
+                for _ in router.stream(question, timeout=timeout):
+                    if first is None:
+                        first = time.perf_counter() - t0
+            except Exception as e:
+                errors[type(e).__name__] += 1
+                continue
+            e2e.append(time.perf_counter() - t0)
+            ttft.append(first or 0.0)
+
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user, range(users)))
+    return e2e, ttft, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=3, help="requêtes par utilisateur")
+    parser.add_argument("--concurrency", type=int, default=4, help="générations LLM simultanées")
+    parser.add_argument("--queue", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--mode", choices=["async", "threads"], default="async")
+    parser.add_argument("--chat-latency", type=float, default=0.2, help="secondes avant le 1er token")
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--chunks", type=int, default=3000)
+    args = parser.parse_args()
+
+    questions = load_questions()
+    with FakeOllamaServer(chat_latency=args.chat_latency, token_latency=args.token_latency) as fake, \
+            tempfile.TemporaryDirectory() as tmp:
+        llm = ChatOllama(model="fake-llm", base_url=fake.url, temperature=0)
+        resources = synthetic_resources(tmp, fake, n_chunks=args.chunks, llm=llm)
+        resources.llm_limiter = ConcurrencyLimiter(args.concurrency, args.queue)
+        router = AgentRouter(resources=resources)
+        resources.vectorstore  # chargement hors mesure
+
+        t0 = time.perf_counter()
+        if args.mode == "async":
+            e2e, ttft, errors = asyncio.run(
+                run_async(router, questions, args.users, args.requests, args.timeout)
+            )
+        else:
+            e2e, ttft, errors = run_threads(router, questions, args.users, args.requests, args.timeout)
+        wall = time.perf_counter() - t0
+
+        report = {
+            "mode": args.mode,
+            "users": args.users,
+            "requests": args.users * args.requests,
+            "completed": len(e2e),
+            "errors": dict(errors),
+            "wall_s": round(wall, 3),
+            "throughput_rps": round(len(e2e) / wall, 2) if wall else 0.0,
+            "end_to_end": latency_summary(e2e),
+            "ttft": latency_summary(ttft),
+            "limiter": resources.llm_limiter.stats(),
+            "stages": resources.tracer.summary()["stages"],
+            "backend_calls": fake.calls,
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# benchmarks/memory.py
+#
+# Mémoire d'une session de chat sur une longue conversation :
+#   ancien état  liste complète des messages, texte du document uploadé recopié sur chaque question
+#   nouveau      ConversationMemory (fenêtre bornée, upload par référence) + messages affichés bornés
+# Taille en mémoire et taille de l'historique envoyé à l'API, à plusieurs points de la conversation,
+# puis coût et taux de cache de la reformulation des relances (app/memory.py).
+#   python -m benchmarks.memory --turns 1000 --upload-kb 200
+
+import argparse
+import json
+import random
+import sys
+import time
+from collections import deque
+
+from app.config import MEMORY_DISPLAY_MESSAGES
+from app.memory import ConversationMemory, QuestionRewriter
+
+from .common import load_questions
+
+FOLLOW_UPS = [
+    "et pour le MSc ?", "et pour l'EMLV ?", "Combien ça coûte ?", "et les dates ?",
+    "Pourquoi ?", "Est-ce qu'elle est en anglais ?", "et après ?", "aussi en alternance ?",
+]
+
+
+def deep_size(obj, seen=None) -> int:
+    """sys.getsizeof récursif ; un objet partagé n'est compté qu'une fois."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, deque)):
+        size += sum(deep_size(v, seen) for v in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(deep_size(getattr(obj, name), seen) for name in obj.__slots__ if hasattr(obj, name))
+    elif hasattr(obj, "__dict__"):
+        size += deep_size(obj.__dict__, seen)
+    return size
+
+
+class _Upload:
+    # l'index uploadé est partagé entre sessions (app/uploads.py) : hors de la mémoire de session
+    __slots__ = ("file_id",)
+
+    def __init__(self):
+        self.file_id = "upload"
+
+
+def conversation(questions, turns: int, follow_up_ratio: float, seed: int = 0):
+    rng = random.Random(seed)
+    for _ in range(turns):
+        if rng.random() < follow_up_ratio:
+            yield rng.choice(FOLLOW_UPS)
+        else:
+            yield rng.choice(questions)["question"]
+
+
+def bench_sessions(questions, turns: int, checkpoints, upload_kb: int, answer_chars: int) -> list:
+    document = ("Règlement intérieur, article. " * (upload_kb * 1024 // 30))[:upload_kb * 1024]
+    answer = ("Réponse de l'assistant. " * (answer_chars // 24 + 1))[:answer_chars]
+
+    old_messages = []
+    memory = ConversationMemory()
+    memory.upload = _Upload()
+    displayed = deque(maxlen=MEMORY_DISPLAY_MESSAGES)
+
+    rows = []
+    for turn, question in enumerate(conversation(questions, turns, 0.3), start=1):
+        # ancien état : copie du document sur chaque question, rien n'est jamais retiré
+        old_messages.append({"role": "user", "content": question, "uploaded_doc": (document + " ")[:-1]})
+        old_messages.append({"role": "assistant", "content": answer, "agent": "AdmissionsAgent"})
+
+        displayed.append({"role": "user", "content": question})
+        displayed.append({"role": "assistant", "content": answer, "agent": "AdmissionsAgent", "turn": turn})
+        memory.add_turn(question, answer, "AdmissionsAgent")
+
+        if turn in checkpoints:
+            seen = {id(memory.upload)}
+            rows.append({
+                "turns": turn,
+                "old_kb": round(deep_size(old_messages) / 1024, 1),
+                "new_kb": round((deep_size(memory, seen) + deep_size(displayed, seen)) / 1024, 1),
+                "new_memory_kb": round(memory.memory_bytes() / 1024, 1),
+                "old_api_history_kb": round(len(json.dumps(old_messages, ensure_ascii=False)) / 1024, 1),
+                "new_api_history_kb": round(len(json.dumps(memory.to_messages(), ensure_ascii=False)) / 1024, 1),
+            })
+    return rows
+
+
+def bench_rewrite(questions, sessions: int, turns: int) -> dict:
+    rewriter = QuestionRewriter()
+    latencies = []
+    for s in range(sessions):
+        memory = ConversationMemory()
+        for question in conversation(questions, turns, 0.3, seed=s):
+            t0 = time.perf_counter()
+            standalone = rewriter.rewrite(question, memory)
+            latencies.append(time.perf_counter() - t0)
+            memory.add_turn(question, "réponse", query=standalone.query)
+    latencies.sort()
+    return {
+        "rewrites": len(latencies),
+        "avg_us": round(sum(latencies) / len(latencies) * 1e6, 1),
+        "p99_us": round(latencies[int(len(latencies) * 0.99)] * 1e6, 1),
+        **rewriter.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=1000, help="échanges dans la conversation")
+    parser.add_argument("--upload-kb", type=int, default=200, help="taille du texte du document uploadé")
+    parser.add_argument("--answer-chars", type=int, default=800)
+    parser.add_argument("--sessions", type=int, default=200, help="sessions simulées pour la reformulation")
+    args = parser.parse_args()
+
+    questions = load_questions()
+    checkpoints = {t for t in (1, 10, 50, 100, 500, 1000, 5000) if t <= args.turns} | {args.turns}
+    report = {
+        "sessions": bench_sessions(questions, args.turns, checkpoints, args.upload_kb, args.answer_chars),
+        "rewrite": bench_rewrite(questions, args.sessions, 20),
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
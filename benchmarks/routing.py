@@ -0,0 +1,113 @@
+# benchmarks/routing.py
+#
+# Routage : cascade de mots-clés vs questions types embeddées (précision + latence).
+#   keywords  cascade seule (défaut tant que SEMANTIC_ROUTING = False)
+#   semantic  questions types seules
+#   router    AgentRouter avec routage sémantique, cascade si la route est peu sûre
+# Seule la mesure avec de vrais embeddings décide de SEMANTIC_ROUTING : le faux serveur
+# (sacs de mots hachés) ne dit rien de la qualité d'un vrai modèle.
+#   python -m benchmarks.routing --synthetic
+#   python -m benchmarks.routing            (Ollama réel)
+
+import argparse
+import json
+import tempfile
+import time
+from collections import Counter
+
+from app.fake_ollama import FakeOllamaServer
+from app.resources import SharedResources
+from app.lexical import tokenize
+from app.router import AgentRouter, keyword_route
+from app.semantic_router import ROUTING_EXEMPLARS
+
+from .common import load_questions, latency_summary, fake_embeddings, real_resources
+
+
+def exemplar_leaks(questions, exemplars=ROUTING_EXEMPLARS, threshold: float = 0.5) -> list:
+    """Questions types trop proches (Jaccard des termes) d'une question du jeu d'évaluation."""
+    leaks = []
+    for agent, texts in exemplars.items():
+        for text in texts:
+            terms = set(tokenize(text))
+            for q in questions:
+                other = set(tokenize(q["question"]))
+                jaccard = len(terms & other) / max(1, len(terms | other))
+                if jaccard >= threshold:
+                    leaks.append({"exemplar": text, "question": q["question"], "jaccard": round(jaccard, 2)})
+    return leaks
+
+
+def run(resources, repeats: int = 20) -> dict:
+    questions = load_questions()
+    router = AgentRouter(resources=resources, semantic=True)
+    semantic = resources.semantic_router
+    semantic.verbose = False
+
+    t0 = time.perf_counter()
+    semantic.scores(resources.embed_question("warmup"))
+    load_seconds = time.perf_counter() - t0
+
+    modes = {
+        "keywords": keyword_route,
+        "semantic": lambda q: semantic.classify(q, resources.embed_question(q))[0],
+        "router": router.route,
+    }
+
+    # précision mesurée sur des questions absentes des questions types
+    report = {
+        "questions": len(questions),
+        "exemplars_load_s": round(load_seconds, 3),
+        "exemplar_leaks": exemplar_leaks(questions),
+    }
+    for name, route in modes.items():
+        latencies, correct, errors = [], 0, Counter()
+        for q in questions:
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                agent = route(q["question"])
+                latencies.append(time.perf_counter() - t0)
+            if agent == q["agent"]:
+                correct += 1
+            else:
+                errors[f"{q['agent']}->{agent}"] += 1
+
+        report[name] = latency_summary(latencies)
+        report[name]["accuracy"] = round(correct / len(questions), 3)
+        report[name]["errors"] = dict(errors.most_common())
+    # part des questions où la route sémantique est jugée peu sûre (cascade de mots-clés à la place)
+    confident = [
+        semantic.is_confident(*semantic.classify(q["question"], resources.embed_question(q["question"]))[1:])
+        for q in questions
+    ]
+    report["semantic"]["low_confidence_share"] = round(1 - sum(confident) / len(questions), 3)
+
+    # coût à froid : embedding de la question non encore calculé
+    cold = []
+    for q in questions:
+        resources.question_cache.clear()
+        t0 = time.perf_counter()
+        router.route(q["question"])
+        cold.append(time.perf_counter() - t0)
+    report["router_cold"] = latency_summary(cold)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--synthetic", action="store_true", help="faux serveur d'embeddings")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        with FakeOllamaServer() as fake, tempfile.TemporaryDirectory() as tmp:
+            resources = SharedResources(path=tmp, embeddings=fake_embeddings(fake))
+            report = run(resources, repeats=args.repeats)
+    else:
+        report = run(real_resources(), repeats=args.repeats)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+# benchmarks/suite.py
+#
+# Suite de non-régression, entièrement locale (faux serveur Ollama : embeddings + chat) :
+#   ingest     build_vectorstore() sur un corpus synthétique (pages web JSONL + fichiers TXT)
+#   retrieval  latence de retrieve() (à froid / cache chaud), hit@k sur les questions étiquetées,
+#              recall@k de l'index servi par load_vectorstore() contre une recherche exacte
+#   routing    précision et latence de AgentRouter.route
+#   e2e        débit et latence de AgentRouter.handle pour 1, 8 et 32 utilisateurs simultanés
+# La suite est lancée --runs fois ; le rapport garde la médiane de chaque valeur et l'étendue
+# (max - min) de chaque métrique suivie. Il est comparé à une baseline enregistrée de la même façon :
+# le seuil d'une métrique est la tolérance plus l'étendue mesurée (la plus grande des deux rapports).
+# Code de sortie 1 en cas de régression.
+#   python -m benchmarks.suite                       compare à benchmarks/baseline.json
+#   python -m benchmarks.suite --save-baseline       remplace la baseline
+#   python -m benchmarks.suite --quick --out report.json
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import faiss
+import numpy as np
+from langchain_ollama import ChatOllama
+
+from app.config import AGENT_DOC_TYPES, RETRIEVER_K, VECTORSTORE_PATH, DOCS_PATH, WEB_JSONL_PATH
+from app.fake_ollama import FakeOllamaServer
+from app.ingest import build_vectorstore
+from app.rag import retrieve
+from app.resources import SharedResources
+from app.router import AgentRouter
+from app.versions import resolve_index_path
+
+from .common import load_questions, is_hit, latency_summary, synthetic_documents, fake_embeddings
+from .load_test import user_questions
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+SECTIONS = {"admissions": "admissions", "academics": "formations", "student_life": "vie-etudiante"}
+
+# métrique -> sens ("lower" / "higher" : tolérance et étendue relatives, "quality" : absolues)
+METRICS = {
+    "ingest.chunks_per_s": "higher",
+    # p95 de retrieve() : varie d'un lancement à l'autre bien plus qu'entre les --runs d'un même
+    # lancement (machine partagée) ; rapporté, pas comparé. Le p50 suffit à voir une régression.
+    "retrieval.cold.p50_ms": "lower",
+    "retrieval.warm.p50_ms": "lower",
+    "retrieval.hit_at_k": "quality",
+    "retrieval.recall_at_k": "quality",
+    "routing.accuracy": "quality",
+    "routing.p95_ms": "lower",
+}
+for _users in (1, 8, 32):
+    METRICS[f"e2e.users_{_users}.throughput_rps"] = "higher"
+    METRICS[f"e2e.users_{_users}.p50_ms"] = "lower"   # p95 sous file d'attente : trop bruité pour un seuil
+
+
+def write_corpus(root: Path, n_chunks: int):
+    """Corpus synthétique aux emplacements de config.py : pages web (6 chunks) + règlements TXT."""
+    docs_dir = root / DOCS_PATH
+    docs_dir.mkdir(parents=True, exist_ok=True)
+    pages, texts = {}, []
+    for i, doc in enumerate(synthetic_documents(n_chunks)):
+        doc_type = doc.metadata.get("type")
+        if doc_type is None:
+            texts.append(doc.page_content)
+            continue
+        url = f"https://www.{doc.metadata['school']}.fr/{SECTIONS[doc_type]}/page-{i // 18}"
+        pages.setdefault(url, []).append(doc.page_content)
+
+    with open(root / WEB_JSONL_PATH, "w", encoding="utf-8") as f:
+        for url, lines in pages.items():
+            f.write(json.dumps({"url": url, "title": url.rsplit("/", 2)[-2], "text": "\n".join(lines)}) + "\n")
+    for i in range(0, len(texts), 6):
+        (docs_dir / f"reglement_{i // 6}.txt").write_text("\n".join(texts[i:i + 6]), encoding="utf-8")
+    return len(pages), (len(texts) + 5) // 6
+
+
+def bench_ingest(fake, root: Path, n_chunks: int) -> dict:
+    pages, files = write_corpus(root, n_chunks)
+    t0 = time.perf_counter()
+    report = build_vectorstore(full=True, embeddings=fake_embeddings(fake))
+    seconds = time.perf_counter() - t0
+    return {
+        "web_pages": pages,
+        "text_files": files,
+        "chunks": report.get("chunks", 0),
+        "seconds": round(seconds, 3),
+        "chunks_per_s": round(report.get("chunks", 0) / seconds, 1) if seconds else 0.0,
+        "stages": report.get("stages"),
+    }
+
+
+def bench_retrieval(resources, questions, repeats: int, k: int = RETRIEVER_K) -> dict:
+    t0 = time.perf_counter()
+    handle = resources.vectorstore
+    load_seconds = time.perf_counter() - t0
+
+    cold, warm, hits = [], [], []
+    for q in questions:
+        doc_type, school = AGENT_DOC_TYPES.get(q["agent"]), q.get("school")
+        for _ in range(repeats):
+            resources.query_cache.clear()
+            resources.question_cache.clear()
+            t0 = time.perf_counter()
+            docs, _ = retrieve(q["question"], resources, k=k, doc_type=doc_type, school=school)
+            cold.append(time.perf_counter() - t0)
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            retrieve(q["question"], resources, k=k, doc_type=doc_type, school=school)
+            warm.append(time.perf_counter() - t0)
+        if q["expected"]:
+            hits.append(any(is_hit(d, q["expected"]) for d in docs))
+
+    # recall@k de l'index servi (flat ou ANN) contre l'index exact de référence (index.faiss)
+    embeddings = np.asarray(
+        [resources.embed_question(q["question"]) for q in questions], dtype=np.float32
+    )
+    served = resources._vectorstore.index
+    exact = faiss.read_index(os.path.join(resolve_index_path(resources.path), "index.faiss"))
+    _, exact_ids = exact.search(embeddings, k)
+    _, served_ids = served.search(embeddings, k)
+    recall = np.mean([len(set(e) & set(s)) / k for e, s in zip(exact_ids, served_ids)])
+
+    return {
+        "vectors": handle.ntotal,
+        "index_type": type(served).__name__,
+        "load_s": round(load_seconds, 3),
+        "cold": latency_summary(cold),
+        "warm": latency_summary(warm),
+        "hit_at_k": round(sum(hits) / max(1, len(hits)), 3),
+        "recall_at_k": round(float(recall), 3),
+    }
+
+
+def bench_routing(router, resources, questions, repeats: int) -> dict:
+    latencies, correct = [], 0
+    for q in questions:
+        for _ in range(repeats):
+            resources.question_cache.clear()
+            t0 = time.perf_counter()
+            agent = router.route(q["question"])
+            latencies.append(time.perf_counter() - t0)
+        correct += agent == q["agent"]
+    return {**latency_summary(latencies), "accuracy": round(correct / len(questions), 3)}
+
+
+def bench_e2e(router, resources, questions, users: int, requests: int) -> dict:
+    resources.invalidate_caches()
+    latencies, errors = [], Counter()
+
+    def user(u):
+        for question in user_questions(questions, u, requests):
+            t0 = time.perf_counter()
+            try:
+                router.handle(question)
+            except Exception as e:
+                errors[type(e).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user, range(users)))
+    wall = time.perf_counter() - t0
+    return {
+        "requests": users * requests,
+        "errors": dict(errors),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        **latency_summary(latencies),
+    }
+
+
+def run(args) -> dict:
+    questions = load_questions()
+    results = {}
+    cwd = os.getcwd()
+    with FakeOllamaServer(
+        embed_latency=args.embed_latency,
+        embed_latency_per_item=args.embed_latency_per_item,
+        chat_latency=args.chat_latency,
+        token_latency=args.token_latency,
+    ) as fake, tempfile.TemporaryDirectory() as tmp:
+        # chemins relatifs de config.py (data/, storage/) -> dossier temporaire
+        os.chdir(tmp)
+        try:
+            results["ingest"] = bench_ingest(fake, Path(tmp), args.chunks)
+
+            llm = ChatOllama(model="fake-llm", base_url=fake.url, temperature=0)
+            resources = SharedResources(path=VECTORSTORE_PATH, embeddings=fake_embeddings(fake), llm=llm)
+            router = AgentRouter(resources=resources)
+            resources.semantic_router.verbose = False
+            results["retrieval"] = bench_retrieval(resources, questions, args.repeats)
+            results["routing"] = bench_routing(router, resources, questions, args.repeats)
+            results["e2e"] = {
+                f"users_{users}": bench_e2e(router, resources, questions, users, args.requests)
+                for users in (1, 8, 32)
+            }
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def metric(results: dict, name: str):
+    value = results
+    for key in name.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def median_results(runs: list):
+    """Résultats de plusieurs exécutions -> même structure, médiane de chaque valeur numérique."""
+    first = runs[0]
+    if isinstance(first, dict):
+        return {key: median_results([r[key] for r in runs if isinstance(r, dict) and key in r]) for key in first}
+    if _is_number(first) and all(_is_number(r) for r in runs):
+        return round(statistics.median(runs), 3)
+    return first
+
+
+def spreads(runs: list) -> dict:
+    """Étendue de chaque métrique suivie : relative (latence, débit) ou absolue (qualité)."""
+    out = {}
+    for name, direction in METRICS.items():
+        values = [metric(r, name) for r in runs]
+        if any(v is None for v in values):
+            continue
+        extent = max(values) - min(values)
+        if direction != "quality":
+            middle = statistics.median(values)
+            extent = extent / middle if middle else 0.0
+        out[name] = round(extent, 3)
+    return out
+
+
+def compare(results: dict, baseline: dict, tolerance: float, quality_tolerance: float,
+            min_delta_ms: float, spread: dict = None, baseline_spread: dict = None) -> list:
+    """Une ligne par métrique : ok / regression / improved par rapport à la baseline."""
+    spread, baseline_spread = spread or {}, baseline_spread or {}
+    rows = []
+    for name, direction in METRICS.items():
+        current, base = metric(results, name), metric(baseline, name)
+        if current is None or base is None:
+            continue
+        delta = current - base
+        # bruit mesuré : étendue entre exécutions, la plus grande des deux (baseline, rapport)
+        noise = max(spread.get(name, 0.0), baseline_spread.get(name, 0.0))
+        if direction == "quality":
+            threshold = quality_tolerance + noise
+            worse, better = delta < -threshold, delta > threshold
+        else:
+            threshold = tolerance + noise
+            sign = 1 if direction == "lower" else -1
+            relative = sign * delta / base if base else 0.0
+            # latences sub-milliseconde : le bruit dépasse vite la tolérance relative
+            significant = not name.endswith("_ms") or abs(delta) >= min_delta_ms
+            worse = significant and relative > threshold
+            better = significant and relative < -threshold
+        rows.append({
+            "metric": name,
+            "baseline": base,
+            "current": current,
+            "change": round(delta / base, 3) if base else None,
+            "threshold": round(threshold, 3),
+            "status": "regression" if worse else "improved" if better else "ok",
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=3000, help="chunks du corpus synthétique")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=4, help="requêtes par utilisateur (e2e)")
+    parser.add_argument("--embed-latency", type=float, default=0.002)
+    parser.add_argument("--embed-latency-per-item", type=float, default=0.0001)
+    parser.add_argument("--chat-latency", type=float, default=0.05, help="secondes avant le 1er token")
+    parser.add_argument("--token-latency", type=float, default=0.002)
+    parser.add_argument("--runs", type=int, default=3, help="exécutions complètes ; le rapport en garde la médiane")
+    parser.add_argument("--quick", action="store_true", help="corpus et répétitions réduits")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="écart relatif toléré (latence, débit), en plus de l'étendue mesurée")
+    parser.add_argument("--quality-tolerance", type=float, default=0.02,
+                        help="écart absolu toléré (précision, rappel), en plus de l'étendue mesurée")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1, help="écart absolu minimal d'une latence")
+    parser.add_argument("--out", help="fichier du rapport JSON")
+    args = parser.parse_args()
+    if args.quick:
+        args.chunks, args.repeats, args.requests = 600, 2, 2
+
+    runs = []
+    for i in range(max(1, args.runs)):
+        print(f"Run {i + 1}/{max(1, args.runs)}", file=sys.stderr)
+        runs.append(run(args))
+    results = median_results(runs)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline", "out")},
+        "results": results,
+        "spread": spreads(runs),
+    }
+
+    baseline_path = Path(args.baseline)
+    regressions = []
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Baseline saved to {baseline_path}")
+    elif baseline_path.exists():
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print("Warning: baseline was recorded with other settings; comparison is indicative.")
+        report["comparison"] = compare(
+            results, baseline["results"], args.tolerance, args.quality_tolerance, args.min_delta_ms,
+            spread=report["spread"], baseline_spread=baseline.get("spread"),
+        )
+        regressions = [r for r in report["comparison"] if r["status"] == "regression"]
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if regressions:
+        print(f"{len(regressions)} regression(s): " + ", ".join(r["metric"] for r in regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
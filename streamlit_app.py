@@ -1,22 +1,15 @@
+from collections import deque
+
 import streamlit as st
-import csv
-from pathlib import Path
-from collections import Counter, defaultdict
-from pypdf import PdfReader  # Correction de la lecture PDF
 
+from app.agents import AgentResponse
+from app.analytics import get_analytics
+from app.client import ApiRouter
+from app.config import API_URL, MEMORY_DISPLAY_MESSAGES
+from app.memory import ConversationMemory
 from app.router import AgentRouter
-
-
-
-# Paths
-
-
-ADMIN_DIR = Path("data/admin")
-CONTACTS_PATH = ADMIN_DIR / "contacts.csv"
-VOTES_PATH = ADMIN_DIR / "votes.csv"
-USAGE_PATH = ADMIN_DIR / "usage.csv"
-
-ADMIN_DIR.mkdir(parents=True, exist_ok=True)
+from app.limiter import RequestRejected, RequestTimeout
+from app.uploads import file_hash
 
 
 
@@ -30,22 +23,24 @@ def valid_phone(phone):
     return phone.isdigit() or phone == ""
 
 
-def append_csv(path, header, row):
-    exists = path.exists()
-    with open(path, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if not exists:
-            writer.writerow(header)
-        writer.writerow(row)
+@st.cache_resource
+def get_router():
+    # Un seul routeur (et donc un seul index FAISS) pour toutes les sessions ;
+    # avec API_URL, les agents tournent dans le serveur HTTP (python -m app.server)
+    if API_URL:
+        return ApiRouter(API_URL)
+    return AgentRouter()
 
 
 def init_session():
     if "router" not in st.session_state:
-        st.session_state.router = AgentRouter()
+        st.session_state.router = get_router()
     if "messages" not in st.session_state:
-        st.session_state.messages = []
-    if "uploaded_doc" not in st.session_state:
-        st.session_state.uploaded_doc = None
+        # affichage seulement, borné ; le contexte des relances vient de la mémoire
+        st.session_state.messages = deque(maxlen=MEMORY_DISPLAY_MESSAGES)
+    if "memory" not in st.session_state:
+        # derniers échanges + document uploadé par référence (libéré avec la session)
+        st.session_state.memory = ConversationMemory()
     if "votes" not in st.session_state:
         st.session_state.votes = {}
 
@@ -89,11 +84,7 @@ def main():
             elif not valid_phone(phone):
                 st.warning("Téléphone invalide.")
             else:
-                append_csv(
-                    CONTACTS_PATH,
-                    ["name", "email", "phone", "subject", "comment"],
-                    [name, email, phone, subject, comment],
-                )
+                get_analytics().record_contact(name, email, phone, subject, comment)
                 st.success("Message envoyé.")
 
     
@@ -104,27 +95,21 @@ def main():
         st.caption("Assistant multi-agents avec RAG institutionnel.")
 
         # Historique 
-        for i, msg in enumerate(st.session_state.messages):
+        for msg in st.session_state.messages:
             with st.chat_message(msg["role"]):
                 if msg["role"] == "assistant":
                     st.markdown(f"**{msg['agent']}**")
                     st.markdown(msg["content"])
 
+                    # numéro de l'échange : stable même quand les anciens messages sont oubliés
+                    i = msg["turn"]
                     c1, c2, _ = st.columns([1, 1, 6])
                     if c1.button("👍", key=f"up_{i}"):
                         st.session_state.votes[i] = "up"
-                        append_csv(
-                            VOTES_PATH,
-                            ["msg_id", "agent", "vote"],
-                            [i, msg["agent"], "up"],
-                        )
+                        get_analytics().record_vote(i, msg["agent"], "up")
                     if c2.button("👎", key=f"down_{i}"):
                         st.session_state.votes[i] = "down"
-                        append_csv(
-                            VOTES_PATH,
-                            ["msg_id", "agent", "vote"],
-                            [i, msg["agent"], "down"],
-                        )
+                        get_analytics().record_vote(i, msg["agent"], "down")
                 else:
                     st.markdown(msg["content"])
 
@@ -132,65 +117,70 @@ def main():
         with st.expander("📎 Ajouter un document", expanded=False):
             file = st.file_uploader("", type=["txt", "pdf"], label_visibility="collapsed")
             if file:
-                if file.name.endswith(".pdf"):
+                data = file.getvalue()
+                file_id = file_hash(data)
+                memory = st.session_state.memory
+                current = memory.upload
+                # à chaque rerun : rien à refaire si c'est le même fichier
+                if current is None or current.file_id != file_id:
                     try:
-                        # Utilisation de pypdf pour extraire le texte réel 
-                        pdf_reader = PdfReader(file)
-                        text_content = ""
-                        for page_num in range(len(pdf_reader.pages)):
-                            page_text = pdf_reader.pages[page_num].extract_text()
-                            if page_text:
-                                text_content += page_text + "\n"
-                        st.session_state.uploaded_doc = text_content
-                        st.success(f"PDF '{file.name}' lu avec succès")
+                        # extraction partagée (app/extraction.py) : texte en cache par page
+                        memory.upload = st.session_state.router.upload(data, file.name)
                     except Exception as e:
-                        st.error(f"Erreur lors de la lecture du PDF : {e}")
-                else:
-                    # Pour les fichiers TXT
-                    st.session_state.uploaded_doc = file.read().decode(
-                        "utf-8", errors="ignore"
-                    )
-                    st.success(f"{file.name} chargé")
+                        st.error(f"Erreur lors de la lecture du document : {e}")
+                upload = memory.upload
+                if upload is not None and upload.file_id == file_id:
+                    st.success(f"'{file.name}' indexé ({upload.n_chunks} passages)")
 
         # Chat input
         user_input = st.chat_input("Pose ta question…")
 
         # Afficher la question immédiatement
         if user_input:
-            st.session_state.messages.append(
-                {
-                    "role": "user",
-                    "content": user_input,
-                    "uploaded_doc": st.session_state.uploaded_doc,
-                }
-            )
+            st.session_state.messages.append({"role": "user", "content": user_input})
             st.session_state.pending_question = user_input
             st.rerun()
 
         # Calculer la réponse
         if "pending_question" in st.session_state:
             with st.chat_message("assistant"):
-                with st.spinner("Réflexion en cours..."):
-                    agent_response = st.session_state.router.handle(
-                        st.session_state.pending_question,
-                        history=st.session_state.messages,
-                    )
-
+                # Affichage token par token (plus de spinner bloquant)
+                # relance : retrieval sur la question autonome (derniers échanges de la mémoire)
+                memory = st.session_state.memory
+                stream = st.session_state.router.stream(
+                    st.session_state.pending_question,
+                    history=memory,
+                    upload=memory.upload,
+                )
+                st.markdown(f"**{stream.agent_name}**")
+                try:
+                    st.write_stream(stream)
+                    agent_response = stream.to_response()
+                except (RequestRejected, RequestTimeout):
+                    # file d'attente du LLM pleine ou délai dépassé
+                    busy = "Le service est très sollicité, merci de réessayer dans un instant."
+                    st.warning(busy)
+                    agent_response = AgentResponse(agent_name=stream.agent_name, answer=busy)
+
+            memory.add_turn(
+                st.session_state.pending_question,
+                agent_response.answer,
+                agent_response.agent_name,
+                query=stream.query,
+            )
             st.session_state.messages.append(
                 {
                     "role": "assistant",
                     "content": agent_response.answer,
                     "agent": agent_response.agent_name,
+                    "turn": memory.total_turns,
                 }
             )
 
-            append_csv(
-                USAGE_PATH,
-                ["agent", "question"],
-                [
-                    agent_response.agent_name,
-                    st.session_state.pending_question,
-                ],
+            # écrit en arrière-plan, par lots (app/analytics.py)
+            get_analytics().record_usage(
+                agent_response.agent_name,
+                st.session_state.pending_question,
             )
 
             del st.session_state.pending_question
@@ -202,27 +192,18 @@ def main():
     else:
         st.title("📊 Admin – Statistiques")
 
-        if USAGE_PATH.exists():
-            with open(USAGE_PATH, encoding="utf-8") as f:
-                rows = list(csv.DictReader(f))
-        else:
-            rows = []
+        # agrégats tenus à jour à l'écriture : lecture de quelques lignes
+        usage = get_analytics().summary()
 
-        st.metric("Nombre total de questions", len(rows))
+        st.metric("Nombre total de questions", usage["questions"])
 
-        count_agents = Counter(r["agent"] for r in rows)
         st.subheader("Questions par agent")
-        for agent, n in count_agents.items():
-            st.write(f"**{agent}** : {n}")
-
-        stats = defaultdict(lambda: {"up": 0, "down": 0})
-        if VOTES_PATH.exists():
-            with open(VOTES_PATH, encoding="utf-8") as f:
-                for r in csv.DictReader(f):
-                    stats[r["agent"]][r["vote"]] += 1
+        for agent, s in usage["agents"].items():
+            if s["questions"]:
+                st.write(f"**{agent}** : {s['questions']}")
 
         st.subheader("Qualité des réponses")
-        for agent, s in stats.items():
+        for agent, s in usage["agents"].items():
             total = s["up"] + s["down"]
             if total == 0:
                 continue
@@ -231,6 +212,122 @@ def main():
                 f"👎 {round(s['down']/total*100,1)}%"
             )
 
+        status = st.session_state.router.status()
+
+        st.subheader("Latence de génération")
+        for agent, s in status["generation"].items():
+            if not s["count"]:
+                continue
+            st.write(
+                f"**{agent}** → premier token {s['avg_ttft']} s | "
+                f"génération {s['avg_generation']} s (moyenne sur {s['count']})"
+            )
+
+        tracing = status.get("tracing")
+        if tracing and tracing["requests"]:
+            st.subheader("Latence par étape (ms)")
+            st.table([
+                {"étape": stage, "p50": s["p50_ms"], "p95": s["p95_ms"], "p99": s["p99_ms"], "requêtes": s["count"]}
+                for stage, s in tracing["stages"].items()
+            ])
+            for agent, stages in tracing["agents"].items():
+                with st.expander(f"{agent} : p50 / p95 / p99 par étape"):
+                    st.table([
+                        {"étape": stage, "p50": s["p50_ms"], "p95": s["p95_ms"], "p99": s["p99_ms"]}
+                        for stage, s in stages.items()
+                    ])
+            if tracing["slow"]:
+                st.caption(
+                    f"{len(tracing['slow'])} requêtes récentes au-delà de {tracing['slow_ms']} ms"
+                    + (f" | {tracing['profiles']} profils cProfile enregistrés" if tracing["profiles"] else "")
+                )
+
+        limiter = status["limiter"]
+        st.write(
+            f"File LLM : {limiter['active']}/{limiter['max_concurrent']} en cours, "
+            f"{limiter['queued']} en attente | attente p95 {limiter['queue_wait']['p95']} s | "
+            f"service p95 {limiter['service']['p95']} s | "
+            f"{limiter['rejected']} refusées, {limiter['timeouts']} expirées, "
+            f"{limiter['cancelled']} annulées"
+        )
+
+        st.subheader("Ressources partagées")
+        mem = status["memory"]
+        st.write(
+            f"Index : {mem['index_vectors']} vecteurs "
+            f"({round(mem['index_bytes'] / 1e6, 1)} Mo) | "
+            f"Docstore : {mem['docstore_docs']} chunks "
+            f"({round(mem['docstore_bytes'] / 1e6, 1)} Mo{', mappés' if mem.get('docstore_mmap') else ''}) | "
+            f"chargé en {mem['load_seconds']} s"
+        )
+        st.write(
+            f"Version servie : {mem['index_version'] or 'aucune'}"
+            + (
+                f" (anciennes versions encore utilisées : {', '.join(mem['retired_versions'])})"
+                if mem["retired_versions"]
+                else ""
+            )
+        )
+
+        caches = status["caches"]
+        st.write(
+            f"Cache des questions : {caches['query']['hits']} hits / "
+            f"{caches['query']['misses']} misses "
+            f"({round(caches['query']['hit_rate'] * 100, 1)}%)"
+        )
+        st.write(
+            f"Cache des réponses : {caches['answer']['hits']} hits "
+            f"(+{caches['answer']['semantic_hits']} sémantiques) / "
+            f"{caches['answer']['misses']} misses "
+            f"({round(caches['answer']['hit_rate'] * 100, 1)}%)"
+        )
+        rewrite = caches.get("rewrite")
+        if rewrite:
+            st.write(
+                f"Relances reformulées : {rewrite['hits'] + rewrite['misses']} "
+                f"(cache {round(rewrite['hit_rate'] * 100, 1)}%) | "
+                f"questions autonomes : {rewrite['skipped']}"
+            )
+
+        cache = status["embedding_cache"]
+        if cache:
+            st.write(
+                f"Cache d'embeddings : {cache['entries']} entrées | "
+                f"taux de succès {round(cache['hit_rate'] * 100, 1)}% "
+                f"({cache['hits']} hits / {cache['misses']} misses)"
+            )
+
+        context = status["context"]
+        if context["requests"]:
+            st.write(
+                f"Contexte : {context['avg_tokens_used']} tokens envoyés / "
+                f"{context['avg_tokens_wasted']} écartés par requête "
+                f"({round(context['waste_ratio'] * 100, 1)}% du retrouvé : doublons, "
+                f"recouvrements, hors budget)"
+            )
+
+        batching = status.get("batching")
+        if batching and batching["embed"]["batches"]:
+            st.write(
+                f"Regroupement des questions : embeddings {batching['embed']['avg_batch']} par appel "
+                f"(max {batching['embed']['largest']}) | recherches FAISS {batching['search']['avg_batch']} "
+                f"par index.search (max {batching['search']['largest']})"
+            )
+
+        rerank = status["rerank"]
+        if rerank.get("enabled"):
+            st.write(
+                f"Reranking : {rerank['count']} requêtes | {rerank['avg_ms']} ms en moyenne | "
+                f"{rerank['fallbacks']} replis sur l'ordre FAISS (budget dépassé)"
+            )
+
+        extraction = status.get("extraction")
+        if extraction and extraction["pages"]:
+            st.write(
+                f"Extraction des uploads : {extraction['pages']} pages "
+                f"({extraction['cached_pages']} en cache) | {extraction['pages_per_s']} pages/s"
+            )
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file